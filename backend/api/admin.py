@@ -1,6 +1,13 @@
+import re
+
 from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+
+from .models import Dataset, EquipmentRecord, IdempotencyRecord, QuarantinedRow, Report
+from .profiling import list_profiles, profiles_dir
 
-from .models import Dataset, EquipmentRecord, Report
+_PROFILE_ID_RE = re.compile(r'^[A-Za-z0-9_-]+$')
 
 
 class EquipmentRecordInline(admin.TabularInline):
@@ -11,6 +18,14 @@ class EquipmentRecordInline(admin.TabularInline):
 	can_delete = False
 
 
+class QuarantinedRowInline(admin.TabularInline):
+	model = QuarantinedRow
+	extra = 0
+	fields = ('line_number', 'values', 'reason')
+	readonly_fields = fields
+	can_delete = False
+
+
 class ReportInline(admin.TabularInline):
 	model = Report
 	extra = 0
@@ -25,7 +40,7 @@ class DatasetAdmin(admin.ModelAdmin):
 	list_filter = ('uploaded_at',)
 	search_fields = ('file_name', 'user__username', 'user__email')
 	readonly_fields = ('uploaded_at',)
-	inlines = [ReportInline, EquipmentRecordInline]
+	inlines = [ReportInline, QuarantinedRowInline, EquipmentRecordInline]
 
 
 @admin.register(EquipmentRecord)
@@ -40,3 +55,32 @@ class ReportAdmin(admin.ModelAdmin):
 	list_display = ('id', 'user', 'dataset', 'report_number', 'created_at')
 	list_filter = ('created_at',)
 	search_fields = ('user__username', 'user__email', 'dataset__file_name')
+
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+	list_display = ('id', 'user', 'key', 'status_code', 'created_at', 'completed_at')
+	list_filter = ('created_at',)
+	search_fields = ('key', 'user__username')
+	readonly_fields = ('user', 'key', 'fingerprint', 'created_at', 'completed_at', 'status_code', 'kind', 'body')
+
+
+def profiles_view(request):
+	"""Admin page listing request profiles saved by ProfilingMiddleware."""
+	context = {
+		**admin.site.each_context(request),
+		'title': 'Request profiles',
+		'profiles': list_profiles(),
+		'profiles_dir': profiles_dir(),
+	}
+	return TemplateResponse(request, 'admin/api/profiles.html', context)
+
+
+def profile_file_view(request, profile_id: str, kind: str):
+	if not _PROFILE_ID_RE.match(profile_id) or kind not in ('json', 'collapsed'):
+		raise Http404('Unknown profile.')
+	path = profiles_dir() / f"{profile_id}.{kind}"
+	if not path.exists():
+		raise Http404('Unknown profile.')
+	content_type = 'application/json' if kind == 'json' else 'text/plain'
+	return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name, content_type=content_type)
@@ -0,0 +1,193 @@
+"""Admission control for CPU-heavy endpoints.
+
+Uploads (pandas + bulk insert), PDF reports (matplotlib + ReportLab) and
+limited summaries share one bounded pool of "heavy" slots per process:
+
+- at most ``ADMISSION_MAX_CONCURRENT`` heavy requests run at once,
+- at most ``ADMISSION_MAX_PER_USER`` heavy requests per user are in flight
+  (running or queued),
+- up to ``ADMISSION_QUEUE_DEPTH`` more wait for a slot, for at most
+  ``ADMISSION_QUEUE_TIMEOUT`` seconds.
+
+Anything beyond that is refused straight away with ``429 Too Many Requests``
+and a ``Retry-After`` estimated from recent slot hold times, so the workers
+left over stay free for cheap endpoints such as history and login.
+
+Limits are per process; with N workers the effective global limit is N times
+``ADMISSION_MAX_CONCURRENT``. Setting ``ADMISSION_MAX_CONCURRENT = None``
+disables admission control.
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework.exceptions import Throttled
+
+from .instrumentation import stage
+from .metrics import ADMISSION_REJECTED
+
+
+class AdmissionController:
+    """Counting gate with a bounded wait queue and per-user caps."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: Optional[int],
+        max_per_user: Optional[int] = None,
+        queue_depth: int = 0,
+        queue_timeout: float = 0.0,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.per_user: Dict[object, int] = defaultdict(int)
+        # Moving average of how long a slot is held, used for Retry-After.
+        self.avg_hold_s = 1.0
+        self._cond = threading.Condition()
+
+    def retry_after(self) -> int:
+        slots = max(1, self.max_concurrent or 1)
+        return max(1, math.ceil(self.avg_hold_s * (self.waiting + 1) / slots))
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.labels(self.name, reason).inc()
+        raise Throttled(wait=self.retry_after(), detail='Server is busy; please retry shortly.')
+
+    @contextmanager
+    def slot(self, user_key=None):
+        if self.max_concurrent is None:
+            yield
+            return
+
+        with self._cond:
+            if self.max_per_user is not None and self.per_user.get(user_key, 0) >= self.max_per_user:
+                self._reject('user')
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.queue_depth:
+                    self._reject('queue')
+                self.per_user[user_key] += 1
+                self.waiting += 1
+                try:
+                    with stage('queue'):
+                        admitted = self._cond.wait_for(lambda: self.active < self.max_concurrent, self.queue_timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self._release_user(user_key)
+                    self._reject('timeout')
+            else:
+                self.per_user[user_key] += 1
+            self.active += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            with self._cond:
+                self.active -= 1
+                self._release_user(user_key)
+                self.avg_hold_s = 0.8 * self.avg_hold_s + 0.2 * held
+                self._cond.notify()
+
+    def _release_user(self, user_key) -> None:
+        self.per_user[user_key] -= 1
+        if self.per_user[user_key] <= 0:
+            del self.per_user[user_key]
+
+
+_heavy_lock = threading.Lock()
+_heavy: Optional[AdmissionController] = None
+
+
+def heavy_controller() -> AdmissionController:
+    global _heavy
+    with _heavy_lock:
+        if _heavy is None:
+            _heavy = AdmissionController(
+                'heavy',
+                max_concurrent=getattr(settings, 'ADMISSION_MAX_CONCURRENT', 4),
+                max_per_user=getattr(settings, 'ADMISSION_MAX_PER_USER', 2),
+                queue_depth=int(getattr(settings, 'ADMISSION_QUEUE_DEPTH', 8)),
+                queue_timeout=float(getattr(settings, 'ADMISSION_QUEUE_TIMEOUT', 30.0)),
+            )
+        return _heavy
+
+
+def reset_heavy_controller() -> None:
+    """Drop the shared controller so the next request rereads settings."""
+
+    global _heavy
+    with _heavy_lock:
+        _heavy = None
+
+
+@contextmanager
+def heavy_slot(request):
+    """Run the enclosed block in a heavy slot; raises ``Throttled`` (429) when full."""
+
+    user = getattr(request, 'user', None)
+    user_key = user.pk if user is not None and user.is_authenticated else request.META.get('REMOTE_ADDR')
+    with heavy_controller().slot(user_key):
+        yield
+
+
+class _SlotHeldStream:
+    """Streamed body that keeps its heavy slot until it is exhausted or closed."""
+
+    def __init__(self, content, slot: ExitStack):
+        self._content = content
+        self._iterator = iter(content)
+        self._slot = slot
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._content, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._slot.close()
+
+
+def heavy_endpoint(method):
+    """Decorator for APIView handlers that always run in a heavy slot.
+
+    A streamed response (other than a plain file download) does its work as
+    the body is consumed, after the handler has returned, so the slot passes
+    to the body and is released once it is exhausted or the response closed.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        with ExitStack() as slot:
+            slot.enter_context(heavy_slot(request))
+            response = method(self, request, *args, **kwargs)
+            if isinstance(response, StreamingHttpResponse) and not isinstance(response, FileResponse):
+                response.streaming_content = _SlotHeldStream(response.streaming_content, slot.pop_all())
+            return response
+
+    return wrapper
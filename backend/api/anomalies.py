@@ -0,0 +1,193 @@
+"""Per-type anomaly detection at ingest, persisted as a severity index.
+
+For every equipment type and metric, ingest computes
+
+- a robust z-score ``0.6745 * (x - median) / MAD`` (falling back to
+  ``1.2533 * mean absolute deviation`` when the MAD is zero), and
+- Tukey fences ``[Q1 - k * IQR, Q3 + k * IQR]`` with ``k = ANOMALY_IQR_K``.
+
+A row is anomalous when any metric's ``|z|`` exceeds
+``ANOMALY_Z_THRESHOLD`` or lies outside its fences. Anomalous rows are
+stored as ``Anomaly`` rows (with their values, so archiving the dataset
+does not lose them) scored by their largest ``|z|``; ``AnomalyView`` pages
+through them by severity. Types with fewer than ``MIN_GROUP_ROWS`` rows are
+not judged.
+
+Everything is linear in the number of rows: rows are bucketed by type with
+a counting sort (bucket bounds from ``np.bincount`` and ``cumsum``, rows
+from a stable argsort of the type codes narrowed to 8 or 16 bits, which
+NumPy radix-sorts; only past 65,536 types does it fall back to a
+comparison sort) and the medians and quartiles come from ``np.partition``
+(introselect), never from a full sort.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from .archive import dataset_records_frame
+from .models import Anomaly, Dataset, DatasetSketch
+from .singleflight import coalesce
+from .utils import COLUMN_FOR_FIELD, NUMERIC_COLUMNS
+
+ANOMALY_VERSION = 1
+MIN_GROUP_ROWS = 5
+
+# MAD -> standard deviation of a normal distribution, and the same for the mean absolute deviation.
+_MAD_SCALE = 0.6745
+_MEAN_AD_SCALE = 1.253314
+
+# Anomaly z-score column for each metric.
+Z_FIELD = {col: f"z_{field}" for field, col in COLUMN_FOR_FIELD.items() if col in NUMERIC_COLUMNS}
+
+
+def z_threshold() -> float:
+    return float(getattr(settings, 'ANOMALY_Z_THRESHOLD', 3.5))
+
+
+def iqr_k() -> float:
+    return float(getattr(settings, 'ANOMALY_IQR_K', 3.0))
+
+
+def _quantiles(values: np.ndarray, qs: Sequence[float]) -> np.ndarray:
+    """``np.quantile(values, qs)`` (linear interpolation) in O(n) via partition."""
+
+    positions = np.asarray(qs, dtype=float) * (len(values) - 1)
+    below = np.floor(positions).astype(np.int64)
+    above = np.ceil(positions).astype(np.int64)
+    part = np.partition(values, np.unique(np.concatenate((below, above))))
+    return part[below] + (part[above] - part[below]) * (positions - below)
+
+
+def detect_anomalies(
+    df: pd.DataFrame,
+    metrics: Sequence[str] = NUMERIC_COLUMNS,
+    *,
+    threshold: Optional[float] = None,
+    k: Optional[float] = None,
+    type_column: str = 'Type',
+) -> Dict[str, Any]:
+    """Flag anomalous rows of a validated frame.
+
+    Returns ``{'rows', 'z', 'score', 'metric', 'iqr_flags', 'meta'}``:
+    positional row indices of the anomalies, their per-metric z-scores
+    (one column per metric), largest ``|z|``, index of the metric it came
+    from, fence bitmask (bit ``i`` for ``metrics[i]``), and a JSON-able
+    summary of the run.
+    """
+
+    threshold = z_threshold() if threshold is None else threshold
+    k = iqr_k() if k is None else k
+    n = len(df)
+    codes, types = pd.factorize(df[type_column].astype(str), sort=True)
+    # NumPy only radix-sorts integers of 16 bits or fewer.
+    order = np.argsort(codes.astype(np.min_scalar_type(max(len(types) - 1, 0))), kind='stable')
+    starts = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(types)))]
+
+    z = np.zeros((n, len(metrics)))
+    outside = np.zeros((n, len(metrics)), dtype=bool)
+    for j, metric in enumerate(metrics):
+        values = df[metric].to_numpy(dtype=float)[order]
+        for lo, hi in zip(starts[:-1], starts[1:]):
+            if hi - lo < MIN_GROUP_ROWS:
+                continue
+            segment = values[lo:hi]
+            q1, median, q3 = _quantiles(segment, (0.25, 0.5, 0.75))
+            deviation = np.abs(segment - median)
+            scale = _quantiles(deviation, (0.5,))[0] / _MAD_SCALE
+            if scale == 0:
+                scale = _MEAN_AD_SCALE * deviation.mean()
+            rows = order[lo:hi]
+            if scale > 0:
+                z[rows, j] = (segment - median) / scale
+            spread = k * (q3 - q1)
+            outside[rows, j] = (segment < q1 - spread) | (segment > q3 + spread)
+
+    magnitude = np.abs(z)
+    score = magnitude.max(axis=1) if len(metrics) else np.zeros(n)
+    flagged = np.flatnonzero((score > threshold) | outside.any(axis=1))
+    flags = (outside[flagged] * (1 << np.arange(len(metrics)))).sum(axis=1) if len(flagged) else np.zeros(0, dtype=np.int64)
+    worst = magnitude[flagged].argmax(axis=1) if len(flagged) else np.zeros(0, dtype=np.int64)
+
+    flagged_types = np.asarray(types, dtype=object)[codes[flagged]] if len(flagged) else []
+    return {
+        'rows': flagged,
+        'z': z[flagged],
+        'score': score[flagged],
+        'metric': worst,
+        'iqr_flags': flags,
+        'meta': {
+            'version': ANOMALY_VERSION,
+            'rows': int(n),
+            'count': int(len(flagged)),
+            'z_threshold': threshold,
+            'iqr_k': k,
+            'by_type': {str(t): int(c) for t, c in pd.Series(flagged_types, dtype=object).value_counts().items()},
+            'by_metric': {metrics[i]: int(c) for i, c in enumerate(np.bincount(worst, minlength=len(metrics)))},
+        },
+    }
+
+
+def store_anomalies(dataset: Dataset, df: pd.DataFrame, found: Dict[str, Any], metrics: Sequence[str] = NUMERIC_COLUMNS) -> None:
+    """Replace ``dataset``'s anomaly index with ``found`` (from ``detect_anomalies`` on ``df``)."""
+
+    rows = df.iloc[found['rows']]
+    with transaction.atomic():
+        Anomaly.objects.filter(dataset=dataset).delete()
+        _bulk_create_anomalies(dataset, rows, found, metrics)
+        DatasetSketch.objects.update_or_create(dataset=dataset, defaults={'anomalies': found['meta']})
+
+
+def _bulk_create_anomalies(dataset, rows, found, metrics) -> None:
+    Anomaly.objects.bulk_create(
+        [
+            Anomaly(
+                dataset=dataset,
+                row_index=int(index),
+                equipment_name=str(name),
+                type=str(kind),
+                flowrate=float(flowrate),
+                pressure=float(pressure),
+                temperature=float(temperature),
+                score=float(score),
+                metric=metrics[int(worst)],
+                iqr_flags=int(flags),
+                **{Z_FIELD[metric]: float(value) for metric, value in zip(metrics, zs)},
+            )
+            for index, name, kind, flowrate, pressure, temperature, score, worst, flags, zs in zip(
+                found['rows'].tolist(),
+                rows['Equipment Name'].tolist(),
+                rows['Type'].tolist(),
+                rows['Flowrate'].tolist(),
+                rows['Pressure'].tolist(),
+                rows['Temperature'].tolist(),
+                found['score'].tolist(),
+                found['metric'].tolist(),
+                found['iqr_flags'].tolist(),
+                found['z'].tolist(),
+            )
+        ],
+        batch_size=1000,
+    )
+
+
+def _detect_from_storage(dataset_id: int) -> Dict[str, Any]:
+    dataset = Dataset.objects.get(pk=dataset_id)
+    frame = dataset_records_frame(dataset).rename(columns=COLUMN_FOR_FIELD)
+    found = detect_anomalies(frame)
+    store_anomalies(dataset, frame, found)
+    return found['meta']
+
+
+def dataset_anomalies(dataset: Dataset) -> Dict[str, Any]:
+    """Summary of ``dataset``'s anomaly index, detecting from its rows if it has none yet."""
+
+    meta = DatasetSketch.objects.filter(dataset=dataset).values_list('anomalies', flat=True).first()
+    if meta and meta.get('version') == ANOMALY_VERSION:
+        return meta
+    return coalesce(('anomalies', dataset.id), lambda: _detect_from_storage(dataset.id), name='anomaly_detect')
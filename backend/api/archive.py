@@ -0,0 +1,207 @@
+"""Cold-storage tier for old datasets.
+
+Datasets beyond ``DATASET_HOT_COUNT`` per user, or older than
+``DATASET_ARCHIVE_AFTER_DAYS``, have their EquipmentRecord rows moved into a
+gzip-compressed CSV (``Dataset.archive_file``) and deleted from the hot table.
+The Dataset row, with its summary and KPI columns, stays put, so history,
+summaries and reports need no changes.
+
+Reading an archived dataset's rows goes through ``dataset_records_frame``,
+which loads the archive on first use and keeps the most recent few in a
+small per-process LRU. The hot table only ever holds the hot datasets, so
+its indexes, and the speed of reads and inserts, stay bounded.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional
+
+import pandas as pd
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Dataset, EquipmentRecord
+
+logger = logging.getLogger(__name__)
+
+# EquipmentRecord fields in archive column order.
+RECORD_FIELDS = ['equipment_name', 'type', 'flowrate', 'pressure', 'temperature']
+
+_READ_CHUNK = 50_000
+
+_cache_lock = threading.Lock()
+_frame_cache: 'OrderedDict[tuple, pd.DataFrame]' = OrderedDict()
+
+
+def archiving_enabled() -> bool:
+    return (
+        getattr(settings, 'DATASET_HOT_COUNT', None) is not None
+        or getattr(settings, 'DATASET_ARCHIVE_AFTER_DAYS', None) is not None
+    )
+
+
+def _hot_records_frame(dataset: Dataset, limit: Optional[int] = None) -> pd.DataFrame:
+    qs = EquipmentRecord.objects.filter(dataset=dataset).order_by('id').values_list(*RECORD_FIELDS)
+    if limit is not None:
+        qs = qs[:limit]
+    frames = []
+    batch = []
+    for row in qs.iterator(chunk_size=_READ_CHUNK):
+        batch.append(row)
+        if len(batch) >= _READ_CHUNK:
+            frames.append(pd.DataFrame.from_records(batch, columns=RECORD_FIELDS))
+            batch = []
+    if batch or not frames:
+        frames.append(pd.DataFrame.from_records(batch, columns=RECORD_FIELDS))
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def _load_archive(dataset: Dataset) -> pd.DataFrame:
+    # archived_at too: a dataset id (and so its file name) can be archived again.
+    key = (dataset.id, dataset.archive_file.name, dataset.archived_at)
+    with _cache_lock:
+        frame = _frame_cache.get(key)
+        if frame is not None:
+            _frame_cache.move_to_end(key)
+            return frame
+
+    with dataset.archive_file.open('rb') as fh:
+        raw = gzip.decompress(fh.read())
+    frame = pd.read_csv(
+        io.BytesIO(raw),
+        dtype={'equipment_name': str, 'type': str},
+        keep_default_na=False,
+        float_precision='round_trip',
+    )
+
+    with _cache_lock:
+        _frame_cache[key] = frame
+        while len(_frame_cache) > int(getattr(settings, 'ARCHIVE_CACHE_SIZE', 4)):
+            _frame_cache.popitem(last=False)
+    return frame
+
+
+def dataset_records_frame(dataset: Dataset, limit: Optional[int] = None) -> pd.DataFrame:
+    """Return a dataset's rows (in upload order) as a DataFrame of RECORD_FIELDS.
+
+    Hot datasets are read from EquipmentRecord; archived ones are rehydrated
+    lazily from their archive file.
+    """
+
+    if dataset.is_archived and dataset.archive_file:
+        frame = _load_archive(dataset)
+        return frame if limit is None else frame.head(limit)
+    return _hot_records_frame(dataset, limit)
+
+
+def iter_dataset_records(dataset: Dataset, *, types=None, chunk_size: int = _READ_CHUNK):
+    """Yield a dataset's rows (in upload order) as DataFrames of at most ``chunk_size`` rows.
+
+    Memory stays bounded by the chunk size: hot rows are read with keyset
+    pagination on the primary key, archives are decompressed as a stream.
+    ``types`` optionally restricts rows to those equipment types.
+    """
+
+    types = list(types) if types else None
+    if dataset.is_archived and dataset.archive_file:
+        with dataset.archive_file.open('rb') as raw, gzip.GzipFile(fileobj=raw) as fh:
+            reader = pd.read_csv(
+                fh,
+                chunksize=chunk_size,
+                dtype={'equipment_name': str, 'type': str},
+                keep_default_na=False,
+                float_precision='round_trip',
+            )
+            for chunk in reader:
+                if types is not None:
+                    chunk = chunk[chunk['type'].isin(types)]
+                if len(chunk):
+                    yield chunk.reset_index(drop=True)
+        return
+
+    qs = EquipmentRecord.objects.filter(dataset=dataset)
+    if types is not None:
+        qs = qs.filter(type__in=types)
+    last_id = 0
+    while True:
+        rows = list(qs.filter(id__gt=last_id).order_by('id').values_list('id', *RECORD_FIELDS)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield pd.DataFrame.from_records([row[1:] for row in rows], columns=RECORD_FIELDS)
+        if len(rows) < chunk_size:
+            return
+
+
+def archive_dataset(dataset: Dataset) -> bool:
+    """Move one dataset's rows to cold storage. Returns False if already archived."""
+
+    if dataset.is_archived:
+        return False
+
+    frame = _hot_records_frame(dataset)
+    buffer = io.BytesIO()
+    # mtime=0 keeps archives byte-identical for identical rows.
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6, mtime=0) as gz:
+        gz.write(frame.to_csv(index=False).encode('utf-8'))
+
+    with transaction.atomic():
+        dataset.archive_file.save(f"dataset_{dataset.id}.csv.gz", ContentFile(buffer.getvalue()), save=False)
+        dataset.archived_at = timezone.now()
+        dataset.save(update_fields=['archive_file', 'archived_at'])
+        EquipmentRecord.objects.filter(dataset=dataset).delete()
+
+    logger.info('Archived dataset %s (%d rows, %d bytes compressed)', dataset.id, len(frame), buffer.tell())
+    return True
+
+
+def due_for_archive(user=None, *, hot_count: Optional[int] = None, after_days: Optional[int] = None, now=None):
+    """Return a queryset of not-yet-archived datasets that policy says to archive."""
+
+    if hot_count is None:
+        hot_count = getattr(settings, 'DATASET_HOT_COUNT', None)
+    if after_days is None:
+        after_days = getattr(settings, 'DATASET_ARCHIVE_AFTER_DAYS', None)
+
+    # Only ready datasets: one still ingesting has no rows to archive yet, and
+    # its rows would land in the hot table after the archive was written.
+    base = Dataset.objects.filter(archived_at__isnull=True, state='ready')
+    if user is not None:
+        base = base.filter(user=user)
+
+    due_ids = set()
+    if after_days is not None:
+        cutoff = (now or timezone.now()) - timedelta(days=after_days)
+        due_ids.update(base.filter(uploaded_at__lt=cutoff).values_list('id', flat=True))
+    if hot_count is not None:
+        users = [user.pk] if user is not None else base.values_list('user_id', flat=True).distinct()
+        for user_id in users:
+            due_ids.update(
+                Dataset.objects.filter(user_id=user_id, archived_at__isnull=True, state='ready')
+                .order_by('-uploaded_at', '-id')
+                .values_list('id', flat=True)[hot_count:]
+            )
+    return Dataset.objects.filter(id__in=due_ids).order_by('uploaded_at', 'id')
+
+
+def archive_due_datasets(user=None, **policy) -> int:
+    """Archive every dataset that is past the hot-tier policy. Returns the count."""
+
+    if not policy and not archiving_enabled():
+        return 0
+    archived = 0
+    for dataset in due_for_archive(user, **policy):
+        try:
+            if archive_dataset(dataset):
+                archived += 1
+        except Exception:
+            logger.exception('Failed to archive dataset %s', dataset.id)
+    return archived
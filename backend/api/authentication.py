@@ -0,0 +1,11 @@
+from rest_framework.authentication import TokenAuthentication
+
+from .instrumentation import stage
+
+
+class TimedTokenAuthentication(TokenAuthentication):
+	"""TokenAuthentication that reports its lookup as the 'auth' timing stage."""
+
+	def authenticate(self, request):
+		with stage('auth'):
+			return super().authenticate(request)
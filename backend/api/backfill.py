@@ -0,0 +1,266 @@
+"""Offline backfills on a process pool: bulk CSV import and summary recompute.
+
+Both jobs are CPU-bound in pandas, so they fan out to a
+``ProcessPoolExecutor`` (``BACKFILL_WORKERS``, default one per core)
+rather than the thread pools used on the request path:
+
+- ``bulk_import`` parses and analyzes CSVs in the workers and persists the
+  results from the parent through ``ingest.persist_csv``, so writes stay
+  serialized on SQLite;
+- ``recompute_summaries`` rebuilds ``Dataset.summary`` and the dataset's
+  sketches in the workers from the stored rows (see
+  ``summaries.summary_from_storage``) and the parent saves them.
+
+Progress is appended to a checkpoint file under ``BACKFILL_CHECKPOINT_DIR``
+after every item, so an interrupted run picks up where it stopped.
+
+Worker entry points import Django models lazily: on platforms that spawn
+rather than fork, the worker module is imported before ``django.setup()``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Set
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_workers() -> int:
+    return int(getattr(settings, 'BACKFILL_WORKERS', None) or os.cpu_count() or 1)
+
+
+class Checkpoint:
+    """Append-only record of finished items (one key per line)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.done: Set[str] = set()
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as fh:
+                self.done = {line.rstrip('\n') for line in fh if line.strip()}
+        self._fh = None
+
+    @classmethod
+    def for_job(cls, job: str, *parts) -> 'Checkpoint':
+        base = Path(getattr(settings, 'BACKFILL_CHECKPOINT_DIR', None) or Path(settings.BASE_DIR) / 'checkpoints')
+        digest = hashlib.sha1('\0'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:12]
+        return cls(base / f"{job}-{digest}.txt")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def mark(self, key: str) -> None:
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, 'a', encoding='utf-8')
+        self._fh.write(key + '\n')
+        self._fh.flush()
+        self.done.add(key)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def discard(self) -> None:
+        self.close()
+        self.done.clear()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.monotonic()
+        self.items = 0
+        self.failed = 0
+        self.changed = 0
+        self.rows = 0
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return (
+            f"{self.items}/{self.total} done, {self.failed} failed, {self.rows} rows in {elapsed:.1f}s "
+            f"({self.rows / elapsed:.0f} rows/s)"
+        )
+
+
+# ---------------------------------------------------------------- workers
+
+
+def _init_worker() -> None:
+    import django
+
+    django.setup()
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+
+
+def _parse_path(path: str, tolerant: bool):
+    from django.core.files import File
+
+    from .ingest import IngestError, parse_csv
+
+    try:
+        with open(path, 'rb') as fh:
+            summary, df, rejected = parse_csv(File(fh, name=os.path.basename(path)), tolerant=tolerant)
+    except (IngestError, OSError) as exc:
+        return path, None, str(exc)
+    return path, (summary, df, rejected), None
+
+
+def _summary_for(dataset_id: int):
+    from .models import Dataset
+    from .summaries import summary_from_storage
+
+    try:
+        summary, sketches, rows = summary_from_storage(Dataset.objects.get(pk=dataset_id))
+        return dataset_id, summary, sketches, rows, None
+    except Exception as exc:
+        return dataset_id, None, None, 0, str(exc)
+    finally:
+        connections.close_all()
+
+
+def _run_pool(fn: Callable, args: Iterable[tuple], workers: int) -> Iterator:
+    """Yield ``fn(*a)`` results in completion order, keeping at most
+    ``2 * workers`` tasks (and their results) in flight."""
+
+    # The workers open their own connections.
+    connections.close_all()
+    args = iter(args)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = {pool.submit(fn, *a) for a in itertools.islice(args, workers * 2)}
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for a in itertools.islice(args, 1):
+                    pending.add(pool.submit(fn, *a))
+                yield future.result()
+
+
+# ------------------------------------------------------------------- jobs
+
+
+def find_csvs(root) -> list:
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        paths.extend(
+            os.path.join(dirpath, name)
+            for name in sorted(filenames)
+            if name.lower().endswith('.csv') and not name.startswith('.')
+        )
+    return paths
+
+
+def bulk_import(
+    root,
+    user,
+    *,
+    tolerant: bool = False,
+    workers: Optional[int] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    report: Callable[[str], None] = logger.info,
+    report_every: int = 100,
+) -> Progress:
+    """Import every CSV under ``root`` for ``user``, skipping checkpointed files.
+
+    The retention purge is suspended for the run: imported files are
+    checkpointed as done, so a dataset purged by the import itself (or by
+    the end of an interrupted run) could never be restored by resuming.
+    """
+
+    from django.core.files import File
+
+    from .ingest import persist_csv
+    from .models import dataset_retention_count, deferred_retention
+
+    root = os.path.abspath(root)
+    checkpoint = checkpoint or Checkpoint.for_job('bulk_import', root, user.pk, tolerant)
+    todo = [p for p in find_csvs(root) if os.path.relpath(p, root) not in checkpoint]
+    progress = Progress(len(todo))
+    keep = dataset_retention_count()
+    if keep is not None and len(todo) > keep:
+        report(
+            f"Importing {len(todo)} files with DATASET_RETENTION_COUNT={keep}: all are kept, "
+            f"but the user's next upload deletes all but the newest {keep} datasets."
+        )
+    try:
+        with deferred_retention(user, purge=False):
+            for path, parsed, error in _run_pool(_parse_path, ((p, tolerant) for p in todo), workers or backfill_workers()):
+                key = os.path.relpath(path, root)
+                if parsed is None:
+                    progress.failed += 1
+                    report(f"Rejected {key}: {error}")
+                else:
+                    summary, df, rejected = parsed
+                    with open(path, 'rb') as fh:
+                        persist_csv(user, File(fh, name=os.path.basename(path)), summary, df, rejected)
+                    progress.rows += len(df)
+                # Rejected files are checkpointed too; fix them and use --restart or move them.
+                checkpoint.mark(key)
+                progress.items += 1
+                if progress.items % report_every == 0:
+                    report(progress.line())
+    finally:
+        checkpoint.close()
+    return progress
+
+
+def recompute_summaries(
+    datasets,
+    *,
+    workers: Optional[int] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    report: Callable[[str], None] = logger.info,
+    report_every: int = 100,
+) -> Progress:
+    """Recompute ``Dataset.summary`` for ``datasets`` (a queryset).
+
+    Summaries are saved stamped with the current ``ANALYTICS_VERSION``
+    (see ``summaries.store_summary``). The checkpoint is discarded once
+    the run completes.
+    """
+
+    from .models import Dataset
+    from .summaries import store_summary
+
+    checkpoint = checkpoint or Checkpoint.for_job('recompute_summaries', str(datasets.query))
+    ids = [pk for pk in datasets.order_by('id').values_list('id', flat=True) if str(pk) not in checkpoint]
+    progress = Progress(len(ids))
+    try:
+        for dataset_id, summary, sketches, rows, error in _run_pool(_summary_for, ((pk,) for pk in ids), workers or backfill_workers()):
+            if summary is None:
+                progress.failed += 1
+                report(f"Failed dataset {dataset_id}: {error}")
+            else:
+                dataset = Dataset.objects.filter(pk=dataset_id).first()
+                if dataset is not None and store_summary(dataset, summary, sketches):
+                    progress.changed += 1
+                progress.rows += rows
+                checkpoint.mark(str(dataset_id))
+            progress.items += 1
+            if progress.items % report_every == 0:
+                report(progress.line())
+    except BaseException:
+        checkpoint.close()
+        raise
+    if progress.failed:
+        checkpoint.close()
+    else:
+        checkpoint.discard()
+    return progress
@@ -0,0 +1,300 @@
+"""Downsampled rows for line and scatter charts.
+
+Charts cannot draw a million points, so ``DownsampleView`` sends a visually
+faithful subset computed from the stored rows:
+
+- ``line``: one metric in upload order (x = row index), reduced to
+  ``points`` points with Largest-Triangle-Three-Buckets (``lttb``), which
+  keeps the peaks and troughs a plain stride would drop;
+- ``scatter``: a metric pair binned into a ``grid`` x ``grid`` raster over
+  the viewport (``grid_sample``). ``minmax`` keeps, per occupied cell, the
+  real rows with the lowest and highest y (outliers sit alone in their cell
+  and always survive); ``density`` returns each occupied cell's centroid
+  and row count.
+
+The work is vectorized NumPy; only LTTB walks its buckets in Python, one
+``argmax`` each. The metric columns and categorical types of the last
+``DOWNSAMPLE_ROWS_CACHE_SIZE`` datasets (within ``DOWNSAMPLE_ROWS_CACHE_BYTES``;
+names are never kept) stay in memory and the last ``DOWNSAMPLE_CACHE_SIZE`` results
+are cached per process, keyed on dataset and every parameter (resolution,
+viewport, types), so redraws and zooming back out are served from memory.
+Datasets do not change once ready, so nothing needs invalidating.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .archive import dataset_records_frame
+from .metrics import record_cache
+from .models import Dataset
+from .singleflight import coalesce
+from .utils import COLUMN_FOR_FIELD, NUMERIC_COLUMNS
+
+DOWNSAMPLE_KINDS = ('line', 'scatter')
+SCATTER_MODES = ('minmax', 'density')
+MAX_LINE_POINTS = 10_000
+MAX_GRID = 1024
+
+
+class LRUCache:
+    """A small thread-safe LRU whose capacity is read from a setting on each insert.
+
+    With ``bytes_setting``, entries are also weighed (``weigh(value)``) and
+    the oldest are evicted while their total exceeds that many bytes; an
+    entry larger than the whole budget is not kept at all.
+    """
+
+    def __init__(
+        self,
+        setting: str,
+        default: int,
+        *,
+        bytes_setting: Optional[str] = None,
+        bytes_default: Optional[int] = None,
+        weigh: Optional[Callable[[Any], int]] = None,
+    ):
+        self.setting = setting
+        self.default = default
+        self.bytes_setting = bytes_setting
+        self.bytes_default = bytes_default
+        self.weigh = weigh
+        self._lock = threading.Lock()
+        self._items: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = int(self.weigh(value)) if self.bytes_setting and self.weigh else 0
+        budget = getattr(settings, self.bytes_setting, self.bytes_default) if self.bytes_setting else None
+        if budget is not None and size > budget:
+            return
+        with self._lock:
+            self._bytes += size - self._sizes.pop(key, 0)
+            self._items[key] = value
+            self._sizes[key] = size
+            self._items.move_to_end(key)
+            capacity = max(int(getattr(settings, self.setting, self.default)), 0)
+            while self._items and (len(self._items) > capacity or (budget is not None and self._bytes > budget)):
+                evicted, _ = self._items.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+
+    def cached(self, key: Hashable, fn: Callable[[], Any], *, name: str) -> Any:
+        """``fn()``, from the cache when present; concurrent misses share one call."""
+
+        value = self.get(key)
+        record_cache(name, value is not None)
+        if value is None:
+            value = coalesce((name, *key), fn, name=f'{name}_singleflight')
+            self.put(key, value)
+        return value
+
+
+_rows = LRUCache(
+    'DOWNSAMPLE_ROWS_CACHE_SIZE',
+    2,
+    bytes_setting='DOWNSAMPLE_ROWS_CACHE_BYTES',
+    bytes_default=128 * 1024 * 1024,
+    weigh=lambda frame: int(frame.memory_usage(deep=True).sum()),
+)
+_results = LRUCache('DOWNSAMPLE_CACHE_SIZE', 64)
+
+
+def _points_frame(dataset: Dataset) -> pd.DataFrame:
+    frame = dataset_records_frame(dataset).rename(columns=COLUMN_FOR_FIELD)
+    return frame[['Type', *NUMERIC_COLUMNS]].astype({'Type': 'category', **{col: float for col in NUMERIC_COLUMNS}})
+
+
+def dataset_points(dataset: Dataset) -> pd.DataFrame:
+    """A dataset's metrics and (categorical) types in upload order, CSV column names, kept for reuse."""
+
+    return _rows.cached((dataset.id,), lambda: _points_frame(dataset), name='downsample_rows')
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the ``threshold`` points Largest-Triangle-Three-Buckets keeps.
+
+    ``x`` must be ascending. The first and last points are always kept; the
+    rest are split into ``threshold - 2`` buckets and each contributes the
+    point forming the largest triangle with the previously kept point and
+    the next bucket's average.
+    """
+
+    n = len(x)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1])
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    widths = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / widths
+    avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / widths
+    next_x = np.append(avg_x[1:], x[n - 1])
+    next_y = np.append(avg_y[1:], y[n - 1])
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def _axis_range(values: np.ndarray, lo: Optional[float], hi: Optional[float]) -> Tuple[float, float]:
+    start = float(values.min()) if lo is None and len(values) else float(lo or 0.0)
+    stop = float(values.max()) if hi is None and len(values) else float(hi if hi is not None else start)
+    if stop < start:
+        start, stop = stop, start
+    return start, stop
+
+
+def grid_sample(
+    x: np.ndarray,
+    y: np.ndarray,
+    *,
+    grid: int,
+    mode: str = 'minmax',
+    x_range: Tuple[Optional[float], Optional[float]] = (None, None),
+    y_range: Tuple[Optional[float], Optional[float]] = (None, None),
+) -> Dict[str, Any]:
+    """Bin points into a ``grid`` x ``grid`` raster over the (x, y) viewport.
+
+    ``minmax`` returns ``{'index'}``, positions of the kept rows, at most two
+    per occupied cell; ``density`` returns ``{'x', 'y', 'count'}`` per
+    occupied cell. Both also carry the resolved ``x_range``/``y_range``.
+    """
+
+    x0, x1 = _axis_range(x, *x_range)
+    y0, y1 = _axis_range(y, *y_range)
+    inside = np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+    xs, ys = x[inside], y[inside]
+    ix = np.clip(((xs - x0) / (x1 - x0) * grid).astype(np.int64), 0, grid - 1) if x1 > x0 else np.zeros(len(xs), dtype=np.int64)
+    iy = np.clip(((ys - y0) / (y1 - y0) * grid).astype(np.int64), 0, grid - 1) if y1 > y0 else np.zeros(len(ys), dtype=np.int64)
+    cell = ix * grid + iy
+    result: Dict[str, Any] = {'x_range': [x0, x1], 'y_range': [y0, y1], 'rows': int(len(inside))}
+
+    if mode == 'density':
+        counts = np.bincount(cell, minlength=grid * grid)
+        occupied = np.flatnonzero(counts)
+        result['x'] = np.bincount(cell, weights=xs, minlength=grid * grid)[occupied] / counts[occupied]
+        result['y'] = np.bincount(cell, weights=ys, minlength=grid * grid)[occupied] / counts[occupied]
+        result['count'] = counts[occupied]
+        return result
+
+    if not len(inside):
+        result['index'] = inside
+        return result
+
+    # Sorted by cell, then y: each cell's first row has its lowest y, its last the highest.
+    order = np.lexsort((ys, cell))
+    sorted_cells = cell[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    picks = np.unique(np.concatenate((order[starts], order[ends])))
+    result['index'] = inside[picks]
+    return result
+
+
+def _filtered(frame: pd.DataFrame, types: Sequence[str]) -> pd.DataFrame:
+    return frame[frame['Type'].isin(types)] if types else frame
+
+
+def _line(dataset: Dataset, metric: str, points: int, types: Tuple[str, ...], start: Optional[int], end: Optional[int]):
+    frame = _filtered(dataset_points(dataset), types)
+    positions = frame.index.to_numpy()
+    if start is not None or end is not None:
+        window = np.ones(len(positions), dtype=bool)
+        if start is not None:
+            window &= positions >= start
+        if end is not None:
+            window &= positions < end
+        frame, positions = frame[window], positions[window]
+    values = frame[metric].to_numpy(dtype=float)
+    kept = lttb(positions.astype(float), values, points)
+    return {
+        'metric': metric,
+        'rows': int(len(values)),
+        'x': positions[kept].tolist(),
+        'y': values[kept].tolist(),
+    }
+
+
+def _scatter(dataset: Dataset, x_metric: str, y_metric: str, grid: int, mode: str, types: Tuple[str, ...], x_range, y_range):
+    frame = _filtered(dataset_points(dataset), types)
+    sampled = grid_sample(
+        frame[x_metric].to_numpy(dtype=float),
+        frame[y_metric].to_numpy(dtype=float),
+        grid=grid,
+        mode=mode,
+        x_range=x_range,
+        y_range=y_range,
+    )
+    result = {
+        'x_metric': x_metric,
+        'y_metric': y_metric,
+        'mode': mode,
+        'grid': grid,
+        'rows': sampled['rows'],
+        'x_range': sampled['x_range'],
+        'y_range': sampled['y_range'],
+    }
+    if mode == 'density':
+        result.update(x=sampled['x'].tolist(), y=sampled['y'].tolist(), count=sampled['count'].tolist())
+    else:
+        rows = frame.iloc[sampled['index']]
+        result.update(
+            x=rows[x_metric].tolist(),
+            y=rows[y_metric].tolist(),
+            type=rows['Type'].tolist(),
+            row=rows.index.tolist(),
+        )
+    return result
+
+
+def downsample_line(dataset: Dataset, metric: str, *, points: int, types: Sequence[str] = (), start=None, end=None) -> Dict[str, Any]:
+    """LTTB-reduced ``metric`` series of ``dataset`` (x = row index), cached."""
+
+    types = tuple(sorted(types))
+    key = (dataset.id, 'line', metric, points, types, start, end)
+    return _results.cached(key, lambda: _line(dataset, metric, points, types, start, end), name='downsample')
+
+
+def downsample_scatter(
+    dataset: Dataset,
+    x_metric: str,
+    y_metric: str,
+    *,
+    grid: int,
+    mode: str = 'minmax',
+    types: Sequence[str] = (),
+    x_range=(None, None),
+    y_range=(None, None),
+) -> Dict[str, Any]:
+    """Grid-binned scatter of ``x_metric`` against ``y_metric``, cached."""
+
+    types = tuple(sorted(types))
+    x_range, y_range = tuple(x_range), tuple(y_range)
+    key = (dataset.id, 'scatter', x_metric, y_metric, grid, mode, types, x_range, y_range)
+    return _results.cached(
+        key,
+        lambda: _scatter(dataset, x_metric, y_metric, grid, mode, types, x_range, y_range),
+        name='downsample',
+    )
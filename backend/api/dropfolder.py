@@ -0,0 +1,283 @@
+"""Drop-folder ingest: pick up CSVs from a local directory.
+
+Layout under the watched directory::
+
+    <dir>/              new CSVs land here
+    <dir>/.processing/  files claimed by a running ingester
+    <dir>/done/         ingested files
+    <dir>/failed/       rejected files, each with a ``<name>.error.txt``
+
+A file is claimed with an atomic ``rename`` into ``.processing/``, so any
+number of ingesters can share a directory without double-ingesting.
+Files are only claimed once their size and mtime have been stable for
+``settle`` seconds; writers should still prefer writing to a dotfile or
+``*.part`` name and renaming it into place. Claimed files go through
+``ingest.ingest_csv`` (the same parse, aggregate and bulk-load path as
+``POST /api/upload/``) on a bounded thread pool. Like a batch upload, each
+burst of files (until the folder drains) defers the retention purge to its
+end and never loses its own datasets, so every file moved to ``done/`` has
+its dataset.
+
+New files are noticed through inotify on Linux (via ctypes, no extra
+dependency) and by polling everywhere else; the poll also runs as a safety
+net alongside inotify.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from django.core.files import File
+from django.db import connection
+
+from .ingest import IngestError, ingest_csv
+from .models import defer_retention
+
+logger = logging.getLogger(__name__)
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class _InotifyWatch:
+    """Minimal inotify wrapper used only as a wake-up signal."""
+
+    def __init__(self, path: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(path)), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed')
+
+    def wait(self, timeout: float) -> bool:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _Throughput:
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.ok = 0
+        self.failed = 0
+        self.rows = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, rows: int, size: int) -> None:
+        with self._lock:
+            if ok:
+                self.ok += 1
+            else:
+                self.failed += 1
+            self.rows += rows
+            self.bytes += size
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        files = self.ok + self.failed
+        return (
+            f"{self.ok} ingested, {self.failed} failed, {self.rows} rows, {self.bytes / 1e6:.1f} MB "
+            f"in {elapsed:.1f}s ({files / elapsed:.2f} files/s, {self.rows / elapsed:.0f} rows/s, "
+            f"{self.bytes / 1e6 / elapsed:.2f} MB/s)"
+        )
+
+
+class DropFolderIngester:
+    def __init__(
+        self,
+        root,
+        user,
+        *,
+        workers: int = 4,
+        tolerant: bool = False,
+        settle: float = 1.0,
+        poll_interval: float = 2.0,
+        report_interval: float = 60.0,
+        use_inotify: bool = True,
+    ):
+        self.root = Path(root)
+        self.processing = self.root / '.processing'
+        self.done = self.root / 'done'
+        self.failed = self.root / 'failed'
+        self.user = user
+        self.workers = max(1, int(workers))
+        self.tolerant = tolerant
+        self.settle = float(settle)
+        self.poll_interval = float(poll_interval)
+        self.report_interval = float(report_interval)
+        self.use_inotify = use_inotify
+        self.stats = _Throughput()
+        self.stop_event = threading.Event()
+        self._seen: Dict[str, Tuple[int, float]] = {}
+
+    # -------------------------------------------------------------- files
+
+    def prepare(self) -> None:
+        for path in (self.root, self.processing, self.done, self.failed):
+            path.mkdir(parents=True, exist_ok=True)
+        # Files left claimed by a crashed run go back to the queue.
+        for leftover in self.processing.iterdir():
+            original = leftover.name.split('__', 1)[-1]
+            try:
+                os.rename(leftover, self._unique(self.root, original))
+                logger.warning('Re-queued %s left over from a previous run', original)
+            except FileNotFoundError:
+                pass
+
+    def ready_files(self):
+        """Names of CSVs in the drop folder whose size and mtime have settled."""
+
+        now = time.time()
+        current: Dict[str, Tuple[int, float]] = {}
+        ready = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith('.') or not name.lower().endswith('.csv') or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                current[name] = (st.st_size, st.st_mtime)
+                if self._seen.get(name) == current[name] and now - st.st_mtime >= self.settle:
+                    ready.append(name)
+        self._seen = current
+        return sorted(ready)
+
+    def claim(self, name: str) -> Optional[Path]:
+        claimed = self.processing / f"{uuid.uuid4().hex}__{name}"
+        try:
+            os.rename(self.root / name, claimed)
+        except FileNotFoundError:
+            # Another ingester got it first.
+            return None
+        self._seen.pop(name, None)
+        return claimed
+
+    @staticmethod
+    def _unique(directory: Path, name: str) -> Path:
+        target = directory / name
+        if not target.exists():
+            return target
+        stem, ext = os.path.splitext(name)
+        return directory / f"{stem}.{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}{ext}"
+
+    # ------------------------------------------------------------- ingest
+
+    def ingest_one(self, claimed: Path) -> bool:
+        name = claimed.name.split('__', 1)[-1]
+        size = claimed.stat().st_size
+        started = time.monotonic()
+        try:
+            with open(claimed, 'rb') as fh:
+                dataset, rejected_rows = ingest_csv(self.user, File(fh, name=name), tolerant=self.tolerant)
+        except Exception as exc:
+            if not isinstance(exc, IngestError):
+                logger.exception('Unexpected error ingesting %s', name)
+            target = self._unique(self.failed, name)
+            os.rename(claimed, target)
+            target.with_name(target.name + '.error.txt').write_text(f"{exc}\n", encoding='utf-8')
+            self.stats.record(False, 0, size)
+            logger.warning('Rejected %s: %s', name, exc)
+            return False
+        finally:
+            connection.close()
+
+        os.rename(claimed, self._unique(self.done, name))
+        rows = int(dataset.total_equipment or 0)
+        self.stats.record(True, rows, size)
+        extra = f", {rejected_rows} quarantined" if rejected_rows else ''
+        logger.info(
+            'Ingested %s as dataset %s (%d rows%s) in %.2fs',
+            name, dataset.id, rows, extra, time.monotonic() - started,
+        )
+        return True
+
+    # --------------------------------------------------------------- loop
+
+    def _watcher(self):
+        if not self.use_inotify:
+            return None
+        try:
+            return _InotifyWatch(self.root)
+        except (OSError, AttributeError) as exc:
+            logger.info('inotify unavailable (%s); polling every %.1fs', exc, self.poll_interval)
+            return None
+
+    def run(self, *, once: bool = False) -> _Throughput:
+        """Ingest until ``stop_event`` is set (or, with ``once``, until the folder is drained)."""
+
+        self.prepare()
+        watcher = self._watcher()
+        in_flight: Dict[Future, Path] = {}
+        burst = None
+        next_report = time.monotonic() + self.report_interval
+        if once:
+            # Nothing is being written in one-shot mode; don't wait for files to settle.
+            self.settle = 0.0
+            self.ready_files()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dropfolder') as pool:
+                while True:
+                    if not self.stop_event.is_set():
+                        for name in self.ready_files():
+                            if len(in_flight) >= self.workers * 2:
+                                break
+                            claimed = self.claim(name)
+                            if claimed is not None:
+                                if burst is None:
+                                    burst = defer_retention(self.user)
+                                in_flight[pool.submit(self.ingest_one, claimed)] = claimed
+
+                    if in_flight:
+                        finished, _ = wait(list(in_flight), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            in_flight.pop(future)
+                            future.result()
+                        if not in_flight and burst is not None:
+                            burst.release()
+                            burst = None
+                    elif self.stop_event.is_set() or (once and not self.ready_files()):
+                        break
+                    elif watcher is not None:
+                        watcher.wait(min(self.poll_interval, max(self.settle, 0.1)))
+                    else:
+                        self.stop_event.wait(self.poll_interval)
+
+                    if time.monotonic() >= next_report:
+                        logger.info('Drop folder throughput: %s', self.stats.line())
+                        next_report = time.monotonic() + self.report_interval
+        finally:
+            if burst is not None:
+                burst.release()
+            if watcher is not None:
+                watcher.close()
+            logger.info('Drop folder totals: %s', self.stats.line())
+        return self.stats
@@ -0,0 +1,155 @@
+"""Streaming export of a dataset's validated rows as CSV, Parquet or XLSX.
+
+Each writer consumes ``archive.iter_dataset_records`` chunk by chunk and
+yields bytes, so memory stays bounded by ``EXPORT_CHUNK_ROWS`` whatever the
+dataset size:
+
+- CSV sends the header at once and then one block per chunk;
+- Parquet writes one row group per chunk and yields it as soon as it is
+  encoded (the footer follows the last group);
+- XLSX is a zip whose directory comes last, so openpyxl's write-only mode
+  spools the sheet to a temporary file and the finished workbook is then
+  streamed from disk. Sheets are split at Excel's row limit.
+
+``pyarrow`` (Parquet) and ``openpyxl`` (XLSX) are optional; the view
+answers 501 for a format whose library is missing.
+"""
+
+from __future__ import annotations
+
+import io
+import tempfile
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import pandas as pd
+from django.conf import settings
+
+from .archive import iter_dataset_records
+from .utils import COLUMN_FOR_FIELD, REQUIRED_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # pragma: no cover - optional dependency
+    Workbook = None
+
+# Excel's hard limit, including the header row.
+XLSX_MAX_ROWS = 1_048_576
+
+_STREAM_BLOCK = 64 * 1024
+
+
+class ExportFormat(NamedTuple):
+    name: str
+    content_type: str
+    writer: Callable[[Iterable[pd.DataFrame]], Iterator[bytes]]
+    available: bool
+
+
+def export_chunk_rows() -> int:
+    return int(getattr(settings, 'EXPORT_CHUNK_ROWS', 50_000))
+
+
+def _frames(dataset, types) -> Iterator[pd.DataFrame]:
+    for chunk in iter_dataset_records(dataset, types=types, chunk_size=export_chunk_rows()):
+        yield chunk.rename(columns=COLUMN_FOR_FIELD)[REQUIRED_COLUMNS]
+
+
+def write_csv(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    yield (','.join(REQUIRED_COLUMNS) + '\n').encode('utf-8')
+    for frame in frames:
+        yield frame.to_csv(header=False, index=False).encode('utf-8')
+
+
+class _PositionSink(io.RawIOBase):
+    """Write-only sink that hands out what was written but keeps counting
+    positions, since Parquet footers record absolute offsets."""
+
+    def __init__(self) -> None:
+        self._parts = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ('Equipment Name', pa.string()),
+        ('Type', pa.string()),
+        ('Flowrate', pa.float64()),
+        ('Pressure', pa.float64()),
+        ('Temperature', pa.float64()),
+    ])
+
+
+def write_parquet(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    schema = _parquet_schema()
+    sink = _PositionSink()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for frame in frames:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def write_xlsx(frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    workbook = Workbook(write_only=True)
+    sheet = None
+    rows_in_sheet = 0
+    for frame in frames:
+        for row in frame.itertuples(index=False, name=None):
+            if sheet is None or rows_in_sheet >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Data {len(workbook.worksheets) + 1}" if sheet else 'Data')
+                sheet.append(REQUIRED_COLUMNS)
+                rows_in_sheet = 1
+            sheet.append(row)
+            rows_in_sheet += 1
+    if sheet is None:
+        workbook.create_sheet('Data').append(REQUIRED_COLUMNS)
+
+    with tempfile.TemporaryFile() as fh:
+        workbook.save(fh)
+        fh.seek(0)
+        while True:
+            block = fh.read(_STREAM_BLOCK)
+            if not block:
+                break
+            yield block
+
+
+EXPORT_FORMATS = {
+    'csv': ExportFormat('csv', 'text/csv', write_csv, True),
+    'parquet': ExportFormat('parquet', 'application/vnd.apache.parquet', write_parquet, pq is not None),
+    'xlsx': ExportFormat(
+        'xlsx',
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        write_xlsx,
+        Workbook is not None,
+    ),
+}
+
+
+def stream_export(dataset, fmt: ExportFormat, *, types=None) -> Iterator[bytes]:
+    return fmt.writer(_frames(dataset, types))
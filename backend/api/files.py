@@ -0,0 +1,145 @@
+"""Streaming delivery of stored files (original CSVs, report PDFs).
+
+``serve_stored_file`` never reads a whole file into Python memory:
+
+- a full download is a ``FileResponse`` over the open file, which WSGI
+  servers with ``wsgi.file_wrapper`` (gunicorn, uWSGI) send with
+  ``sendfile(2)``;
+- a single ``Range: bytes=...`` request gets ``206 Partial Content`` with
+  the slice streamed in chunks (``416`` when unsatisfiable); multi-range
+  requests are answered with the full file, as RFC 9110 allows;
+- with ``FILE_DOWNLOAD_OFFLOAD`` set, Python only sends headers and the
+  front proxy serves the bytes itself: ``'x-sendfile'`` (Apache
+  mod_xsendfile, lighttpd) sends the absolute path, ``'x-accel-redirect'``
+  (nginx) sends ``FILE_DOWNLOAD_ACCEL_PREFIX`` + the storage name. The proxy
+  then handles ranges too.
+
+Responses carry an ``ETag`` built from size and mtime, honour
+``If-None-Match`` (``304``) and ``If-Range``.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_CHUNK_SIZE = 64 * 1024
+
+
+def _etag(size: int, mtime: float) -> str:
+    return f'"{size:x}-{int(mtime * 1_000_000):x}"'
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive ``(start, end)`` of a single byte range.
+
+    Returns None when there is no usable single range (serve the whole file):
+    no header, multiple ranges, or an invalid one such as ``bytes=5-2``, which
+    RFC 9110 says to ignore. Raises ValueError only for a valid range that
+    cannot be satisfied (first byte past the end, or an empty suffix).
+    """
+
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    end = int(last) if last else size - 1
+    return start, min(end, size - 1)
+
+
+def _read_range(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload_response(field_file, path: str) -> Optional[HttpResponse]:
+    mode = getattr(settings, 'FILE_DOWNLOAD_OFFLOAD', None)
+    if not mode:
+        return None
+    response = HttpResponse()
+    if mode == 'x-sendfile':
+        response['X-Sendfile'] = path
+    elif mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'FILE_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(field_file.name.replace(os.sep, '/'))
+    else:
+        raise ValueError(f"Unknown FILE_DOWNLOAD_OFFLOAD: {mode!r}")
+    return response
+
+
+def serve_stored_file(request, field_file, *, filename: str, content_type: str) -> HttpResponse:
+    """Stream a ``FieldFile`` from local storage as an attachment download.
+
+    Raises ``FileNotFoundError`` when the file is missing from storage.
+    """
+
+    path = field_file.path
+    stat = os.stat(path)
+    etag = _etag(stat.st_size, stat.st_mtime)
+
+    if etag in [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    response = _offload_response(field_file, path)
+    if response is not None:
+        response['Content-Type'] = content_type
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        response['ETag'] = etag
+        return response
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, stat.st_size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
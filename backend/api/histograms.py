@@ -0,0 +1,260 @@
+"""Precomputed per-type histograms of the numeric metrics.
+
+Ingest bins every metric into at most ``FINE_BINS`` fine bins per
+equipment type and stores the counts compactly with the dataset
+(``DatasetSketch.histograms``). Half the fine edges are quantiles of the
+metric, so resolution follows the data; the other half split its far-out
+fences evenly, so the tails are resolved too and a far outlier sits in a
+bin of its own instead of squeezing everything else into the first. A
+metric with at most ``FINE_BINS`` distinct values is stored exactly, one
+count per value.
+
+``rebin`` derives what charts ask for from the fine bins without touching
+the rows. Counts are read off the cumulative distribution, interpolated
+linearly inside a fine bin (rows are taken as evenly spread there), so a
+coarse bin that cuts a fine bin gets its share of it rather than all or
+nothing:
+
+- ``'fixed'``: ``bins`` equal-width bins over a zoomed ``[lo, hi]`` range,
+  or by default over Tukey's far-out fences (``Q1 - 3 IQR``, ``Q3 + 3 IQR``)
+  clipped to the data, so outliers do not flatten the chart; rows outside
+  the range are reported as ``below`` / ``above``;
+- ``'adaptive'``: up to ``bins`` bins of roughly equal counts over the
+  full range (or the zoom).
+
+A zoom spanning fewer than ``MIN_ZOOM_FINE_BINS`` fine bins is finer than
+what is stored, so it is counted from the rows instead (when ``rebin`` is
+given them).
+
+Datasets ingested before the current ``HISTOGRAM_VERSION`` get their
+histograms rebuilt from the stored rows on first request
+(``dataset_histograms``).
+
+Stored form::
+
+    {'version': 2, 'bins': 1024,
+     'metrics': {metric: {'min', 'max', 'discrete', 'edges': '<base64 zlib float64>',
+                          'counts': {type: '<base64 zlib int64>'}}}}
+
+``edges`` are the fine-bin edges, or the distinct values when ``discrete``.
+"""
+
+from __future__ import annotations
+
+import base64
+import zlib
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .archive import dataset_records_frame
+from .models import Dataset, DatasetSketch
+from .singleflight import coalesce
+from .utils import COLUMN_FOR_FIELD, NUMERIC_COLUMNS
+
+# 2: quantile and fence fine edges, exact counts for discrete metrics.
+HISTOGRAM_VERSION = 2
+FINE_BINS = 1024
+HISTOGRAM_MODES = ('fixed', 'adaptive')
+# Zooms covering fewer stored fine bins than this are counted from the rows.
+MIN_ZOOM_FINE_BINS = 16
+# Default range of 'fixed' histograms: Tukey's far-out fences.
+FENCE_K = 3.0
+
+
+def _pack(counts: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(counts, dtype='<i8').tobytes())).decode('ascii')
+
+
+def _unpack(text: str) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype='<i8')
+
+
+def _pack_edges(edges: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(edges, dtype='<f8').tobytes())).decode('ascii')
+
+
+def _unpack_edges(text: str) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype='<f8')
+
+
+def _metric_entry(values: np.ndarray, codes: np.ndarray, types: Sequence[str], bins: int) -> Dict[str, Any]:
+    finite = np.isfinite(values)
+    values, codes = values[finite], codes[finite]
+    if not len(values):
+        return {'min': 0.0, 'max': 0.0, 'discrete': True, 'edges': _pack_edges(np.zeros(0)), 'counts': {}}
+    ordered = np.sort(values)
+    distinct = ordered[np.r_[True, ordered[1:] != ordered[:-1]]]
+    if len(distinct) <= bins:
+        edges, discrete = distinct, True
+        index = np.searchsorted(distinct, values)
+        width = len(distinct)
+    else:
+        # Half the edges at quantiles, half evenly over the far-out fences:
+        # rows past the fences (or beyond a gap) never share a bin with the bulk.
+        quantiles = ordered[np.linspace(0, len(ordered) - 1, bins // 2 + 1).round().astype(np.int64)]
+        q1, q3 = ordered[int(0.25 * (len(ordered) - 1))], ordered[int(0.75 * (len(ordered) - 1))]
+        lo, hi = max(ordered[0], q1 - FENCE_K * (q3 - q1)), min(ordered[-1], q3 + FENCE_K * (q3 - q1))
+        edges, discrete = np.unique(np.concatenate((quantiles, np.linspace(lo, hi, bins - bins // 2)))), False
+        index = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+        width = len(edges) - 1
+    counts = np.bincount(codes * width + index, minlength=len(types) * width).reshape(len(types), width)
+    return {
+        'min': float(ordered[0]),
+        'max': float(ordered[-1]),
+        'discrete': discrete,
+        'edges': _pack_edges(edges),
+        'counts': {name: _pack(row) for name, row in zip(types, counts) if row.any()},
+    }
+
+
+def build_histograms(df: pd.DataFrame, metrics: Sequence[str], *, type_column='Type', bins: int = FINE_BINS) -> Dict[str, Any]:
+    """Fine-grained per-type histograms of ``metrics`` in a validated frame."""
+
+    codes, types = pd.factorize(df[type_column].astype(str), sort=True)
+    codes = codes.astype(np.int64)
+    types = [str(t) for t in types]
+    return {
+        'version': HISTOGRAM_VERSION,
+        'bins': bins,
+        'metrics': {metric: _metric_entry(df[metric].to_numpy(dtype=float), codes, types, bins) for metric in metrics},
+    }
+
+
+def _cdf(entry: Dict[str, Any], edges: np.ndarray, matrix: np.ndarray, x, *, closed: bool = False) -> np.ndarray:
+    """Rows of each ``matrix`` row below each of ``x`` (at or below, with ``closed``)."""
+
+    x = np.asarray(x, dtype=float)
+    cum = np.concatenate((np.zeros((len(matrix), 1)), np.cumsum(matrix, axis=1)), axis=1)
+    if entry['discrete']:
+        return cum[:, np.searchsorted(edges, x, side='right' if closed else 'left')]
+    j = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, len(edges) - 2)
+    fraction = np.clip((x - edges[j]) / (edges[j + 1] - edges[j]), 0.0, 1.0)
+    return cum[:, j] + fraction * matrix[:, j]
+
+
+def _positions(entry: Dict[str, Any], edges: np.ndarray, total_row: np.ndarray, ranks) -> np.ndarray:
+    """Values below which ``ranks`` rows lie (the inverse of ``_cdf``)."""
+
+    cum = np.concatenate(([0], np.cumsum(total_row)))
+    if entry['discrete']:
+        return edges[np.clip(np.searchsorted(cum[1:], ranks, side='left'), 0, len(edges) - 1)]
+    return np.interp(ranks, cum, edges)
+
+
+def _fences(entry: Dict[str, Any], edges: np.ndarray, total_row: np.ndarray) -> Tuple[float, float]:
+    total = int(total_row.sum())
+    if not total:
+        return entry['min'], entry['max']
+    q1, q3 = _positions(entry, edges, total_row, [0.25 * total, 0.75 * total])
+    spread = FENCE_K * (q3 - q1)
+    if spread <= 0:
+        return entry['min'], entry['max']
+    return max(entry['min'], float(q1 - spread)), min(entry['max'], float(q3 + spread))
+
+
+def _rebin_rows(frame: pd.DataFrame, metric: str, *, bins: int, mode: str, types, start: float, stop: float) -> Dict[str, Any]:
+    if types is not None:
+        frame = frame[frame['Type'].isin(list(types))]
+    values = frame[metric].to_numpy(dtype=float)
+    inside = (values >= start) & (values <= stop)
+    codes, names = pd.factorize(frame['Type'].astype(str)[inside], sort=True)
+    entry = _metric_entry(values[inside], codes.astype(np.int64), [str(n) for n in names], FINE_BINS)
+    result = rebin({'metrics': {metric: entry}}, metric, bins=bins, mode=mode, lo=start, hi=stop)
+    result.update(below=int((values < start).sum()), above=int((values > stop).sum()))
+    return result
+
+
+def rebin(
+    stored: Dict[str, Any],
+    metric: str,
+    *,
+    bins: int,
+    mode: str = 'fixed',
+    types: Optional[Iterable[str]] = None,
+    lo: Optional[float] = None,
+    hi: Optional[float] = None,
+    rows: Optional[Callable[[], pd.DataFrame]] = None,
+) -> Dict[str, Any]:
+    """Histogram of ``metric`` with at most ``bins`` bins from stored fine bins.
+
+    Returns ``{'edges', 'counts', 'total', 'below', 'above', 'types': {type:
+    counts}}``; every per-type count list shares ``edges``. ``rows``
+    returns the dataset's rows (CSV column names) for zooms finer than the
+    stored bins.
+    """
+
+    entry = stored['metrics'][metric]
+    edges = _unpack_edges(entry['edges'])
+    width = len(edges) if entry['discrete'] else max(len(edges) - 1, 0)
+    names = sorted(entry['counts']) if types is None else [t for t in types if t in entry['counts']]
+    matrix = np.array([_unpack(entry['counts'][name]) for name in names], dtype=np.int64).reshape(len(names), width)
+    total_row = matrix.sum(axis=0)
+
+    if lo is not None or hi is not None:
+        start = entry['min'] if lo is None else float(lo)
+        stop = entry['max'] if hi is None else float(hi)
+        if stop < start:
+            start, stop = stop, start
+        covered = np.searchsorted(edges, stop, side='left') - np.searchsorted(edges, start, side='right') + 1
+        if rows is not None and not entry['discrete'] and covered < MIN_ZOOM_FINE_BINS:
+            return _rebin_rows(rows(), metric, bins=bins, mode=mode, types=types, start=start, stop=stop)
+    elif mode == 'fixed':
+        start, stop = _fences(entry, edges, total_row)
+    else:
+        start, stop = entry['min'], entry['max']
+
+    if not width:
+        matrix = np.zeros((len(names), 1), dtype=np.int64)
+        bin_edges = np.array([start, stop])
+        counts = np.zeros((len(names), 1), dtype=np.int64)
+        below = above = 0
+    else:
+        if mode == 'adaptive' and total_row.any():
+            first = _cdf(entry, edges, total_row[None], [start])[0, 0]
+            last = _cdf(entry, edges, total_row[None], [stop], closed=True)[0, 0]
+            inner = _positions(entry, edges, total_row, first + np.arange(1, bins) * (last - first) / bins)
+            bin_edges = np.unique(np.clip(np.concatenate(([start], inner, [stop])), start, stop))
+            if len(bin_edges) < 2:
+                bin_edges = np.array([start, stop])
+        else:
+            bin_edges = np.linspace(start, stop, bins + 1)
+        cum = np.concatenate(
+            (
+                np.rint(_cdf(entry, edges, matrix, bin_edges[:-1])),
+                np.rint(_cdf(entry, edges, matrix, bin_edges[-1:], closed=True)),
+            ),
+            axis=1,
+        )
+        counts = np.diff(cum, axis=1).astype(np.int64)
+        below = int(cum[:, 0].sum())
+        above = int(total_row.sum() - cum[:, -1].sum())
+
+    by_type = {name: [int(c) for c in row] for name, row in zip(names, counts)}
+    overall = counts.sum(axis=0) if len(names) else np.zeros(len(bin_edges) - 1, dtype=np.int64)
+    return {
+        'edges': [float(e) for e in bin_edges],
+        'counts': [int(c) for c in overall],
+        'total': int(overall.sum()),
+        'below': below,
+        'above': above,
+        'types': by_type,
+    }
+
+
+def _build_from_storage(dataset_id: int) -> Dict[str, Any]:
+    dataset = Dataset.objects.get(pk=dataset_id)
+    frame = dataset_records_frame(dataset).rename(columns=COLUMN_FOR_FIELD)
+    histograms = build_histograms(frame, NUMERIC_COLUMNS)
+    DatasetSketch.objects.update_or_create(dataset=dataset, defaults={'histograms': histograms})
+    return histograms
+
+
+def dataset_histograms(dataset: Dataset) -> Dict[str, Any]:
+    """Stored histograms of ``dataset``, built from its rows if missing."""
+
+    stored = DatasetSketch.objects.filter(dataset=dataset).values_list('histograms', flat=True).first()
+    if stored and stored.get('version') == HISTOGRAM_VERSION:
+        return stored
+    return coalesce(('histograms', dataset.id), lambda: _build_from_storage(dataset.id), name='histogram_build')
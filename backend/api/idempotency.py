@@ -0,0 +1,220 @@
+"""``Idempotency-Key`` support for non-idempotent endpoints (uploads, reports).
+
+A client that may retry a request (after a timeout, or because the user
+clicked twice) sends the same ``Idempotency-Key`` header with every
+attempt. The first request claims the key in ``IdempotencyRecord`` and runs;
+its outcome is stored and later duplicates get it replayed (with
+``Idempotent-Replayed: true``) instead of running again. Duplicates that
+arrive while the original is still running wait for it, for up to
+``IDEMPOTENCY_WAIT_TIMEOUT`` seconds, and then get ``409`` with
+``Retry-After``.
+
+- A claim whose request has not finished within ``IDEMPOTENCY_CLAIM_LEASE``
+  seconds (default: four wait timeouts) is presumed dead (its worker
+  crashed or was restarted) and the next duplicate takes the key over and
+  runs. Streamed responses renew their lease as they go.
+- Keys are scoped per user and kept for ``IDEMPOTENCY_KEY_TTL`` seconds.
+- A key reused for a different request (other endpoint, parameters or
+  file contents) gets ``422``.
+- Failures that are worth retrying (``409``, ``429``, ``5xx``, exceptions) release
+  the key rather than being replayed.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import time
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+_HASH_BLOCK = 1024 * 1024
+
+
+def key_ttl() -> timedelta:
+    return timedelta(seconds=float(getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600)))
+
+
+def claim_lease() -> timedelta:
+    default = 4 * float(getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 30.0))
+    return timedelta(seconds=float(getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE', default)))
+
+
+def request_fingerprint(request, scope: str) -> str:
+    """Hash everything that makes two requests "the same": scope, method,
+    path, query and form parameters and the uploaded files' contents."""
+
+    digest = hashlib.sha256()
+
+    def feed(*parts):
+        for part in parts:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+
+    feed(scope, request.method, request.path)
+    for name in sorted(request.query_params):
+        feed('q', name, *request.query_params.getlist(name))
+    data = request.data
+    if hasattr(data, 'getlist'):
+        for name in sorted(k for k in data if k not in request.FILES):
+            feed('d', name, *data.getlist(name))
+    elif data:
+        feed('d', repr(data))
+    for name in sorted(request.FILES):
+        for uploaded in request.FILES.getlist(name):
+            feed('f', name, uploaded.name, uploaded.size)
+            for chunk in uploaded.chunks(_HASH_BLOCK):
+                digest.update(chunk)
+            uploaded.seek(0)
+    return digest.hexdigest()
+
+
+def _claim(user, key: str, fingerprint: str):
+    """Return ``(record, created)``; ``record`` is None if it vanished meanwhile."""
+
+    now = timezone.now()
+    cutoff = now - key_ttl()
+    try:
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(user=user, key=key, fingerprint=fingerprint)
+    except IntegrityError:
+        record = IdempotencyRecord.objects.filter(user=user, key=key).first()
+        if record is not None and (
+            record.created_at < cutoff or (record.completed_at is None and record.created_at < now - claim_lease())
+        ):
+            # Expired, or its request died: forget it and claim the key afresh.
+            # Conditional, so of several duplicates only one takes over.
+            IdempotencyRecord.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+            return None, False
+        return record, False
+    IdempotencyRecord.objects.filter(user=user, created_at__lt=cutoff).delete()
+    return record, True
+
+
+def _tee_stream(record: IdempotencyRecord, content):
+    parts = []
+    completed = False
+    renew_every = claim_lease().total_seconds() / 3
+    renewed = time.monotonic()
+    try:
+        for chunk in content:
+            parts.append(chunk)
+            if time.monotonic() - renewed > renew_every:
+                renewed = time.monotonic()
+                IdempotencyRecord.objects.filter(pk=record.pk).update(created_at=timezone.now())
+            yield chunk
+        completed = True
+    finally:
+        if completed:
+            _finish(record, 'ndjson', b''.join(parts).decode('utf-8'))
+        else:
+            record.delete()
+
+
+def _finish(record: IdempotencyRecord, kind: str, body) -> None:
+    record.kind = kind
+    record.body = body
+    record.completed_at = timezone.now()
+    # An update rather than save(): if the lease ran out and another request
+    # took the key over, this record is gone and there is nothing to store.
+    IdempotencyRecord.objects.filter(pk=record.pk).update(
+        kind=kind, body=body, status_code=record.status_code, completed_at=record.completed_at
+    )
+
+
+def _store(record: IdempotencyRecord, response):
+    code = response.status_code
+    if code in (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS) or code >= 500:
+        record.delete()
+        return response
+    record.status_code = code
+    if hasattr(response, 'idempotent_result'):
+        _finish(record, 'result', response.idempotent_result)
+    elif isinstance(response, Response):
+        _finish(record, 'data', response.data)
+    elif isinstance(response, StreamingHttpResponse) and response.get('Content-Type', '').startswith('application/x-ndjson'):
+        response.streaming_content = _tee_stream(record, response.streaming_content)
+    else:
+        # Nothing we know how to replay; let duplicates run again.
+        record.delete()
+    return response
+
+
+def _replay(view, request, record: IdempotencyRecord, replay: Optional[Callable], args, kwargs):
+    if record.kind == 'result' and replay is not None:
+        response = replay(view, request, record.body, *args, **kwargs)
+    elif record.kind == 'ndjson':
+        response = HttpResponse(record.body, status=record.status_code, content_type='application/x-ndjson')
+    else:
+        response = Response(record.body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope: str, *, replay: Optional[Callable] = None):
+    """Decorator for APIView handlers honouring the ``Idempotency-Key`` header.
+
+    A handler whose response cannot be replayed from DRF data or NDJSON sets
+    ``response.idempotent_result`` to a JSON-able value; duplicates then get
+    ``replay(view, request, result, *args, **kwargs)``.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = (request.headers.get(HEADER) or '').strip()
+            if not key:
+                return method(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'detail': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            fingerprint = request_fingerprint(request, scope)
+            deadline = time.monotonic() + float(getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 30.0))
+            delay = 0.05
+            while True:
+                record, created = _claim(request.user, key, fingerprint)
+                if created:
+                    break
+                if record is not None:
+                    if record.fingerprint != fingerprint:
+                        return Response(
+                            {'detail': f'{HEADER} was already used for a different request.'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        )
+                    if record.completed_at is not None:
+                        return _replay(self, request, record, replay, args, kwargs)
+                if time.monotonic() >= deadline:
+                    response = Response(
+                        {'detail': 'A request with this Idempotency-Key is still in progress.'},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+
+            try:
+                response = method(self, request, *args, **kwargs)
+            except BaseException:
+                record.delete()
+                raise
+            return _store(record, response)
+
+        return wrapper
+
+    return decorator
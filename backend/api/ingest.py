@@ -0,0 +1,418 @@
+"""CSV ingest: parse, store and persist one upload, or a batch in parallel.
+
+``ingest_csv`` is what ``POST /api/upload/`` does for a single CSV.
+``ingest_batch`` runs it for many CSVs (several ``file`` parts and/or ZIP
+archives of CSVs) on a thread pool and yields per-file results as they
+finish. ZIP members are streamed out of the archive one at a time into
+spooled temporary files, so a batch never holds more than
+``UPLOAD_BATCH_WORKERS`` members in memory.
+
+``start_async_ingest`` answers a single upload straight away with an
+approximate summary from a sample of the file (``sampling.py``) and
+finishes the ingest in the background (``finish_ingest``). Background
+ingests die with their process; ``recover_ingests`` (the
+``recover_ingests`` command, run at startup) resumes the ones left
+``processing`` from the stored file. Only one finisher can complete a
+dataset, so a resumed ingest that races a live one wastes work but does
+not duplicate rows.
+
+Parsing and analytics run concurrently. On SQLite, which allows a single
+writer, the database writes are serialized with a lock; other backends
+write in parallel too.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .instrumentation import stage
+from .metrics import ROWS_INGESTED, ROWS_REJECTED
+from .models import Dataset, DatasetSketch, EquipmentRecord, QuarantinedRow, deferred_retention
+from .anomalies import detect_anomalies, store_anomalies
+from .histograms import build_histograms
+from .sampling import approximate_summary
+from .sketches import sketches_for
+from .utils import ANALYTICS_VERSION, NUMERIC_COLUMNS, REQUIRED_COLUMNS, CSVValidationError, parse_and_analyze_csv
+
+logger = logging.getLogger(__name__)
+
+_sqlite_write_lock = threading.Lock()
+
+# Members at most this large are spooled in memory, bigger ones on disk.
+_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+_COPY_BLOCK = 1024 * 1024
+
+
+class IngestError(Exception):
+    """A CSV that could not be ingested; the message is safe to show users."""
+
+
+class _AlreadyFinished(Exception):
+    """Another finisher completed (or failed) this ``processing`` dataset first."""
+
+
+def _rewind(fileobj) -> None:
+    try:
+        fileobj.seek(0)
+    except Exception:
+        pass
+
+
+def parse_csv(uploaded_file, *, tolerant: bool = False):
+    """Parse and analyze one CSV without touching the database.
+
+    Returns ``(summary, df, rejected)``; ``rejected`` is None in strict
+    mode. Raises ``IngestError`` when the CSV is rejected.
+    """
+
+    rejected = None
+    try:
+        _rewind(uploaded_file)
+        with stage('parse'):
+            if tolerant:
+                summary, df, rejected = parse_and_analyze_csv(uploaded_file, return_df=True, tolerant=True)
+            else:
+                summary, df = parse_and_analyze_csv(uploaded_file, return_df=True)
+    except CSVValidationError as exc:
+        raise IngestError(str(exc)) from exc
+    except Exception as exc:
+        logger.exception('Unexpected error during CSV analytics')
+        raise IngestError(f'Failed to process CSV: {exc}') from exc
+    return summary, df, rejected
+
+
+def persist_csv(user, uploaded_file, summary, df, rejected=None, *, dataset=None) -> Tuple[Dataset, Optional[int]]:
+    """Store a parsed CSV (see ``parse_csv``) as a new dataset with its rows,
+    or complete ``dataset`` when given (asynchronous uploads)."""
+
+    safe_original = os.path.basename(uploaded_file.name)
+    # Normally already built by compute_summary; outside the write lock either way.
+    sketches = sketches_for(df, NUMERIC_COLUMNS)
+    with stage('histograms'):
+        histograms = build_histograms(df, NUMERIC_COLUMNS)
+    with stage('anomalies'):
+        anomalies = detect_anomalies(df, NUMERIC_COLUMNS)
+    write_lock = _sqlite_write_lock if connection.vendor == 'sqlite' else None
+    if write_lock is not None:
+        write_lock.acquire()
+    try:
+        dataset = _persist(user, uploaded_file, safe_original, summary, df, rejected, dataset, sketches, histograms, anomalies)
+    finally:
+        if write_lock is not None:
+            write_lock.release()
+
+    ROWS_INGESTED.inc(len(df))
+    if rejected is not None:
+        ROWS_REJECTED.inc(len(rejected))
+    return dataset, (int(len(rejected)) if rejected is not None else None)
+
+
+def ingest_csv(user, uploaded_file, *, tolerant: bool = False) -> Tuple[Dataset, Optional[int]]:
+    """Parse, store and persist one CSV upload.
+
+    Returns ``(dataset, rejected_rows)``; ``rejected_rows`` is None in
+    strict mode. Raises ``IngestError`` when the CSV is rejected.
+    """
+
+    summary, df, rejected = parse_csv(uploaded_file, tolerant=tolerant)
+    return persist_csv(user, uploaded_file, summary, df, rejected)
+
+
+def _persist(
+    user, uploaded_file, safe_original, summary, df, rejected, dataset=None, sketches=None, histograms=None, anomalies=None
+) -> Dataset:
+    with transaction.atomic():
+        if dataset is None:
+            dataset = Dataset.objects.create(
+                user=user, file_name=safe_original, summary=summary, analytics_version=ANALYTICS_VERSION
+            )
+            _store_file(dataset, uploaded_file, safe_original)
+        else:
+            # Conditional and the transaction's first write, so of two racing
+            # finishers (see recover_ingests) only one stores rows.
+            if not Dataset.objects.filter(pk=dataset.pk, state='processing').update(state='ready'):
+                raise _AlreadyFinished(dataset.pk)
+            dataset.summary = summary
+            dataset.analytics_version = ANALYTICS_VERSION
+            dataset.state = 'ready'
+            dataset.processing_error = ''
+            dataset.save(update_fields=['summary', 'analytics_version', 'state', 'processing_error'])
+        if sketches is not None:
+            DatasetSketch.objects.update_or_create(dataset=dataset, defaults={'data': sketches, 'histograms': histograms or {}})
+
+        # Persist per-row CSV data in the DB.
+        with stage('insert'):
+            records = []
+            for _, row in df.iterrows():
+                records.append(
+                    EquipmentRecord(
+                        dataset=dataset,
+                        equipment_name=str(row['Equipment Name']),
+                        type=str(row['Type']),
+                        flowrate=float(row['Flowrate']),
+                        pressure=float(row['Pressure']),
+                        temperature=float(row['Temperature']),
+                    )
+                )
+            EquipmentRecord.objects.bulk_create(records, batch_size=1000)
+            if anomalies is not None:
+                store_anomalies(dataset, df, anomalies, NUMERIC_COLUMNS)
+
+            if rejected is not None and len(rejected):
+                # Keep the original text of each rejected cell so the download round-trips.
+                raw_values = rejected[REQUIRED_COLUMNS].astype(object).where(rejected[REQUIRED_COLUMNS].notna(), '').astype(str)
+                QuarantinedRow.objects.bulk_create(
+                    [
+                        QuarantinedRow(dataset=dataset, line_number=int(line), values=values, reason=reason)
+                        for line, values, reason in zip(
+                            rejected['line_number'].tolist(),
+                            raw_values.to_dict('records'),
+                            rejected['reason'].tolist(),
+                        )
+                    ],
+                    batch_size=1000,
+                )
+    return dataset
+
+
+def _store_file(dataset: Dataset, uploaded_file, safe_original: str) -> None:
+    # Persist the CSV file in MEDIA_ROOT and link it in the DB.
+    try:
+        _rewind(uploaded_file)
+        with stage('store'):
+            dataset.csv_file.save(safe_original, uploaded_file, save=True)
+    except Exception:
+        logger.exception('Failed to store uploaded CSV on Dataset.csv_file; continuing without file persistence.')
+
+
+# ------------------------------------------------------------------ async
+
+_async_pool_lock = threading.Lock()
+_async_pool: Optional[ThreadPoolExecutor] = None
+
+
+def start_async_ingest(user, uploaded_file, *, tolerant: bool = False) -> Dataset:
+    """Create a ``processing`` dataset with an approximate summary right away
+    and run the full ingest in the background.
+
+    The upload is stored first (the request's temporary file goes away with
+    the request); the background job parses it from storage and replaces
+    the summary with the exact one, or marks the dataset ``failed``. Raises
+    ``IngestError`` when the sample already shows the CSV is unusable.
+    """
+
+    global _async_pool
+    safe_original = os.path.basename(uploaded_file.name)
+    try:
+        with stage('sample'):
+            summary = approximate_summary(uploaded_file, size=uploaded_file.size)
+    except CSVValidationError as exc:
+        raise IngestError(str(exc)) from exc
+
+    with transaction.atomic():
+        dataset = Dataset.objects.create(
+            user=user,
+            file_name=safe_original,
+            summary=summary,
+            analytics_version=ANALYTICS_VERSION,
+            state='processing',
+            tolerant_ingest=tolerant,
+        )
+        _store_file(dataset, uploaded_file, safe_original)
+    if not dataset.csv_file:
+        Dataset.objects.filter(pk=dataset.pk).update(state='failed', processing_error='Failed to store the uploaded file.')
+        raise IngestError('Failed to store the uploaded file.')
+
+    with _async_pool_lock:
+        if _async_pool is None:
+            workers = int(getattr(settings, 'ASYNC_INGEST_WORKERS', 2))
+            _async_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='async-ingest')
+    dataset_id = dataset.pk
+    transaction.on_commit(lambda: _async_pool.submit(finish_ingest, dataset_id, tolerant=tolerant))
+    return dataset
+
+
+def finish_ingest(dataset_id: int, *, tolerant: bool = False) -> Optional[Dataset]:
+    """Run the full ingest of a ``processing`` dataset from its stored CSV."""
+
+    try:
+        dataset = Dataset.objects.select_related('user').filter(pk=dataset_id, state='processing').first()
+        if dataset is None:
+            # Deleted (e.g. by retention) or already finished.
+            return None
+        try:
+            with dataset.csv_file.open('rb') as fh:
+                stored = File(fh, name=dataset.file_name)
+                summary, df, rejected = parse_csv(stored, tolerant=tolerant)
+                dataset, _ = persist_csv(dataset.user, stored, summary, df, rejected, dataset=dataset)
+            return dataset
+        except _AlreadyFinished:
+            return None
+        except IngestError as exc:
+            error = str(exc)
+        except Exception as exc:
+            logger.exception('Background ingest of dataset %s failed', dataset_id)
+            error = f'Failed to process CSV: {exc}'
+        Dataset.objects.filter(pk=dataset_id, state='processing').update(state='failed', processing_error=error)
+        return None
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+def recover_ingests(*, older_than: Optional[float] = None, fail: bool = False) -> Tuple[List[int], List[int]]:
+    """Resume async ingests left ``processing`` by a worker that died.
+
+    Datasets uploaded more than ``older_than`` seconds ago (default
+    ``ASYNC_INGEST_RECOVER_AFTER``) are ingested again from their stored
+    CSV, in this thread; with ``fail``, or without a stored CSV, they are
+    marked ``failed`` instead. Returns ``(ready_ids, failed_ids)``.
+    """
+
+    if older_than is None:
+        older_than = float(getattr(settings, 'ASYNC_INGEST_RECOVER_AFTER', 15 * 60))
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    stale = Dataset.objects.filter(state='processing', uploaded_at__lt=cutoff).order_by('id')
+    ready: List[int] = []
+    failed: List[int] = []
+    for dataset_id, csv_file, tolerant in stale.values_list('id', 'csv_file', 'tolerant_ingest'):
+        if fail or not csv_file:
+            Dataset.objects.filter(pk=dataset_id, state='processing').update(
+                state='failed', processing_error='Processing was interrupted; please upload the file again.'
+            )
+        else:
+            logger.info('Resuming interrupted ingest of dataset %s', dataset_id)
+            finish_ingest(dataset_id, tolerant=tolerant)
+        state = Dataset.objects.filter(pk=dataset_id).values_list('state', flat=True).first()
+        if state == 'ready':
+            ready.append(dataset_id)
+        elif state == 'failed':
+            failed.append(dataset_id)
+    return ready, failed
+
+
+# ---------------------------------------------------------------- batches
+
+
+def is_zip_upload(uploaded_file) -> bool:
+    return (uploaded_file.name or '').lower().endswith('.zip')
+
+
+def _zip_members(archive_file) -> Iterator[Tuple[str, Any]]:
+    """Yield ``(name, ZipInfo)`` for the CSV members of an uploaded ZIP."""
+
+    max_bytes = int(getattr(settings, 'UPLOAD_BATCH_MAX_MEMBER_BYTES', 200 * 1024 * 1024))
+    _rewind(archive_file)
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except zipfile.BadZipFile as exc:
+        raise IngestError(f"{os.path.basename(archive_file.name)} is not a valid ZIP archive.") from exc
+    for info in archive.infolist():
+        base = os.path.basename(info.filename)
+        if info.is_dir() or not base or base.startswith('.') or '__MACOSX' in info.filename:
+            continue
+        if not base.lower().endswith('.csv'):
+            continue
+        if info.file_size > max_bytes:
+            yield base, IngestError(f'File is larger than {max_bytes} bytes uncompressed.')
+            continue
+        yield base, (archive, info, max_bytes)
+
+
+def _spool_member(archive, info, max_bytes):
+    """Copy one ZIP member into a spooled temporary file, enforcing the size limit."""
+
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_MEMORY)
+    copied = 0
+    with archive.open(info) as src:
+        while True:
+            block = src.read(_COPY_BLOCK)
+            if not block:
+                break
+            copied += len(block)
+            if copied > max_bytes:
+                spool.close()
+                raise IngestError(f'File is larger than {max_bytes} bytes uncompressed.')
+            spool.write(block)
+    spool.seek(0)
+    return spool
+
+
+def batch_members(files) -> List[Tuple[str, Any]]:
+    """Expand uploaded parts into ``(name, source)`` pairs.
+
+    A source is an uploaded CSV, a ZIP member reference, or an
+    ``IngestError`` to report for that name.
+    """
+
+    max_files = int(getattr(settings, 'UPLOAD_BATCH_MAX_FILES', 100))
+    members: List[Tuple[str, Any]] = []
+    for uploaded in files:
+        if is_zip_upload(uploaded):
+            try:
+                members.extend(_zip_members(uploaded))
+            except IngestError as exc:
+                members.append((os.path.basename(uploaded.name), exc))
+        else:
+            members.append((os.path.basename(uploaded.name), uploaded))
+    if len(members) > max_files:
+        raise IngestError(f'A batch may contain at most {max_files} CSV files.')
+    return members
+
+
+def _ingest_member(user, index: int, name: str, source, tolerant: bool) -> Dict[str, Any]:
+    result: Dict[str, Any] = {'index': index, 'file': name}
+    spool = None
+    try:
+        if isinstance(source, IngestError):
+            raise source
+        if isinstance(source, tuple):
+            spool = _spool_member(*source)
+            source = File(spool, name=name)
+        dataset, rejected_rows = ingest_csv(user, source, tolerant=tolerant)
+        result.update({'dataset_id': dataset.id, 'summary': dataset.summary})
+        if rejected_rows is not None:
+            result['rejected_rows'] = rejected_rows
+    except IngestError as exc:
+        result['error'] = str(exc)
+    except Exception as exc:
+        logger.exception('Failed to ingest %s from batch upload', name)
+        result['error'] = f'Failed to ingest file: {exc}'
+    finally:
+        if spool is not None:
+            spool.close()
+        # Worker threads get their own DB connection; don't leak it.
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+    return result
+
+
+def ingest_batch(user, members, *, tolerant: bool = False, workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Ingest ``members`` (from ``batch_members``) in parallel, yielding
+    one result dict per file in completion order.
+
+    Retention is enforced once, after the last member, and never deletes
+    the batch's own datasets, so every ``dataset_id`` reported exists even
+    when the batch is larger than ``DATASET_RETENTION_COUNT``.
+    """
+
+    workers = workers or int(getattr(settings, 'UPLOAD_BATCH_WORKERS', min(4, os.cpu_count() or 1)))
+    with deferred_retention(user), ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='ingest') as pool:
+        futures = [
+            pool.submit(_ingest_member, user, index, name, source, tolerant)
+            for index, (name, source) in enumerate(members)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,118 @@
+"""Per-request stage timings and SQL accounting.
+
+``ServerTimingMiddleware`` opens a timing scope for every request; code on
+the request path marks expensive sections with ``stage('name')``. At the end
+of the request the collected numbers are emitted as a ``Server-Timing``
+header and as one structured log line on the ``api.timing`` logger.
+
+``stage()`` is a no-op outside a request (management commands, shell), so
+library code can call it unconditionally.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Optional
+
+from django.db import connections
+
+timing_logger = logging.getLogger('api.timing')
+
+_current: contextvars.ContextVar[Optional['RequestTimings']] = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        # Insertion order is kept so the header lists stages as they ran.
+        self.stages: Dict[str, float] = {}
+        self.sql_count = 0
+        self.sql_ms = 0.0
+
+    def add(self, name: str, elapsed_ms: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_ms += (time.perf_counter() - start) * 1000.0
+
+    def header_value(self, total_ms: float) -> str:
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        parts.append(f'db;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"')
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ', '.join(parts)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as ``name`` in the current request (if any).
+
+    Repeated stages with the same name accumulate.
+    """
+
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - start) * 1000.0)
+
+
+class ServerTimingMiddleware:
+    """Collect stage and SQL timings for each request and report them."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(timings.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total_ms = timings.total_ms()
+        response['Server-Timing'] = timings.header_value(total_ms)
+
+        timing_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'stages': {name: round(ms, 2) for name, ms in timings.stages.items()},
+            'sql_count': timings.sql_count,
+            'sql_ms': round(timings.sql_ms, 2),
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that as 'render'.
+        timings = _current.get()
+        if timings is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda r: timings.add('render', (time.perf_counter() - start) * 1000.0)
+            )
+        return response
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import archive_dataset, due_for_archive
+
+
+class Command(BaseCommand):
+	help = "Move old datasets' rows to compressed cold storage (see DATASET_HOT_COUNT / DATASET_ARCHIVE_AFTER_DAYS)."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--hot-count", type=int, default=None, help="Keep this many newest datasets per user hot (overrides settings).")
+		parser.add_argument("--days", type=int, default=None, help="Archive datasets uploaded more than this many days ago (overrides settings).")
+		parser.add_argument("--user", default=None, help="Only archive datasets of this username.")
+		parser.add_argument("--dry-run", action="store_true", help="List datasets that would be archived without changing anything.")
+
+	def handle(self, *args, **options):
+		user = None
+		if options.get("user"):
+			try:
+				user = get_user_model().objects.get(username=options["user"])
+			except get_user_model().DoesNotExist as exc:
+				raise CommandError(f"Unknown user: {options['user']}") from exc
+
+		due = due_for_archive(user, hot_count=options.get("hot_count"), after_days=options.get("days"))
+
+		archived = 0
+		for dataset in due:
+			if options.get("dry_run"):
+				self.stdout.write(f"Would archive {dataset}")
+				continue
+			if archive_dataset(dataset):
+				archived += 1
+				self.stdout.write(f"Archived {dataset}")
+
+		if not options.get("dry_run"):
+			self.stdout.write(self.style.SUCCESS(f"Archived {archived} datasets."))
@@ -0,0 +1,42 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.backfill import Checkpoint, backfill_workers, bulk_import
+
+
+class Command(BaseCommand):
+	help = "Import every CSV under a directory tree for one user, in parallel, resuming an interrupted run."
+
+	def add_arguments(self, parser):
+		parser.add_argument("directory", help="Directory tree to import (*.csv, dotfiles and dot-directories skipped).")
+		parser.add_argument("--user", required=True, help="Username that will own the imported datasets.")
+		parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: BACKFILL_WORKERS or one per core).")
+		parser.add_argument("--mode", choices=["strict", "tolerant"], default="strict", help="CSV validation mode, as for uploads.")
+		parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of a previous run and import everything.")
+
+	def handle(self, *args, **options):
+		try:
+			user = get_user_model().objects.get(username=options["user"])
+		except get_user_model().DoesNotExist as exc:
+			raise CommandError(f"Unknown user: {options['user']}") from exc
+
+		tolerant = options["mode"] == "tolerant"
+		checkpoint = Checkpoint.for_job("bulk_import", os.path.abspath(options["directory"]), user.pk, tolerant)
+		if options["restart"]:
+			checkpoint.discard()
+		elif checkpoint.done:
+			self.stdout.write(f"Resuming: {len(checkpoint.done)} files already imported ({checkpoint.path}).")
+
+		workers = options["workers"] or backfill_workers()
+		self.stdout.write(f"Importing {options['directory']} as {user.get_username()} with {workers} workers.")
+		progress = bulk_import(
+			options["directory"],
+			user,
+			tolerant=tolerant,
+			workers=workers,
+			checkpoint=checkpoint,
+			report=self.stdout.write,
+		)
+		self.stdout.write(self.style.SUCCESS(f"Imported: {progress.line()}"))
@@ -0,0 +1,56 @@
+import logging
+import signal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dropfolder import DropFolderIngester
+
+
+class Command(BaseCommand):
+	help = "Watch a directory and ingest CSVs dropped into it (moved to done/ or failed/ afterwards)."
+
+	def add_arguments(self, parser):
+		parser.add_argument("directory", help="Drop folder to watch.")
+		parser.add_argument("--user", required=True, help="Username that will own the ingested datasets.")
+		parser.add_argument(
+			"--workers",
+			type=int,
+			default=getattr(settings, "UPLOAD_BATCH_WORKERS", 4),
+			help="Files ingested concurrently (default: UPLOAD_BATCH_WORKERS).",
+		)
+		parser.add_argument("--mode", choices=["strict", "tolerant"], default="strict", help="CSV validation mode, as for uploads.")
+		parser.add_argument("--settle", type=float, default=1.0, help="Seconds a file must stay unchanged before it is claimed.")
+		parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between directory scans.")
+		parser.add_argument("--report-interval", type=float, default=60.0, help="Seconds between throughput log lines.")
+		parser.add_argument("--no-inotify", action="store_true", help="Always poll, even where inotify is available.")
+		parser.add_argument("--once", action="store_true", help="Ingest what is in the folder now, then exit.")
+
+	def handle(self, *args, **options):
+		try:
+			user = get_user_model().objects.get(username=options["user"])
+		except get_user_model().DoesNotExist as exc:
+			raise CommandError(f"Unknown user: {options['user']}") from exc
+
+		ingester = DropFolderIngester(
+			options["directory"],
+			user,
+			workers=options["workers"],
+			tolerant=options["mode"] == "tolerant",
+			settle=options["settle"],
+			poll_interval=options["poll_interval"],
+			report_interval=options["report_interval"],
+			use_inotify=not options["no_inotify"],
+		)
+
+		def _stop(signum, frame):
+			logging.getLogger(__name__).info("Stopping after in-flight files finish...")
+			ingester.stop_event.set()
+
+		signal.signal(signal.SIGTERM, _stop)
+		signal.signal(signal.SIGINT, _stop)
+
+		self.stdout.write(f"Watching {ingester.root} as {user.get_username()} with {ingester.workers} workers.")
+		stats = ingester.run(once=options["once"])
+		self.stdout.write(self.style.SUCCESS(f"Done: {stats.line()}"))
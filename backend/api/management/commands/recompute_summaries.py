@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.backfill import Checkpoint, backfill_workers, recompute_summaries
+from api.models import Dataset
+from api.utils import ANALYTICS_VERSION
+
+
+class Command(BaseCommand):
+	help = "Recompute Dataset.summary from stored rows (or the stored CSV) in parallel, resuming an interrupted run."
+
+	def add_arguments(self, parser):
+		parser.add_argument("--user", default=None, help="Only recompute datasets of this username.")
+		parser.add_argument("--stale", action="store_true", help="Only datasets whose summary predates the current ANALYTICS_VERSION.")
+		parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: BACKFILL_WORKERS or one per core).")
+		parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of a previous run and recompute everything.")
+
+	def handle(self, *args, **options):
+		datasets = Dataset.objects.all()
+		if options.get("user"):
+			try:
+				user = get_user_model().objects.get(username=options["user"])
+			except get_user_model().DoesNotExist as exc:
+				raise CommandError(f"Unknown user: {options['user']}") from exc
+			datasets = datasets.filter(user=user)
+		if options["stale"]:
+			datasets = datasets.filter(analytics_version__lt=ANALYTICS_VERSION)
+
+		checkpoint = Checkpoint.for_job("recompute_summaries", str(datasets.query))
+		if options["restart"]:
+			checkpoint.discard()
+		elif checkpoint.done:
+			self.stdout.write(f"Resuming: {len(checkpoint.done)} datasets already recomputed ({checkpoint.path}).")
+
+		workers = options["workers"] or backfill_workers()
+		self.stdout.write(f"Recomputing {datasets.count()} dataset summaries with {workers} workers.")
+		progress = recompute_summaries(datasets, workers=workers, checkpoint=checkpoint, report=self.stdout.write)
+		self.stdout.write(self.style.SUCCESS(f"Recomputed: {progress.line()}, {progress.changed} changed"))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.ingest import recover_ingests
+
+
+class Command(BaseCommand):
+	help = "Resume asynchronous ingests left 'processing' by a worker that died or a server restart."
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			"--older-than",
+			type=float,
+			default=getattr(settings, "ASYNC_INGEST_RECOVER_AFTER", 15 * 60),
+			help="Only touch datasets uploaded more than this many seconds ago (default: ASYNC_INGEST_RECOVER_AFTER).",
+		)
+		parser.add_argument("--fail", action="store_true", help="Mark them failed instead of ingesting them again.")
+
+	def handle(self, *args, **options):
+		ready, failed = recover_ingests(older_than=options["older_than"], fail=options["fail"])
+		for dataset_id in ready:
+			self.stdout.write(f"Dataset {dataset_id} ingested")
+		for dataset_id in failed:
+			self.stdout.write(f"Dataset {dataset_id} failed")
+		self.stdout.write(self.style.SUCCESS(f"Recovered {len(ready)} datasets, {len(failed)} failed."))
@@ -13,7 +13,7 @@ class Command(BaseCommand):
 		parser.add_argument(
 			"--delete-media",
 			action="store_true",
-			help="Also delete MEDIA_ROOT/uploads and MEDIA_ROOT/reports folders.",
+			help="Also delete MEDIA_ROOT/uploads, MEDIA_ROOT/reports and MEDIA_ROOT/archives folders.",
 		)
 
 	def handle(self, *args, **options):
@@ -37,8 +37,9 @@ class Command(BaseCommand):
 		if delete_media:
 			uploads_dir = settings.MEDIA_ROOT / "uploads"
 			reports_dir = settings.MEDIA_ROOT / "reports"
+			archives_dir = settings.MEDIA_ROOT / "archives"
 
-			for path in (uploads_dir, reports_dir):
+			for path in (uploads_dir, reports_dir, archives_dir):
 				try:
 					shutil.rmtree(path, ignore_errors=True)
 					self.stdout.write(self.style.SUCCESS(f"Deleted media folder: {path}"))
@@ -0,0 +1,114 @@
+"""Prometheus metrics for ingest, reporting, caching and admission control.
+
+Metrics are plain ``prometheus_client`` objects, so recording one on the hot
+path is a dict lookup plus a locked add. Scrape them from ``GET /metrics``
+(loopback only by default, see ``METRICS_ALLOWED_IPS``).
+
+Multi-worker deployments (gunicorn, uvicorn workers) must export
+``PROMETHEUS_MULTIPROC_DIR`` pointing at an empty, writable directory before
+the workers start; each process then writes its samples to mmap'd files and
+the endpoint aggregates them. With gunicorn also add a ``child_exit`` hook
+that calls ``prometheus_client.multiprocess.mark_process_dead(worker.pid)``.
+
+``prometheus_client`` is optional: without it every metric is a no-op and the
+endpoint answers 503.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Histogram
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover - optional dependency
+    prometheus_client = None
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+
+# Request latencies span ~1 ms (history) to tens of seconds (large uploads, reports).
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_REPORT_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = Histogram(
+        'chemviz_request_duration_seconds',
+        'API request latency by view.',
+        ['view', 'method'],
+        buckets=_LATENCY_BUCKETS,
+    )
+    ROWS_INGESTED = Counter('chemviz_rows_ingested_total', 'Equipment rows stored by uploads.')
+    ROWS_REJECTED = Counter('chemviz_rows_rejected_total', 'Rows quarantined by tolerant uploads.')
+    BYTES_UPLOADED = Counter('chemviz_upload_bytes_total', 'Bytes of CSV received by uploads.')
+    REPORT_RENDER = Histogram(
+        'chemviz_report_render_seconds',
+        'Time to render a PDF report (charts + ReportLab).',
+        buckets=_REPORT_BUCKETS,
+    )
+    DATASETS_PURGED = Counter('chemviz_datasets_purged_total', 'Datasets deleted by retention.')
+    CACHE_REQUESTS = Counter(
+        'chemviz_cache_requests_total',
+        'Cache lookups by cache and result (hit/miss); hit ratio = hit / (hit + miss).',
+        ['cache', 'result'],
+    )
+    ADMISSION_REJECTED = Counter(
+        'chemviz_admission_rejected_total',
+        'Heavy requests refused with 429 by pool and reason (user/queue/timeout).',
+        ['pool', 'reason'],
+    )
+else:  # pragma: no cover - optional dependency
+    REQUEST_LATENCY = ROWS_INGESTED = ROWS_REJECTED = BYTES_UPLOADED = _NoopMetric()
+    REPORT_RENDER = DATASETS_PURGED = CACHE_REQUESTS = ADMISSION_REJECTED = _NoopMetric()
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+class MetricsMiddleware:
+    """Observe per-view request latency."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        # Label by route name, never by raw path, to keep label cardinality bounded.
+        view = (match.view_name if match else '') or 'unmatched'
+        REQUEST_LATENCY.labels(view, request.method).observe(time.perf_counter() - start)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition endpoint."""
+
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden('Metrics are only available locally.')
+
+    if prometheus_client is None:
+        return HttpResponse('prometheus_client is not installed.', status=503, content_type='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_dataset_csv_file_alter_dataset_summary_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuarantinedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_number', models.PositiveIntegerField()),
+                ('values', models.JSONField(default=dict)),
+                ('reason', models.CharField(max_length=255)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quarantined_rows', to='api.dataset')),
+            ],
+            options={
+                'ordering': ['dataset', 'line_number'],
+                'indexes': [models.Index(fields=['dataset', 'line_number'], name='api_quarant_dataset_ee8071_idx')],
+            },
+        ),
+    ]
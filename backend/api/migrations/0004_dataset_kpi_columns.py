@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+KPI_FIELDS = ['total_equipment', 'average_flowrate', 'average_pressure', 'average_temperature', 'max_temperature']
+
+
+def backfill_kpis(apps, schema_editor):
+    Dataset = apps.get_model('api', 'Dataset')
+    batch = []
+    for dataset in Dataset.objects.only('id', 'summary').iterator(chunk_size=500):
+        summary = dataset.summary or {}
+        for field in KPI_FIELDS:
+            cast = int if field == 'total_equipment' else float
+            try:
+                setattr(dataset, field, cast(summary.get(field) or 0))
+            except (TypeError, ValueError):
+                setattr(dataset, field, cast(0))
+        batch.append(dataset)
+        if len(batch) >= 500:
+            Dataset.objects.bulk_update(batch, KPI_FIELDS)
+            batch = []
+    if batch:
+        Dataset.objects.bulk_update(batch, KPI_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_quarantinedrow'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='average_flowrate',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='average_pressure',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='average_temperature',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='max_temperature',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='total_equipment',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='dataset_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', 'total_equipment', 'id'], name='dataset_user_total_idx'),
+        ),
+        migrations.RunPython(backfill_kpis, migrations.RunPython.noop),
+    ]
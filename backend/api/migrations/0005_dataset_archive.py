@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:01
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_dataset_kpi_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='archive_file',
+            field=models.FileField(blank=True, null=True, upload_to=api.models._dataset_archive_upload_to),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
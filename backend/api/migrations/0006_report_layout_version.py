@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_dataset_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='layout_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_report_layout_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='analytics_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
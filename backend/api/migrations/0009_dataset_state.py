@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='processing_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='state',
+            field=models.CharField(choices=[('ready', 'Ready'), ('processing', 'Processing'), ('failed', 'Failed')], default='ready', max_length=16),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_dataset_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetSketch',
+            fields=[
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sketch', serialize=False, to='api.dataset')),
+                ('data', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_datasetsketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetsketch',
+            name='histograms',
+            field=models.JSONField(default=dict),
+        ),
+    ]
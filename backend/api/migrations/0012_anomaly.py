@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_datasetsketch_histograms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetsketch',
+            name='anomalies',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_index', models.PositiveIntegerField()),
+                ('equipment_name', models.CharField(max_length=255)),
+                ('type', models.CharField(max_length=120)),
+                ('flowrate', models.FloatField()),
+                ('pressure', models.FloatField()),
+                ('temperature', models.FloatField()),
+                ('score', models.FloatField()),
+                ('metric', models.CharField(max_length=32)),
+                ('z_flowrate', models.FloatField(default=0.0)),
+                ('z_pressure', models.FloatField(default=0.0)),
+                ('z_temperature', models.FloatField(default=0.0)),
+                ('iqr_flags', models.PositiveSmallIntegerField(default=0)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='api.dataset')),
+            ],
+            options={
+                'ordering': ['dataset', '-score', '-id'],
+                'indexes': [models.Index(fields=['dataset', '-score', '-id'], name='anomaly_dataset_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:45
+
+import sqlite3
+
+from django.db import migrations, models
+
+
+# Trigram full-text index of equipment names for csv-data's ``q`` search
+# (api/rowquery.py). External content: it stores only the index and is kept
+# in step with api_equipmentrecord by triggers. SQLite only; needs 3.34+.
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE api_equipmentrecord_fts USING fts5("
+    "equipment_name, content='api_equipmentrecord', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER api_equipmentrecord_fts_insert AFTER INSERT ON api_equipmentrecord BEGIN "
+    "INSERT INTO api_equipmentrecord_fts(rowid, equipment_name) VALUES (new.id, new.equipment_name); END",
+    "CREATE TRIGGER api_equipmentrecord_fts_delete AFTER DELETE ON api_equipmentrecord BEGIN "
+    "INSERT INTO api_equipmentrecord_fts(api_equipmentrecord_fts, rowid, equipment_name) "
+    "VALUES ('delete', old.id, old.equipment_name); END",
+    "CREATE TRIGGER api_equipmentrecord_fts_update AFTER UPDATE OF equipment_name ON api_equipmentrecord BEGIN "
+    "INSERT INTO api_equipmentrecord_fts(api_equipmentrecord_fts, rowid, equipment_name) "
+    "VALUES ('delete', old.id, old.equipment_name); "
+    "INSERT INTO api_equipmentrecord_fts(rowid, equipment_name) VALUES (new.id, new.equipment_name); END",
+    "INSERT INTO api_equipmentrecord_fts(api_equipmentrecord_fts) VALUES ('rebuild')",
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS api_equipmentrecord_fts_insert",
+    "DROP TRIGGER IF EXISTS api_equipmentrecord_fts_delete",
+    "DROP TRIGGER IF EXISTS api_equipmentrecord_fts_update",
+    "DROP TABLE IF EXISTS api_equipmentrecord_fts",
+]
+
+
+def _fts_supported(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    return sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def create_name_search(apps, schema_editor):
+    if _fts_supported(schema_editor):
+        for sql in FTS_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_name_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP_FTS_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_anomaly'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='equipmentrecord',
+            name='api_equipme_type_d740af_idx',
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'type', 'id'], name='record_dataset_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'equipment_name', 'id'], name='record_dataset_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'flowrate', 'id'], name='record_dataset_flowrate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'pressure', 'id'], name='record_dataset_pressure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'temperature', 'id'], name='record_dataset_temp_idx'),
+        ),
+        migrations.RunPython(create_name_search, drop_name_search),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_equipmentrecord_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='tolerant_ingest',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_dataset_tolerant_ingest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', 'file_name', 'id'], name='dataset_user_file_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', 'average_flowrate', 'id'], name='dataset_user_flowrate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', 'average_pressure', 'id'], name='dataset_user_pressure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', 'average_temperature', 'id'], name='dataset_user_avg_temp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', 'max_temperature', 'id'], name='dataset_user_max_temp_idx'),
+        ),
+    ]
@@ -1,8 +1,13 @@
 import os
+import threading
+from contextlib import contextmanager
 from uuid import uuid4
 
 from django.conf import settings
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+
+from .metrics import DATASETS_PURGED
 
 
 def _dataset_csv_upload_to(instance: 'Dataset', filename: str) -> str:
@@ -10,36 +15,192 @@ def _dataset_csv_upload_to(instance: 'Dataset', filename: str) -> str:
 	return f"uploads/user_{instance.user_id}/{uuid4().hex}_{safe_name}"
 
 
+def _dataset_archive_upload_to(instance: 'Dataset', filename: str) -> str:
+	return f"archives/user_{instance.user_id}/dataset_{instance.id}.csv.gz"
+
+
 def _report_pdf_upload_to(instance: 'Report', filename: str) -> str:
 	# Force a consistent naming scheme regardless of uploaded filename.
 	return f"reports/user_{instance.user_id}/Report_{instance.report_number}.pdf"
 
 
+# Dataset KPI columns mirrored from the summary JSON (column -> summary key).
+# They let history sort and filter in SQL without decoding summaries.
+DATASET_KPI_FIELDS = {
+	'total_equipment': 'total_equipment',
+	'average_flowrate': 'average_flowrate',
+	'average_pressure': 'average_pressure',
+	'average_temperature': 'average_temperature',
+	'max_temperature': 'max_temperature',
+}
+
+
+DATASET_STATES = [
+	('ready', 'Ready'),
+	('processing', 'Processing'),
+	('failed', 'Failed'),
+]
+
+
+def dataset_retention_count():
+	"""Datasets kept per user (settings.DATASET_RETENTION_COUNT, None = unlimited)."""
+	return getattr(settings, 'DATASET_RETENTION_COUNT', None)
+
+
+# Batches storing datasets with retention deferred, per user id (see defer_retention).
+_retention_lock = threading.Lock()
+_retention_batches = {}
+
+
+class RetentionBatch:
+	"""Datasets a batch stores while the retention purge waits for it to finish."""
+
+	def __init__(self, user, purge: bool = True):
+		self.user = user
+		self.purge = purge
+		self.dataset_ids = set()
+		self._released = False
+
+	def release(self) -> None:
+		"""Purge once for the whole batch (unless ``purge`` is off), never deleting the batch's own datasets."""
+		with _retention_lock:
+			if self._released:
+				return
+			self._released = True
+			batches = _retention_batches[self.user.pk]
+			batches.remove(self)
+			if not batches:
+				del _retention_batches[self.user.pk]
+			# Batches still running keep theirs too.
+			exempt = self.dataset_ids.union(*(batch.dataset_ids for batch in batches))
+		if self.purge:
+			enforce_retention(self.user, exempt=exempt)
+
+
+def defer_retention(user, *, purge: bool = True) -> RetentionBatch:
+	"""Stop datasets stored for ``user`` from purging each other until ``release()``.
+
+	Without this, a batch larger than DATASET_RETENTION_COUNT deletes its own
+	first members as the later ones arrive. Deferral is per process. With
+	``purge=False`` nothing is purged at the end either; the next upload does.
+	"""
+	batch = RetentionBatch(user, purge)
+	with _retention_lock:
+		_retention_batches.setdefault(user.pk, []).append(batch)
+	return batch
+
+
+@contextmanager
+def deferred_retention(user, *, purge: bool = True):
+	batch = defer_retention(user, purge=purge)
+	try:
+		yield batch
+	finally:
+		batch.release()
+
+
+def _defer_to_batches(dataset) -> bool:
+	with _retention_lock:
+		batches = _retention_batches.get(dataset.user_id)
+		for batch in batches or ():
+			batch.dataset_ids.add(dataset.pk)
+		return bool(batches)
+
+
+def enforce_retention(user, *, exempt=()) -> None:
+	"""Keep only the newest DATASET_RETENTION_COUNT datasets of ``user``, plus ``exempt`` ids."""
+	keep = dataset_retention_count()
+	if keep is None:
+		return
+	excess_ids = [
+		pk
+		for pk in Dataset.objects.filter(user=user).order_by('-uploaded_at', '-id').values_list('id', flat=True)[keep:]
+		if pk not in exempt
+	]
+	if excess_ids:
+		Dataset.objects.filter(id__in=excess_ids).delete()
+		DATASETS_PURGED.inc(len(excess_ids))
+
+
 class Dataset(models.Model):
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='datasets')
 	# Keep the original filename for UI display.
 	file_name = models.CharField(max_length=255)
 	uploaded_at = models.DateTimeField(auto_now_add=True)
 	summary = models.JSONField(default=dict, blank=True)
+	# utils.ANALYTICS_VERSION `summary` was computed with (0 = before versioning).
+	analytics_version = models.PositiveIntegerField(default=0)
+	# Asynchronous uploads start 'processing' with an approximate summary
+	# (api/sampling.py) that the full ingest replaces; see ingest.start_async_ingest.
+	state = models.CharField(max_length=16, choices=DATASET_STATES, default='ready')
+	processing_error = models.TextField(blank=True)
+	# Validation mode of a 'processing' ingest, so recover_ingests can resume it.
+	tolerant_ingest = models.BooleanField(default=False)
 	# Store the actual uploaded CSV in MEDIA_ROOT so it can be retrieved later.
 	csv_file = models.FileField(upload_to=_dataset_csv_upload_to, null=True, blank=True)
 
+	# Denormalized KPIs, kept in sync with `summary` by save().
+	total_equipment = models.PositiveIntegerField(default=0)
+	average_flowrate = models.FloatField(default=0.0)
+	average_pressure = models.FloatField(default=0.0)
+	average_temperature = models.FloatField(default=0.0)
+	max_temperature = models.FloatField(default=0.0)
+
+	# Cold tier: once archived, the rows live only in `archive_file` (gzip CSV)
+	# and the EquipmentRecord rows are deleted. See api/archive.py.
+	archived_at = models.DateTimeField(null=True, blank=True, db_index=True)
+	archive_file = models.FileField(upload_to=_dataset_archive_upload_to, null=True, blank=True)
+
 	class Meta:
 		ordering = ['-uploaded_at', '-id']
+		indexes = [
+			models.Index(fields=['user', '-uploaded_at', '-id'], name='dataset_user_recent_idx'),
+			models.Index(fields=['user', 'total_equipment', 'id'], name='dataset_user_total_idx'),
+			# One per history sort field (HistoryView keyset-paginates on (field, id)).
+			models.Index(fields=['user', 'file_name', 'id'], name='dataset_user_file_idx'),
+			models.Index(fields=['user', 'average_flowrate', 'id'], name='dataset_user_flowrate_idx'),
+			models.Index(fields=['user', 'average_pressure', 'id'], name='dataset_user_pressure_idx'),
+			models.Index(fields=['user', 'average_temperature', 'id'], name='dataset_user_avg_temp_idx'),
+			models.Index(fields=['user', 'max_temperature', 'id'], name='dataset_user_max_temp_idx'),
+		]
 
 	def __str__(self) -> str:
 		return f"Dataset({self.id}) {self.file_name}"
 
+	@property
+	def is_archived(self) -> bool:
+		return self.archived_at is not None
+
+	def sync_kpis_from_summary(self) -> None:
+		summary = self.summary or {}
+		for field, key in DATASET_KPI_FIELDS.items():
+			cast = int if field == 'total_equipment' else float
+			try:
+				value = cast(summary.get(key) or 0)
+			except (TypeError, ValueError):
+				value = cast(0)
+			setattr(self, field, value)
+
 	def save(self, *args, **kwargs):
+		adding = self._state.adding
+		self.sync_kpis_from_summary()
+		update_fields = kwargs.get('update_fields')
+		if update_fields is not None and 'summary' in update_fields:
+			kwargs['update_fields'] = {*update_fields, *DATASET_KPI_FIELDS}
 		super().save(*args, **kwargs)
-		# Keep only the newest 5 datasets per user.
-		excess_qs = (
-			Dataset.objects.filter(user=self.user)
-			.order_by('-uploaded_at', '-id')
-			.values_list('id', flat=True)[5:]
-		)
-		if excess_qs:
-			Dataset.objects.filter(id__in=list(excess_qs)).delete()
+		if adding:
+			if not _defer_to_batches(self):
+				self.enforce_retention()
+			# Local import: api.archive imports this module.
+			from .archive import archive_due_datasets, archiving_enabled
+			if archiving_enabled():
+				# After commit, so the upload's own transaction is not lengthened.
+				user = self.user
+				transaction.on_commit(lambda: archive_due_datasets(user=user))
+
+	def enforce_retention(self) -> None:
+		"""Keep only the newest DATASET_RETENTION_COUNT datasets of this user."""
+		enforce_retention(self.user)
 
 
 class EquipmentRecord(models.Model):
@@ -52,15 +213,93 @@ class EquipmentRecord(models.Model):
 
 	class Meta:
 		ordering = ['id']
+		# Every row query is scoped to one dataset; these back csv-data's
+		# filters and sorts (see api/rowquery.py). Name substring search
+		# uses the FTS5 table created in migration 0013.
 		indexes = [
 			models.Index(fields=['dataset']),
-			models.Index(fields=['type']),
+			models.Index(fields=['dataset', 'type', 'id'], name='record_dataset_type_idx'),
+			models.Index(fields=['dataset', 'equipment_name', 'id'], name='record_dataset_name_idx'),
+			models.Index(fields=['dataset', 'flowrate', 'id'], name='record_dataset_flowrate_idx'),
+			models.Index(fields=['dataset', 'pressure', 'id'], name='record_dataset_pressure_idx'),
+			models.Index(fields=['dataset', 'temperature', 'id'], name='record_dataset_temp_idx'),
 		]
 
 	def __str__(self) -> str:
 		return f"EquipmentRecord({self.id}) {self.equipment_name}"
 
 
+class QuarantinedRow(models.Model):
+	"""A CSV row rejected by tolerant ingest, kept so users can fix and re-upload it."""
+
+	dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='quarantined_rows')
+	# 1-based data-row position in the original CSV, the header being line 1
+	# (not the physical line when blank lines or multi-line fields precede it).
+	line_number = models.PositiveIntegerField()
+	# Original cell values keyed by CSV column name, stored as text.
+	values = models.JSONField(default=dict)
+	reason = models.CharField(max_length=255)
+
+	class Meta:
+		ordering = ['dataset', 'line_number']
+		indexes = [
+			models.Index(fields=['dataset', 'line_number']),
+		]
+
+	def __str__(self) -> str:
+		return f"QuarantinedRow({self.id}) line={self.line_number}"
+
+
+class DatasetSketch(models.Model):
+	"""Precomputed distribution data of a dataset: mergeable per-type quantile and
+	distinct-count sketches (api/sketches.py) and fine-grained histograms (api/histograms.py).
+
+	Kept out of Dataset so that loading a dataset does not decode them.
+	"""
+
+	dataset = models.OneToOneField(Dataset, on_delete=models.CASCADE, primary_key=True, related_name='sketch')
+	data = models.JSONField(default=dict)
+	histograms = models.JSONField(default=dict)
+	# Summary of the anomaly detection run (api/anomalies.py); empty until it has run.
+	anomalies = models.JSONField(default=dict)
+
+	def __str__(self) -> str:
+		return f"DatasetSketch(dataset={self.dataset_id})"
+
+
+class Anomaly(models.Model):
+	"""A row flagged by the ingest anomaly stage (see api/anomalies.py).
+
+	The row's values are copied so the index survives archiving the dataset.
+	"""
+
+	dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='anomalies')
+	# 0-based position among the dataset's validated rows (upload order).
+	row_index = models.PositiveIntegerField()
+	equipment_name = models.CharField(max_length=255)
+	type = models.CharField(max_length=120)
+	flowrate = models.FloatField()
+	pressure = models.FloatField()
+	temperature = models.FloatField()
+	# Largest absolute robust z-score over the metrics, and the metric it came from.
+	score = models.FloatField()
+	metric = models.CharField(max_length=32)
+	z_flowrate = models.FloatField(default=0.0)
+	z_pressure = models.FloatField(default=0.0)
+	z_temperature = models.FloatField(default=0.0)
+	# Bit i set when NUMERIC_COLUMNS[i] lies outside its type's IQR fences.
+	iqr_flags = models.PositiveSmallIntegerField(default=0)
+
+	class Meta:
+		ordering = ['dataset', '-score', '-id']
+		indexes = [
+			models.Index(fields=['dataset', '-score', '-id'], name='anomaly_dataset_score_idx'),
+		]
+
+	def __str__(self) -> str:
+		return f"Anomaly({self.id}) dataset={self.dataset_id} row={self.row_index} score={self.score:.2f}"
+
+
 class Report(models.Model):
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reports')
 	dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='reports')
@@ -68,6 +307,8 @@ class Report(models.Model):
 	created_at = models.DateTimeField(auto_now_add=True)
 	# Persist the PDF so the backend can serve it later without regenerating.
 	pdf_file = models.FileField(upload_to=_report_pdf_upload_to)
+	# utils.REPORT_LAYOUT_VERSION the PDF was rendered with; older ones are re-rendered.
+	layout_version = models.PositiveIntegerField(default=0)
 
 	class Meta:
 		ordering = ['-created_at', '-id']
@@ -78,3 +319,27 @@ class Report(models.Model):
 
 	def __str__(self) -> str:
 		return f"Report({self.id}) user={self.user_id} #{self.report_number}"
+
+
+class IdempotencyRecord(models.Model):
+	"""Outcome of a request sent with an ``Idempotency-Key``, replayed for duplicates (see api/idempotency.py)."""
+
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_records')
+	key = models.CharField(max_length=255)
+	# Hash of scope, path, parameters and uploaded files; a reused key with a different request is rejected.
+	fingerprint = models.CharField(max_length=64)
+	created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+	# Null while the original request is still running.
+	completed_at = models.DateTimeField(null=True, blank=True)
+	status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+	# 'data' (DRF response data), 'ndjson' (streamed text) or 'result' (view-specific replay payload).
+	kind = models.CharField(max_length=16, blank=True)
+	body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+		]
+
+	def __str__(self) -> str:
+		return f"IdempotencyRecord({self.id}) user={self.user_id} key={self.key}"
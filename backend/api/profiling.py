@@ -0,0 +1,227 @@
+"""On-demand request profiling for staff users.
+
+Send ``X-Profile: 1`` (or add ``?profile=1``) as a staff user and the request
+runs under:
+
+- cProfile (deterministic) for the top functions by cumulative time,
+- a stack sampler thread that records collapsed stacks of the request
+  thread (feed ``*.collapsed`` to flamegraph.pl or speedscope),
+- tracemalloc for the peak traced memory and the top allocation sites.
+
+Results are written to ``settings.PROFILES_DIR`` and listed in the admin at
+``/admin/profiles/``. Because the whole request is profiled, this covers
+``parse_and_analyze_csv``, the bulk insert and ``generate_pdf_report_bytes``.
+Only one request is profiled at a time; concurrent flagged requests run
+unprofiled.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+logger = logging.getLogger(__name__)
+
+_profile_lock = threading.Lock()
+
+# Frames from this module would otherwise appear at the root of every stack.
+_THIS_FILE = __file__
+
+
+def profiles_dir() -> Path:
+    return Path(getattr(settings, 'PROFILES_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def _profiling_requested(request) -> bool:
+    flag = request.META.get('HTTP_X_PROFILE') or request.GET.get('profile')
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+
+def _staff_user(request):
+    """Return the staff user behind the request, or None.
+
+    DRF authenticates inside the view, so token auth is resolved here
+    directly; session users come from AuthenticationMiddleware.
+    """
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            result = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            result = None
+        user = result[0] if result else None
+    if user is not None and user.is_active and user.is_staff:
+        return user
+    return None
+
+
+class StackSampler(threading.Thread):
+    """Sample one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != _THIS_FILE:
+                    names.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _top_functions(profiler: cProfile.Profile, limit: int):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, lineno, func), (cc, nc, tt, ct, _callers) in stats.stats.items():
+        rows.append({
+            'function': f"{filename}:{lineno}({func})",
+            'calls': nc,
+            'primitive_calls': cc,
+            'total_time_s': round(tt, 6),
+            'cumulative_time_s': round(ct, 6),
+        })
+    rows.sort(key=lambda r: r['cumulative_time_s'], reverse=True)
+    return rows[:limit]
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot, limit: int):
+    return [
+        {
+            'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'size_bytes': stat.size,
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+class ProfilingMiddleware:
+    """Profile flagged requests from staff users and store the results."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _profiling_requested(request):
+            return self.get_response(request)
+
+        user = _staff_user(request)
+        if user is None or not _profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            return self._profile(request, user)
+        finally:
+            _profile_lock.release()
+
+    def _profile(self, request, user):
+        interval = float(getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005))
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(int(getattr(settings, 'PROFILING_TRACEMALLOC_FRAMES', 10)))
+        tracemalloc.reset_peak()
+
+        sampler = StackSampler(threading.get_ident(), interval)
+        profiler = cProfile.Profile()
+        sampler.start()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            sampler.stop()
+            _current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+        try:
+            profile_id = self._save(request, user, response, duration, peak, profiler, sampler, snapshot)
+            response['X-Profile-Id'] = profile_id
+        except Exception:
+            logger.exception('Failed to save request profile')
+        return response
+
+    def _save(self, request, user, response, duration, peak, profiler, sampler, snapshot) -> str:
+        match = getattr(request, 'resolver_match', None)
+        view = re.sub(r'[^A-Za-z0-9_-]+', '-', (match.view_name if match else '') or 'request')
+        now = datetime.now(timezone.utc)
+        profile_id = f"{now:%Y%m%d-%H%M%S}_{view}_{uuid4().hex[:8]}"
+
+        directory = profiles_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+
+        meta = {
+            'id': profile_id,
+            'created_at': now.isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view,
+            'user': user.get_username(),
+            'status': response.status_code,
+            'duration_s': round(duration, 6),
+            'sample_interval_s': sampler.interval,
+            'samples': sum(sampler.stacks.values()),
+            'tracemalloc_peak_bytes': peak,
+            'top_functions': _top_functions(profiler, 50),
+            'top_allocations': _top_allocations(snapshot, 25),
+        }
+        (directory / f"{profile_id}.json").write_text(json.dumps(meta, indent=2), encoding='utf-8')
+        (directory / f"{profile_id}.collapsed").write_text(sampler.collapsed(), encoding='utf-8')
+        logger.info('Saved request profile %s (%.1f ms)', profile_id, duration * 1000.0)
+        return profile_id
+
+
+def list_profiles():
+    """Return saved profile metadata, newest first."""
+
+    directory = profiles_dir()
+    if not directory.exists():
+        return []
+    profiles = []
+    for path in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            meta = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        meta.pop('top_functions', None)
+        meta.pop('top_allocations', None)
+        profiles.append(meta)
+    return profiles
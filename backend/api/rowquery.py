@@ -0,0 +1,179 @@
+"""Server-side filtering, search and sorting of a dataset's rows (``csv-data``).
+
+``parse_row_query`` turns query parameters into a ``RowQuery``:
+
+- ``type``: comma separated (or repeated) equipment types;
+- ``min_flowrate`` / ``max_flowrate`` (likewise pressure, temperature):
+  inclusive bounds;
+- ``name_prefix``: case-sensitive prefix of the equipment name;
+- ``q``: case-insensitive substring of the equipment name;
+- ``sort``: comma separated ``ROW_SORT_FIELDS``, ``-`` prefix for
+  descending; ties are broken by upload order, reversed when the last
+  field is descending.
+
+``filter_queryset`` applies it to hot rows and ``filter_frame`` to the rows
+of an archived dataset, with the same results.
+
+Hot queries stay sub-linear in the size of the dataset through the
+``EquipmentRecord`` composite indexes: ``(dataset, type, id)`` for type
+filters, ``(dataset, <metric>, id)`` for ranges and sorts on a metric, and
+``(dataset, equipment_name, id)`` for prefixes, which are run as a range
+(``name >= prefix AND name < prefix + U+10FFFF``) rather than ``LIKE`` so
+the index applies. On SQLite, substrings of ``SEARCH_MIN_LENGTH`` or more
+characters go through the FTS5 trigram table ``FTS_TABLE`` (kept in sync
+by triggers, see migration 0013); shorter ones, and other databases, fall
+back to ``icontains``.
+"""
+
+from __future__ import annotations
+
+import functools
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'api_equipmentrecord_fts'
+# FTS5 trigram indexes need at least three characters to match.
+SEARCH_MIN_LENGTH = 3
+
+RANGE_FIELDS = ('flowrate', 'pressure', 'temperature')
+ROW_SORT_FIELDS = ('equipment_name', 'type', 'flowrate', 'pressure', 'temperature')
+
+# Sorts after every string sharing a prefix (binary collation).
+_PREFIX_END = '\U0010ffff'
+
+
+class RowQueryError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class RowQuery:
+    types: Tuple[str, ...] = ()
+    # (field, min, max) triples; either bound may be None.
+    ranges: Tuple[Tuple[str, Optional[float], Optional[float]], ...] = ()
+    name_prefix: str = ''
+    search: str = ''
+    # (field, descending) pairs.
+    sort: Tuple[Tuple[str, bool], ...] = ()
+
+    @property
+    def filters(self) -> bool:
+        return bool(self.types or self.ranges or self.name_prefix or self.search)
+
+
+def parse_row_query(params) -> RowQuery:
+    """Build a ``RowQuery`` from request query parameters; raises ``RowQueryError``."""
+
+    types = tuple(dict.fromkeys(t.strip() for value in params.getlist('type') for t in value.split(',') if t.strip()))
+
+    ranges = []
+    for field in RANGE_FIELDS:
+        bounds = []
+        for name in (f'min_{field}', f'max_{field}'):
+            value = params.get(name)
+            try:
+                bounds.append(float(value) if value not in (None, '') else None)
+            except ValueError:
+                raise RowQueryError(f'{name} must be a number.') from None
+        if bounds != [None, None]:
+            ranges.append((field, *bounds))
+
+    sort = []
+    for item in (params.get('sort') or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        field = item.lstrip('-')
+        if field not in ROW_SORT_FIELDS or any(field == seen for seen, _ in sort):
+            raise RowQueryError(
+                f"sort must be distinct fields among: {', '.join(ROW_SORT_FIELDS)} (prefix '-' for descending)."
+            )
+        sort.append((field, item.startswith('-')))
+
+    return RowQuery(
+        types=types,
+        ranges=tuple(ranges),
+        name_prefix=params.get('name_prefix') or '',
+        search=(params.get('q') or '').strip(),
+        sort=tuple(sort),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _fts_table_exists(alias: str, name: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def fts_available() -> bool:
+    """Whether name searches can use the FTS5 trigram table on this database."""
+
+    if connection.vendor != 'sqlite':
+        return False
+    return _fts_table_exists(connection.alias, str(connection.settings_dict['NAME']))
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _ties_descending(query: RowQuery) -> bool:
+    # Ties follow the last sort key's direction, so one index scan serves the
+    # whole ordering (the indexes end in id).
+    return bool(query.sort) and query.sort[-1][1]
+
+
+def filter_queryset(qs, query: RowQuery):
+    """Apply ``query``'s filters and ordering to an ``EquipmentRecord`` queryset."""
+
+    if query.types:
+        qs = qs.filter(type__in=query.types)
+    for field, lo, hi in query.ranges:
+        if lo is not None:
+            qs = qs.filter(**{f'{field}__gte': lo})
+        if hi is not None:
+            qs = qs.filter(**{f'{field}__lte': hi})
+    if query.name_prefix:
+        qs = qs.filter(equipment_name__gte=query.name_prefix, equipment_name__lt=query.name_prefix + _PREFIX_END)
+    if query.search:
+        if len(query.search) >= SEARCH_MIN_LENGTH and fts_available():
+            qs = qs.filter(
+                id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts_phrase(query.search)])
+            )
+        else:
+            qs = qs.filter(equipment_name__icontains=query.search)
+    ordering = [f"{'-' if descending else ''}{field}" for field, descending in query.sort]
+    return qs.order_by(*ordering, '-id' if _ties_descending(query) else 'id')
+
+
+def filter_frame(df: pd.DataFrame, query: RowQuery) -> pd.DataFrame:
+    """``filter_queryset`` for a frame of rows in upload order (``RECORD_FIELDS`` columns)."""
+
+    mask = pd.Series(True, index=df.index)
+    if query.types:
+        mask &= df['type'].isin(query.types)
+    for field, lo, hi in query.ranges:
+        if lo is not None:
+            mask &= df[field] >= lo
+        if hi is not None:
+            mask &= df[field] <= hi
+    if query.name_prefix:
+        mask &= df['equipment_name'].str.startswith(query.name_prefix)
+    if query.search:
+        mask &= df['equipment_name'].str.contains(query.search, case=False, regex=False)
+    df = df[mask]
+    if query.sort:
+        ties = not _ties_descending(query)
+        # The frame is in upload (id) order, so its position breaks ties.
+        df = df.assign(_position=np.arange(len(df))).sort_values(
+            [field for field, _ in query.sort] + ['_position'],
+            ascending=[not descending for _, descending in query.sort] + [ties],
+        ).drop(columns='_position')
+    return df
+
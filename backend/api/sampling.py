@@ -0,0 +1,148 @@
+"""Approximate dataset summary from a stratified sample of a CSV file.
+
+Used to answer an asynchronous upload immediately: instead of parsing the
+whole file, the data section is split into ``strata`` byte ranges and a run
+of consecutive lines is read from a random offset inside each, so the cost
+depends on the sample size, not on the file size. Small files are read in
+full, which makes the "approximate" summary exact.
+
+The result has the same keys as ``utils.compute_summary`` plus:
+
+- ``approximate``: always True;
+- ``sample_size``: rows the estimate is based on;
+- ``confidence_level`` and ``confidence_intervals``: normal-approximation
+  bounds (with finite-population correction) for each overall average.
+
+``total_equipment`` and the type counts are estimated from the mean line
+length and the sample proportions; ``max_temperature`` is the sample
+maximum, i.e. a lower bound. Percentiles are those of the sample, and the
+distinct equipment counts only cover names seen in it (lower bounds too).
+"""
+
+from __future__ import annotations
+
+import io
+import math
+import random
+from typing import Any, Dict, Optional
+
+import pandas as pd
+from django.conf import settings
+
+from .utils import NUMERIC_COLUMNS, REQUIRED_COLUMNS, CSVValidationError, compute_summary
+
+CONFIDENCE_LEVEL = 0.95
+_Z = 1.959963984540054
+
+# Files up to this size are read in full.
+_FULL_READ_BYTES = 1024 * 1024
+
+_AVERAGES = {
+    'average_flowrate': 'Flowrate',
+    'average_pressure': 'Pressure',
+    'average_temperature': 'Temperature',
+}
+
+
+def sample_rows_target() -> int:
+    return int(getattr(settings, 'APPROX_SAMPLE_ROWS', 20_000))
+
+
+def _sample_lines(fileobj, data_start: int, data_bytes: int, sample_rows: int, strata: int, rng: random.Random):
+    if data_bytes <= _FULL_READ_BYTES:
+        fileobj.seek(data_start)
+        return fileobj.read().splitlines(keepends=True), True
+
+    strata = max(1, min(strata, sample_rows))
+    per_stratum = math.ceil(sample_rows / strata)
+    width = data_bytes / strata
+    lines = []
+    for i in range(strata):
+        lo = data_start + int(i * width)
+        hi = data_start + int((i + 1) * width)
+        fileobj.seek(rng.randrange(lo, max(lo + 1, hi)))
+        # Skip to the start of the next full line.
+        fileobj.readline()
+        for _ in range(per_stratum):
+            line = fileobj.readline()
+            if not line:
+                break
+            lines.append(line)
+    return lines, False
+
+
+def _interval(values: pd.Series, population: int):
+    n = len(values)
+    mean = float(values.mean())
+    if n < 2 or population <= n:
+        return [mean, mean]
+    fpc = math.sqrt((population - n) / (population - 1))
+    half = _Z * float(values.std(ddof=1)) / math.sqrt(n) * fpc
+    return [mean - half, mean + half]
+
+
+def approximate_summary(
+    fileobj,
+    *,
+    size: Optional[int] = None,
+    sample_rows: Optional[int] = None,
+    strata: int = 200,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Estimate the summary of the CSV in binary ``fileobj``.
+
+    Raises CSVValidationError when the header lacks required columns or no
+    sampled row is valid.
+    """
+
+    rng = random.Random(seed)
+    fileobj.seek(0)
+    header = fileobj.readline()
+    data_start = fileobj.tell()
+    if size is None:
+        fileobj.seek(0, io.SEEK_END)
+        size = fileobj.tell()
+    data_bytes = max(0, size - data_start)
+
+    lines, complete = _sample_lines(fileobj, data_start, data_bytes, sample_rows or sample_rows_target(), strata, rng)
+    fileobj.seek(0)
+    lines = [line for line in lines if line.strip()]
+
+    try:
+        df = pd.read_csv(io.BytesIO(header + b''.join(lines)))
+    except Exception as exc:
+        raise CSVValidationError(f'Invalid CSV file: {exc}') from exc
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise CSVValidationError(
+            f"CSV is missing required columns: {', '.join(missing)}. "
+            f"Required columns are: {', '.join(REQUIRED_COLUMNS)}."
+        )
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.dropna(subset=NUMERIC_COLUMNS)
+    if lines and not len(df):
+        raise CSVValidationError('No valid rows found in the sampled data.')
+
+    n = int(len(df))
+    if complete or not lines:
+        population = n
+    else:
+        mean_line_bytes = sum(len(line) for line in lines) / len(lines)
+        population = max(n, int(round(data_bytes / mean_line_bytes)))
+
+    summary = compute_summary(df)
+    scale = population / n if n else 0.0
+    summary['total_equipment'] = population
+    summary['equipment_type_distribution'] = {
+        name: int(round(count * scale)) for name, count in summary['equipment_type_distribution'].items()
+    }
+    summary.update({
+        'approximate': True,
+        'sample_size': n,
+        'confidence_level': CONFIDENCE_LEVEL,
+        'confidence_intervals': {
+            key: _interval(df[col], population) if n else [0.0, 0.0] for key, col in _AVERAGES.items()
+        },
+    })
+    return summary
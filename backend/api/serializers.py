@@ -5,18 +5,49 @@ from .models import Dataset
 
 
 class DatasetSerializer(serializers.ModelSerializer):
+    """History item serializer with optional sparse field projection.
+
+    Pass ``fields=[...]`` to serialize a subset of ``Meta.fields``; without it
+    the original ``DEFAULT_FIELDS`` shape is kept for existing clients.
+    """
+
+    DEFAULT_FIELDS = ['id', 'file_name', 'uploaded_at', 'summary']
+
     class Meta:
         model = Dataset
-        fields = ['id', 'file_name', 'uploaded_at', 'summary']
+        fields = [
+            'id',
+            'file_name',
+            'uploaded_at',
+            'total_equipment',
+            'average_flowrate',
+            'average_pressure',
+            'average_temperature',
+            'max_temperature',
+            'archived_at',
+            'analytics_version',
+            'state',
+            'summary',
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = set(fields or self.DEFAULT_FIELDS)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
 
 
 class UploadCSVSerializer(serializers.Serializer):
     file = serializers.FileField()
+    # strict: any invalid numeric cell rejects the whole file.
+    # tolerant: invalid rows are quarantined and the valid rows are ingested.
+    mode = serializers.ChoiceField(choices=['strict', 'tolerant'], default='strict', required=False)
 
     def validate_file(self, value):
         name = (value.name or '').lower()
-        if not name.endswith('.csv'):
-            raise serializers.ValidationError('Only .csv files are allowed.')
+        if not name.endswith(('.csv', '.zip')):
+            raise serializers.ValidationError('Only .csv files (or a .zip of .csv files) are allowed.')
         return value
 
 
@@ -0,0 +1,214 @@
+"""Single-flight coalescing of identical expensive computations.
+
+``coalesce(key, fn)`` runs ``fn`` once for all concurrent callers with the
+same key: the first caller (the leader) computes, everyone who arrives while
+it is running waits and gets the same result (or the same exception). Keys
+look like ``('report', dataset_id)`` or ``('summary', dataset_id, limit)``;
+the views check dataset ownership before coalescing, so the dataset id is
+enough to keep users apart.
+
+Within a process coalescing uses threads and events. With
+``SINGLEFLIGHT_BACKEND = 'file'`` leaders also take an exclusive ``flock``
+on a per-key lock file in ``SINGLEFLIGHT_LOCK_DIR`` and leave their pickled
+result next to it, so identical requests handled by other worker processes
+wait for the lock and reuse that result instead of recomputing. Only results
+finished after a caller started waiting are reused, so nothing stale is
+served, and result files are deleted once they are older than that.
+
+Results are unpickled, so the directory must be private to the server's
+user: it is created with mode ``0700`` and, if it is not owned by this user
+or is accessible to anyone else, the file backend is refused (logged) and
+coalescing stays in-process. Followers wait at most
+``SINGLEFLIGHT_WAIT_TIMEOUT`` seconds for a leader, then compute on their
+own. The file backend needs ``fcntl`` (POSIX); elsewhere it falls back to
+in-process coalescing. A database lock is not offered because SQLite has no
+row-level or advisory locks to build one on.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable
+
+from django.conf import settings
+
+from .instrumentation import stage
+from .metrics import record_cache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+_lock = threading.Lock()
+_calls: Dict[Hashable, _Call] = {}
+
+
+def wait_timeout() -> float:
+    return float(getattr(settings, 'SINGLEFLIGHT_WAIT_TIMEOUT', 60.0))
+
+
+def _lock_dir() -> Path:
+    configured = getattr(settings, 'SINGLEFLIGHT_LOCK_DIR', None)
+    if configured:
+        return Path(configured)
+    return Path(tempfile.gettempdir()) / f'chemviz-singleflight-{os.getuid()}'
+
+
+def _private_lock_dir() -> Path | None:
+    """The lock directory, created ``0700``; None when others could write to it."""
+
+    path = _lock_dir()
+    try:
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        info = os.stat(path, follow_symlinks=False)
+    except OSError:
+        logger.exception('Single-flight lock directory %s is unusable', path)
+        return None
+    if not os.path.isdir(path) or os.path.islink(path) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        logger.error(
+            'Single-flight lock directory %s must be a directory owned by uid %d with mode 0700; '
+            'coalescing within this process only',
+            path,
+            os.getuid(),
+        )
+        return None
+    return path
+
+
+def _use_file_backend() -> bool:
+    return getattr(settings, 'SINGLEFLIGHT_BACKEND', 'thread') == 'file' and fcntl is not None
+
+
+@contextmanager
+def _file_lock(path: Path, timeout: float):
+    """Hold ``path``'s exclusive lock; yields False (unlocked) if it is not free within ``timeout``."""
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, 0.25)
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _publish(base: Path, result_path: Path, result: Any) -> None:
+    tmp = base.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    with os.fdopen(fd, 'wb') as fh:
+        pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, result_path)
+
+
+def _sweep(directory: Path, older_than: float) -> None:
+    # Results are only ever reused by callers that were already waiting when
+    # they were written, so anything older than the longest wait is garbage.
+    for path in directory.glob('*.result'):
+        try:
+            if path.stat().st_mtime < older_than:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _run_across_processes(directory: Path, key: Hashable, fn: Callable[[], Any]):
+    """Run ``fn`` under the key's file lock, reusing a result another process
+    finished while this one waited. Returns ``(result, shared)``."""
+
+    base = directory / hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    result_path = base.with_suffix('.result')
+    arrived = time.time()
+    timeout = wait_timeout()
+
+    with _file_lock(base.with_suffix('.lock'), timeout) as locked:
+        if not locked:
+            logger.warning('Timed out after %.0fs waiting for single-flight leader of %r', timeout, key)
+            return fn(), False
+        try:
+            if result_path.stat().st_mtime >= arrived:
+                with open(result_path, 'rb') as fh:
+                    return pickle.load(fh), True
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        result = fn()
+        try:
+            _publish(base, result_path, result)
+            _sweep(directory, arrived - timeout)
+        except (OSError, pickle.PicklingError):
+            logger.exception('Failed to publish single-flight result for %r', key)
+        return result, False
+
+
+def coalesce(key: Hashable, fn: Callable[[], Any], *, name: str = 'singleflight') -> Any:
+    """Return ``fn()``, sharing one computation among concurrent callers with ``key``.
+
+    ``name`` labels the hit/miss counter in ``chemviz_cache_requests_total``.
+    """
+
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        with stage('coalesce'):
+            finished = call.done.wait(wait_timeout())
+        if not finished:
+            logger.warning('Timed out waiting for single-flight leader of %r', key)
+            record_cache(name, False)
+            return fn()
+        record_cache(name, True)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    shared = False
+    try:
+        directory = _private_lock_dir() if _use_file_backend() else None
+        if directory is not None:
+            call.result, shared = _run_across_processes(directory, key, fn)
+        else:
+            call.result = fn()
+        return call.result
+    except BaseException as exc:
+        call.error = exc
+        raise
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+        call.done.set()
+        record_cache(name, shared)
@@ -0,0 +1,324 @@
+"""Mergeable per-type sketches: t-digests for quantiles, HyperLogLog for distinct names.
+
+Exact percentiles need a sort of every value and exact distinct counts a
+hash set of every name; both are too expensive to redo over the stored rows
+for large fleets, or across several datasets. Instead ingest builds, per
+equipment type,
+
+- a merging t-digest (``TDigest``) for each numeric metric, and
+- a HyperLogLog counter (``HyperLogLog``) of ``Equipment Name``,
+
+and stores them with the dataset (``DatasetSketch``). Both merge exactly
+(associative, commutative), so sketches of several datasets or row windows
+combine with ``merge_sketches`` without rescanning ``EquipmentRecord``.
+
+Construction is vectorized: one ``lexsort`` per metric per chunk of rows,
+then centroids are formed with ``np.add.reduceat``; HLL registers are filled
+with ``np.maximum.at``. Typical errors are well under 1% of rank for p99
+(compression 200) and about 1.6% for distinct counts (4096 registers).
+
+Serialized form (JSON-able)::
+
+    {'version': 1,
+     'count': {type: rows},
+     'digests': {metric: {type: {'min', 'max', 'means', 'weights'}}},
+     'names': {type: '<base64 zlib registers>'}}
+
+Array payloads are base64 of little-endian float64, to keep them compact.
+"""
+
+from __future__ import annotations
+
+import base64
+import math
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+SKETCH_VERSION = 1
+COMPRESSION = 200
+HLL_PRECISION = 12
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# Rows per construction pass; bounds the temporary arrays of a huge frame.
+_CHUNK_ROWS = 1_000_000
+
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(array, dtype='<f8').tobytes()).decode('ascii')
+
+
+def _decode(text: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(text), dtype='<f8')
+
+
+def quantile_label(q: float) -> str:
+    """``0.95`` -> ``'p95'``, ``0.999`` -> ``'p99.9'``."""
+
+    return 'p' + f"{q * 100:.6f}".rstrip('0').rstrip('.')
+
+
+# ------------------------------------------------------------------ t-digest
+
+
+def _k_scale(q: np.ndarray, compression: float) -> np.ndarray:
+    # k1 scale function: small clusters near the tails, large ones near the median.
+    return compression / (2 * math.pi) * np.arcsin(2 * np.clip(q, 0.0, 1.0) - 1)
+
+
+class TDigest:
+    """Merging t-digest over float values (centroid means and weights)."""
+
+    __slots__ = ('means', 'weights', 'min', 'max', 'compression')
+
+    def __init__(self, means=None, weights=None, minimum=math.inf, maximum=-math.inf, compression=COMPRESSION):
+        self.means = np.asarray(means if means is not None else [], dtype=float)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=float)
+        self.min = float(minimum)
+        self.max = float(maximum)
+        self.compression = compression
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    @classmethod
+    def from_values(cls, values, compression=COMPRESSION) -> 'TDigest':
+        values = np.asarray(values, dtype=float)
+        return _grouped_digests(values, np.zeros(len(values), dtype=np.int64), 1, compression)[0]
+
+    @classmethod
+    def merge(cls, digests: Iterable['TDigest'], compression=COMPRESSION) -> 'TDigest':
+        digests = [d for d in digests if len(d.weights)]
+        if not digests:
+            return cls(compression=compression)
+        means = np.concatenate([d.means for d in digests])
+        weights = np.concatenate([d.weights for d in digests])
+        order = np.argsort(means, kind='stable')
+        merged = _compress(means[order], weights[order], np.zeros(1, dtype=np.int64), compression)[0]
+        merged.min = min(d.min for d in digests)
+        merged.max = max(d.max for d in digests)
+        return merged
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        if not len(self.weights):
+            return [0.0 for _ in qs]
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        # Anchor the ends at the exact extremes.
+        xp = np.concatenate(([0.0], centers, [total]))
+        fp = np.concatenate(([self.min], self.means, [self.max]))
+        return [float(v) for v in np.interp(np.asarray(qs, dtype=float) * total, xp, fp)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'min': self.min, 'max': self.max, 'means': _encode(self.means), 'weights': _encode(self.weights)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], compression=COMPRESSION) -> 'TDigest':
+        return cls(_decode(data['means']), _decode(data['weights']), data['min'], data['max'], compression)
+
+
+def _compress(means: np.ndarray, weights: np.ndarray, starts: np.ndarray, compression) -> List[TDigest]:
+    """Cluster per-group runs of sorted ``means`` (group ``i`` starts at
+    ``starts[i]``) into centroids of at most one unit of k-scale each."""
+
+    n = len(means)
+    bounds = np.append(starts, n)
+    sizes = np.diff(bounds)
+    group = np.repeat(np.arange(len(starts)), sizes)
+
+    cum = np.cumsum(weights)
+    before = np.concatenate(([0.0], cum))[bounds[:-1]]
+    totals = np.concatenate(([0.0], cum))[bounds[1:]] - before
+    mid = (cum - weights / 2 - before[group]) / np.where(totals > 0, totals, 1.0)[group]
+    bucket = np.floor(_k_scale(mid, compression) - _k_scale(np.zeros(1), compression)).astype(np.int64)
+
+    # A new centroid starts wherever the group or the k-bucket changes.
+    edges = np.flatnonzero(np.diff(bucket) != 0) + 1 if n else np.zeros(0, dtype=np.int64)
+    cuts = np.union1d(edges, starts[sizes > 0])
+    cw = np.add.reduceat(weights, cuts) if n else weights
+    cm = np.add.reduceat(means * weights, cuts) / cw if n else means
+    owner = group[cuts] if n else group
+
+    digests = []
+    for i in range(len(starts)):
+        lo, hi = np.searchsorted(owner, [i, i + 1])
+        if hi > lo:
+            digests.append(TDigest(cm[lo:hi], cw[lo:hi], means[bounds[i]], means[bounds[i + 1] - 1], compression))
+        else:
+            digests.append(TDigest(compression=compression))
+    return digests
+
+
+def _grouped_digests(values: np.ndarray, codes: np.ndarray, groups: int, compression=COMPRESSION) -> List[TDigest]:
+    """One digest per group code in ``range(groups)``, built from unit-weight values."""
+
+    keep = ~np.isnan(values)
+    values, codes = values[keep], codes[keep]
+    # Bucket by group, then sort each run in place; much faster than a lexsort over both
+    # keys. NumPy only radix-sorts integers of 16 bits or fewer, so narrow the codes first.
+    order = np.argsort(codes.astype(np.min_scalar_type(max(groups - 1, 0))), kind='stable')
+    values, codes = values[order], codes[order]
+    starts = np.searchsorted(codes, np.arange(groups))
+    for lo, hi in zip(starts, np.append(starts[1:], len(values))):
+        values[lo:hi].sort()
+    return _compress(values, np.ones(len(values)), starts, compression)
+
+
+# --------------------------------------------------------------- HyperLogLog
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter over 64-bit hashes."""
+
+    __slots__ = ('registers', 'precision')
+
+    def __init__(self, registers=None, precision=HLL_PRECISION):
+        self.precision = precision
+        m = 1 << precision
+        self.registers = np.zeros(m, dtype=np.uint8) if registers is None else np.asarray(registers, dtype=np.uint8)
+
+    @classmethod
+    def merge(cls, counters: Iterable['HyperLogLog'], precision=HLL_PRECISION) -> 'HyperLogLog':
+        merged = cls(precision=precision)
+        for counter in counters:
+            np.maximum(merged.registers, counter.registers, out=merged.registers)
+        return merged
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_str(self) -> str:
+        return base64.b64encode(zlib.compress(self.registers.tobytes())).decode('ascii')
+
+    @classmethod
+    def from_str(cls, text: str, precision=HLL_PRECISION) -> 'HyperLogLog':
+        return cls(np.frombuffer(zlib.decompress(base64.b64decode(text)), dtype=np.uint8).copy(), precision)
+
+
+def hash_names(names: pd.Series) -> np.ndarray:
+    # hash_pandas_object uses a fixed SipHash key, so hashes agree across
+    # processes and runs, which merging across datasets relies on.
+    return pd.util.hash_pandas_object(names.astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+def _grouped_hlls(hashes: np.ndarray, codes: np.ndarray, groups: int, precision=HLL_PRECISION) -> List[HyperLogLog]:
+    m = 1 << precision
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    # Leading zeros of the remaining bits, via frexp on their top 53 bits (exact in float64).
+    rest = ((hashes << np.uint64(precision)) >> np.uint64(11)).astype(np.float64)
+    rank = np.minimum(54 - np.frexp(rest)[1], 64 - precision + 1).astype(np.uint8)
+    registers = np.zeros(groups * m, dtype=np.uint8)
+    np.maximum.at(registers, codes * m + index, rank)
+    return [HyperLogLog(registers[i * m:(i + 1) * m], precision) for i in range(groups)]
+
+
+# ------------------------------------------------------------------ datasets
+
+
+def build_sketches(df: pd.DataFrame, metrics: Sequence[str], *, name_column='Equipment Name', type_column='Type') -> Dict[str, Any]:
+    """Build the serialized per-type sketches of a validated frame."""
+
+    digests: Dict[str, Dict[str, List[TDigest]]] = {metric: {} for metric in metrics}
+    names: Dict[str, List[HyperLogLog]] = {}
+    counts: Dict[str, int] = {}
+    for start in range(0, len(df), _CHUNK_ROWS):
+        chunk = df.iloc[start:start + _CHUNK_ROWS]
+        codes, types = pd.factorize(chunk[type_column].astype(str), sort=True)
+        codes = codes.astype(np.int64)
+        types = [str(t) for t in types]
+        for i, count in enumerate(np.bincount(codes, minlength=len(types))):
+            counts[types[i]] = counts.get(types[i], 0) + int(count)
+        for metric in metrics:
+            built = _grouped_digests(chunk[metric].to_numpy(dtype=float), codes, len(types))
+            for name, digest in zip(types, built):
+                digests[metric].setdefault(name, []).append(digest)
+        for name, counter in zip(types, _grouped_hlls(hash_names(chunk[name_column]), codes, len(types))):
+            names.setdefault(name, []).append(counter)
+
+    return {
+        'version': SKETCH_VERSION,
+        'count': counts,
+        'digests': {
+            metric: {name: TDigest.merge(parts).to_dict() for name, parts in per_type.items()}
+            for metric, per_type in digests.items()
+        },
+        'names': {name: HyperLogLog.merge(parts).to_str() for name, parts in names.items()},
+    }
+
+
+def sketches_for(df: pd.DataFrame, metrics: Sequence[str]) -> Dict[str, Any]:
+    """Sketches of ``df``, reusing the ones ``compute_summary`` left in ``df.attrs``."""
+
+    sketches = df.attrs.get('sketches')
+    if sketches is None:
+        sketches = build_sketches(df, metrics)
+        df.attrs['sketches'] = sketches
+    return sketches
+
+
+def merge_sketches(sketches: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Combine serialized sketches (e.g. of several datasets) into one."""
+
+    sketches = [s for s in sketches if s]
+    counts: Dict[str, int] = {}
+    digests: Dict[str, Dict[str, List[TDigest]]] = {}
+    names: Dict[str, List[HyperLogLog]] = {}
+    for sketch in sketches:
+        for name, count in sketch.get('count', {}).items():
+            counts[name] = counts.get(name, 0) + int(count)
+        for metric, per_type in sketch.get('digests', {}).items():
+            for name, data in per_type.items():
+                digests.setdefault(metric, {}).setdefault(name, []).append(TDigest.from_dict(data))
+        for name, text in sketch.get('names', {}).items():
+            names.setdefault(name, []).append(HyperLogLog.from_str(text))
+    return {
+        'version': SKETCH_VERSION,
+        'count': counts,
+        'digests': {
+            metric: {name: TDigest.merge(parts).to_dict() for name, parts in per_type.items()}
+            for metric, per_type in digests.items()
+        },
+        'names': {name: HyperLogLog.merge(parts).to_str() for name, parts in names.items()},
+    }
+
+
+def describe(sketches: Dict[str, Any], metrics: Sequence[str], quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+    """Percentiles of ``metrics`` and distinct equipment counts, overall and per type."""
+
+    labels = [quantile_label(q) for q in quantiles]
+    per_type_digests = {
+        metric: {name: TDigest.from_dict(data) for name, data in sketches.get('digests', {}).get(metric, {}).items()}
+        for metric in metrics
+    }
+    counters = {name: HyperLogLog.from_str(text) for name, text in sketches.get('names', {}).items()}
+
+    def percentiles(digest: TDigest) -> Dict[str, float]:
+        return dict(zip(labels, digest.quantiles(quantiles)))
+
+    per_type = {}
+    for name in sorted(sketches.get('count', {})):
+        per_type[name] = {
+            'count': int(sketches['count'][name]),
+            'distinct_equipment': counters[name].count() if name in counters else 0,
+            'percentiles': {
+                metric: percentiles(per_type_digests[metric][name])
+                for metric in metrics
+                if name in per_type_digests[metric]
+            },
+        }
+    return {
+        'total_equipment': int(sum(sketches.get('count', {}).values())),
+        'distinct_equipment': HyperLogLog.merge(counters.values()).count(),
+        'percentiles': {metric: percentiles(TDigest.merge(per_type_digests[metric].values())) for metric in metrics},
+        'per_type': per_type,
+    }
@@ -0,0 +1,182 @@
+"""Versioned dataset summaries with lazy upgrade on read.
+
+Every summary is stamped with the ``utils.ANALYTICS_VERSION`` it was
+computed with. When the analytics change the version is bumped, and
+instead of migrating every dataset up front, stale summaries are
+recomputed from the stored rows as they are read. ``SUMMARY_UPGRADE``
+controls the rollout:
+
+- ``'off'``: serve stored summaries as they are;
+- ``'sync'``: recompute stale summaries inside the request (identical
+  concurrent upgrades share one computation) and serve the new one. The
+  recompute takes a heavy slot (``admission.py``) like any other pandas
+  work, and a request upgrades at most ``SUMMARY_UPGRADE_SYNC_LIMIT``
+  datasets itself (history pages, ``/api/stats/``); the rest, or all of
+  them when no slot is free, are upgraded in the background;
+- ``'background'``: serve the stored summary and recompute it on a small
+  background pool, so the next read gets the new version.
+
+Either way each dataset is recomputed once and the result is stored, so an
+upgrade costs O(datasets touched). ``recompute_summaries --stale`` upgrades
+the rest in bulk.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import pandas as pd
+from django.conf import settings
+from django.db import connection
+from rest_framework.exceptions import Throttled
+
+from .admission import heavy_slot
+from .archive import dataset_records_frame
+from .models import Dataset, DatasetSketch, Report
+from .singleflight import coalesce
+from .sketches import sketches_for
+from .utils import (
+    ANALYTICS_VERSION,
+    COLUMN_FOR_FIELD,
+    NUMERIC_COLUMNS,
+    REQUIRED_COLUMNS,
+    compute_summary,
+    parse_and_analyze_csv,
+)
+
+logger = logging.getLogger(__name__)
+
+UPGRADE_MODES = ('off', 'sync', 'background')
+
+_pool_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_scheduled: Set[int] = set()
+
+
+def summary_upgrade_mode() -> str:
+    mode = getattr(settings, 'SUMMARY_UPGRADE', 'sync')
+    if mode not in UPGRADE_MODES:
+        raise ValueError(f"SUMMARY_UPGRADE must be one of {UPGRADE_MODES}, not {mode!r}")
+    return mode
+
+
+def is_stale(dataset: Dataset) -> bool:
+    return dataset.analytics_version < ANALYTICS_VERSION
+
+
+def summary_from_storage(dataset: Dataset) -> Tuple[Dict[str, Any], Dict[str, Any], int]:
+    """Compute ``(summary, sketches, rows)`` from the stored rows (hot or
+    archived), or from the stored CSV for datasets that have no rows."""
+
+    frame = dataset_records_frame(dataset)
+    if len(frame):
+        df = frame.rename(columns=COLUMN_FOR_FIELD)
+    elif dataset.csv_file:
+        # Tolerant parsing keeps only the rows ingest would have kept.
+        with dataset.csv_file.open('rb') as fh:
+            _, df, _ = parse_and_analyze_csv(fh, return_df=True, tolerant=True)
+    else:
+        df = pd.DataFrame(columns=REQUIRED_COLUMNS)
+    summary = compute_summary(df)
+    return summary, sketches_for(df, NUMERIC_COLUMNS), len(df)
+
+
+def store_summary(dataset: Dataset, summary: Dict[str, Any], sketches: Optional[Dict[str, Any]] = None) -> bool:
+    """Save a freshly computed summary (and its sketches); returns whether
+    the summary changed.
+
+    A changed summary also marks the dataset's stored PDF report stale.
+    """
+
+    changed = summary != dataset.summary
+    dataset.summary = summary
+    dataset.analytics_version = ANALYTICS_VERSION
+    dataset.save(update_fields=['summary', 'analytics_version'])
+    if sketches is not None:
+        DatasetSketch.objects.update_or_create(dataset=dataset, defaults={'data': sketches})
+    if changed:
+        Report.objects.filter(dataset=dataset).update(layout_version=0)
+    return changed
+
+
+def _upgrade(dataset_id: int) -> Optional[Dict[str, Any]]:
+    dataset = Dataset.objects.filter(pk=dataset_id).first()
+    if dataset is None:
+        return None
+    if is_stale(dataset):
+        summary, sketches, _ = summary_from_storage(dataset)
+        store_summary(dataset, summary, sketches)
+        logger.info('Upgraded summary of dataset %s to analytics version %s', dataset_id, ANALYTICS_VERSION)
+    return dataset.summary
+
+
+def _apply(dataset: Dataset, summary: Dict[str, Any]) -> None:
+    dataset.summary = summary
+    dataset.analytics_version = ANALYTICS_VERSION
+    dataset.sync_kpis_from_summary()
+
+
+def _background_upgrade(dataset_id: int) -> None:
+    try:
+        _upgrade(dataset_id)
+    except Exception:
+        logger.exception('Background summary upgrade of dataset %s failed', dataset_id)
+    finally:
+        with _pool_lock:
+            _scheduled.discard(dataset_id)
+        connection.close()
+
+
+def schedule_upgrade(dataset_id: int) -> bool:
+    """Queue a background upgrade unless one is already queued."""
+
+    global _pool
+    with _pool_lock:
+        if dataset_id in _scheduled:
+            return False
+        _scheduled.add(dataset_id)
+        if _pool is None:
+            workers = int(getattr(settings, 'SUMMARY_UPGRADE_WORKERS', 1))
+            _pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='summary-upgrade')
+        _pool.submit(_background_upgrade, dataset_id)
+    return True
+
+
+def upgrade_stale(datasets: Iterable[Dataset], *, mode: Optional[str] = None, request=None) -> None:
+    """Bring the summaries of ``datasets`` up to ``ANALYTICS_VERSION``
+    according to ``mode`` (default ``SUMMARY_UPGRADE``).
+
+    Instances must have ``analytics_version`` loaded; in ``'sync'`` mode
+    the ones upgraded in the request are updated in place. ``request``
+    is the request to take the heavy slot for.
+    """
+
+    mode = mode or summary_upgrade_mode()
+    if mode == 'off':
+        return
+    stale = [dataset for dataset in datasets if is_stale(dataset)]
+    if not stale:
+        return
+    if mode == 'sync':
+        limit = max(0, int(getattr(settings, 'SUMMARY_UPGRADE_SYNC_LIMIT', 5)))
+        now, stale = stale[:limit], stale[limit:]
+        try:
+            with heavy_slot(request) if request is not None and now else nullcontext():
+                for dataset in now:
+                    summary = coalesce(
+                        ('analytics', dataset.id, ANALYTICS_VERSION),
+                        lambda dataset_id=dataset.id: _upgrade(dataset_id),
+                        name='summary_upgrade',
+                    )
+                    if summary is not None:
+                        _apply(dataset, summary)
+        except Throttled:
+            # Busy: serve what is stored rather than a 429.
+            stale = [dataset for dataset in now if is_stale(dataset)] + stale
+    for dataset in stale:
+        schedule_upgrade(dataset.id)
+
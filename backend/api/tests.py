@@ -1,3 +1,854 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .admission import heavy_controller, reset_heavy_controller
+from .anomalies import MIN_GROUP_ROWS, detect_anomalies
+from .archive import archive_dataset, due_for_archive
+from .dropfolder import DropFolderIngester
+from .downsample import LRUCache, dataset_points, grid_sample
+from .histograms import build_histograms, rebin
+from .ingest import _AlreadyFinished, parse_csv, persist_csv
+from .models import Dataset, EquipmentRecord, IdempotencyRecord
+from .pagination import keyset_filter
+from .renderers import ORJSONParser, ORJSONRenderer
+from .rowquery import filter_queryset, parse_row_query
+from .singleflight import coalesce
+from .tiles import colorize
+from .utils import NUMERIC_COLUMNS
+from .views import HISTORY_SORT_FIELDS
+
+
+SAMPLE_CSV = (
+	"Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+	"Pump-1,Pump,120.5,5.2,110\n"
+	"Réacteur  A,Reactor,0.1,12.75,250.125\n"
+	"Valve-7,Valve,0.75,3,99.9\n"
+	"HX \"north\",Heat Exchanger,1234567.891,0.333333333333,-4.5\n"
+)
+
+
+class ORJSONRendererCompatTests(TestCase):
+	"""The orjson renderer must emit exactly what DRF's JSONRenderer did."""
+
+	def assertSameBytes(self, data):
+		self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+	def test_csv_data_rows(self):
+		rows = [
+			{'equipment_name': f'Pump-{i}', 'type': 'Pump', 'flowrate': i * 1.1, 'pressure': 2.5, 'temperature': 100.0 + i / 3}
+			for i in range(500)
+		]
+		self.assertSameBytes({'dataset_id': 3, 'total_count': 500, 'data': rows})
+
+	def test_summary_with_numpy_scalars(self):
+		summary = {
+			'total_equipment': np.int64(15),
+			'average_flowrate': np.float64(119.8),
+			'max_temperature': np.float32(130.5),
+			'equipment_type_distribution': {'Pump': np.int64(4), 'Valve': 3},
+			'avg_metrics_per_type': {'Pump': {'avg_flowrate': np.float64(1) / 3}},
+		}
+		self.assertSameBytes({'dataset_id': 1, 'summary': summary})
+
+	def test_strings_dates_and_other_types(self):
+		self.assertSameBytes({
+			'file_name': 'données "α"     \\ / \t.csv',
+			'notes': 'line\u2028separator\u2029paragraph',
+			'uploaded_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+			'naive': datetime(2024, 5, 1, 12, 30),
+			'decimal': Decimal('1.25'),
+			'items': (1, 2, 3),
+			'none': None,
+			'flags': [True, False],
+			'empty': {},
+		})
+
+	def test_extreme_floats_parse_to_same_values(self):
+		data = {'values': [1e-05, 2.5e-7, 1e16, 1.5e300, -3e-9, 0.0001]}
+		self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+	def test_parser_round_trip(self):
+		body = JSONRenderer().render({'username': 'älice', 'password': 'pw', 'n': [1, 2.5, None]})
+		self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), {'username': 'älice', 'password': 'pw', 'n': [1, 2.5, None]})
+
+
+class ORJSONEndpointCompatTests(TestCase):
+	"""End-to-end: API responses are byte-identical to DRF's rendering of the same data."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		user = get_user_model().objects.create_user('alice', 'alice@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		response = self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('fleet.csv', SAMPLE_CSV.encode('utf-8'))},
+			format='multipart',
+		)
+		self.assertEqual(response.status_code, 201)
+		self.dataset_id = response.json()['dataset_id']
+
+	def assertRenderedLikeDRF(self, url):
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response['Content-Type'], 'application/json')
+		self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+	def test_csv_data(self):
+		self.assertRenderedLikeDRF(f'/api/csv-data/{self.dataset_id}/')
+
+	def test_summary(self):
+		self.assertRenderedLikeDRF(f'/api/summary/{self.dataset_id}/')
+		self.assertRenderedLikeDRF(f'/api/summary/{self.dataset_id}/?limit=2')
+
+	def test_history(self):
+		self.assertRenderedLikeDRF('/api/history/')
+
+	def test_json_login(self):
+		response = APIClient().post('/api/login/', {'username': 'alice', 'password': 'pw123456'}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('token', response.json())
+
+
+class RowQueryPlanTests(TestCase):
+	"""csv-data filters and sorts must be answered from indexes, not table scans."""
+
+	def setUp(self):
+		user = get_user_model().objects.create_user('bob', 'bob@example.com', 'pw123456')
+		self.dataset = Dataset.objects.create(user=user, file_name='fleet.csv')
+		EquipmentRecord.objects.bulk_create([
+			EquipmentRecord(
+				dataset=self.dataset,
+				equipment_name=f"{'Pump' if i % 2 else 'Valve'}-{i:04d}",
+				type='Pump' if i % 2 else 'Valve',
+				flowrate=i,
+				pressure=i % 7,
+				temperature=100 + i % 50,
+			)
+			for i in range(200)
+		])
+
+	def plan(self, query_string):
+		qs = EquipmentRecord.objects.filter(dataset=self.dataset)
+		qs = filter_queryset(qs, parse_row_query(QueryDict(query_string))).values('equipment_name')[:20]
+		sql, params = qs.query.sql_with_params()
+		with connection.cursor() as cursor:
+			cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+			details = [row[-1] for row in cursor.fetchall()]
+		for detail in details:
+			self.assertFalse(detail.startswith('SCAN api_equipmentrecord ') or detail == 'SCAN api_equipmentrecord', details)
+		return details
+
+	def assertUsesIndex(self, details, index, condition=None):
+		expected = f'{index} ({condition})' if condition else index
+		self.assertTrue(any(expected in detail for detail in details), details)
+
+	def test_type_equality(self):
+		details = self.plan('type=Pump')
+		self.assertUsesIndex(details, 'record_dataset_type_idx', 'dataset_id=? AND type=?')
+		self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', details)
+
+	def test_type_in(self):
+		details = self.plan('type=Pump,Valve')
+		self.assertTrue(any('SEARCH api_equipmentrecord USING' in detail for detail in details), details)
+
+	def test_numeric_range(self):
+		self.assertUsesIndex(
+			self.plan('min_temperature=110&max_temperature=120'),
+			'record_dataset_temp_idx',
+			'dataset_id=? AND temperature>? AND temperature<?',
+		)
+
+	def test_sort_follows_index(self):
+		for field, index in [('flowrate', 'record_dataset_flowrate_idx'), ('pressure', 'record_dataset_pressure_idx')]:
+			for prefix in ('', '-'):
+				details = self.plan(f'sort={prefix}{field}')
+				self.assertUsesIndex(details, index)
+				self.assertFalse(any('TEMP B-TREE' in detail for detail in details), details)
+
+	def test_name_prefix(self):
+		self.assertUsesIndex(
+			self.plan('name_prefix=Pump-01'),
+			'record_dataset_name_idx',
+			'dataset_id=? AND equipment_name>? AND equipment_name<?',
+		)
+
+	def test_substring_search_uses_fts(self):
+		details = self.plan('q=ump-01')
+		self.assertTrue(any('api_equipmentrecord_fts VIRTUAL TABLE' in detail for detail in details), details)
+		self.assertTrue(any('rowid=?' in detail for detail in details), details)
+
+
+class DatasetRowQueryTests(TestCase):
+	"""csv-data filters give the same rows for hot and archived datasets."""
+
+	QUERIES = [
+		'type=Pump',
+		'type=Pump,Valve&min_temperature=0&sort=-temperature',
+		'name_prefix=Valve',
+		'q=HX&sort=equipment_name',
+		'q=ump',
+		'min_flowrate=0.5&max_flowrate=200&sort=type,-pressure',
+		'limit=2&sort=-type',
+	]
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		user = get_user_model().objects.create_user('carol', 'carol@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		csv = SAMPLE_CSV + "Pump-2,Pump,90,4.5,130\nValve-8,Valve,1.5,2.5,99.9\n"
+		response = self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('fleet.csv', csv.encode('utf-8'))},
+			format='multipart',
+		)
+		self.assertEqual(response.status_code, 201)
+		self.dataset_id = response.json()['dataset_id']
+
+	def names(self, query_string):
+		response = self.client.get(f'/api/csv-data/{self.dataset_id}/?{query_string}')
+		self.assertEqual(response.status_code, 200)
+		return response.json()['total_count'], [row['equipment_name'] for row in response.json()['data']]
+
+	def test_filters(self):
+		self.assertEqual(self.names('type=Pump'), (2, ['Pump-1', 'Pump-2']))
+		self.assertEqual(self.names('type=Pump,Valve&sort=-temperature'), (4, ['Pump-2', 'Pump-1', 'Valve-8', 'Valve-7']))
+		self.assertEqual(self.names('min_pressure=3&max_pressure=5.2&sort=pressure'), (3, ['Valve-7', 'Pump-2', 'Pump-1']))
+		self.assertEqual(self.names('name_prefix=Valve'), (2, ['Valve-7', 'Valve-8']))
+		self.assertEqual(self.names('q=NORTH'), (1, ['HX "north"']))
+		self.assertEqual(self.names('q=ACT'), self.names('type=Reactor'))
+
+	def test_invalid_parameters(self):
+		for query_string in ('sort=color', 'sort=type,-type', 'min_flowrate=fast'):
+			response = self.client.get(f'/api/csv-data/{self.dataset_id}/?{query_string}')
+			self.assertEqual(response.status_code, 400, query_string)
+
+	def test_archived_rows_match(self):
+		hot = {query_string: self.names(query_string) for query_string in self.QUERIES}
+		archive_dataset(Dataset.objects.get(id=self.dataset_id))
+		for query_string in self.QUERIES:
+			self.assertEqual(self.names(query_string), hot[query_string], query_string)
+
+
+class ArchivePolicyTests(TestCase):
+	"""With the default settings old datasets are archived, not deleted."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		self.user = get_user_model().objects.create_user('frank', 'frank@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+
+	def upload(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			response = self.client.post(
+				'/api/upload/',
+				{'file': SimpleUploadedFile('fleet.csv', SAMPLE_CSV.encode('utf-8'))},
+				format='multipart',
+			)
+		self.assertEqual(response.status_code, 201)
+		return response.json()['dataset_id']
+
+	def test_sixth_upload_archives_oldest(self):
+		ids = [self.upload() for _ in range(6)]
+		self.assertEqual(Dataset.objects.filter(user=self.user).count(), 6)
+		oldest = Dataset.objects.get(id=ids[0])
+		self.assertTrue(oldest.is_archived)
+		self.assertFalse(EquipmentRecord.objects.filter(dataset=oldest).exists())
+		self.assertEqual(Dataset.objects.filter(user=self.user, archived_at__isnull=True).count(), 5)
+		response = self.client.get(f'/api/csv-data/{ids[0]}/')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()['total_count'], 4)
+
+	def test_processing_datasets_are_not_archived(self):
+		first, _ = self.upload(), self.upload()
+		Dataset.objects.filter(id=first).update(state='processing')
+		self.assertEqual(list(due_for_archive(self.user, hot_count=1)), [])
+		Dataset.objects.filter(id=first).update(state='ready')
+		self.assertEqual([d.id for d in due_for_archive(self.user, hot_count=1)], [first])
+
+
+class TolerantUploadTests(TestCase):
+	"""Tolerant uploads quarantine invalid rows; strict uploads reject the file."""
+
+	CSV = (
+		"Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+		"Pump-1,Pump,120.5,5.2,110\n"
+		"Pump-2,Pump,fast,4.5,130\n"
+		"Valve-7,Valve,0.75,,99.9\n"
+		"Valve-8,Valve,1.5,2.5,99.9\n"
+	)
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		user = get_user_model().objects.create_user('gina', 'gina@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+
+	def upload(self, mode):
+		return self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('fleet.csv', self.CSV.encode('utf-8')), 'mode': mode},
+			format='multipart',
+		)
+
+	def test_tolerant_quarantines_rows(self):
+		response = self.upload('tolerant')
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(response.json()['rejected_rows'], 2)
+		self.assertEqual(response.json()['summary']['total_equipment'], 2)
+		dataset_id = response.json()['dataset_id']
+		self.assertEqual(EquipmentRecord.objects.filter(dataset_id=dataset_id).count(), 2)
+
+		response = self.client.get(f'/api/quarantine/{dataset_id}/')
+		self.assertEqual(response.status_code, 200)
+		lines = response.content.decode('utf-8').splitlines()
+		self.assertEqual(lines[0], 'Line,Equipment Name,Type,Flowrate,Pressure,Temperature,Reason')
+		self.assertEqual(lines[1:], [
+			'3,Pump-2,Pump,fast,4.5,130,Flowrate: not numeric',
+			'4,Valve-7,Valve,0.75,,99.9,Pressure: missing value',
+		])
+
+	def test_strict_rejects_file(self):
+		response = self.upload('strict')
+		self.assertEqual(response.status_code, 400)
+		self.assertFalse(Dataset.objects.exists())
+
+
+class FileRangeTests(TestCase):
+	"""Range requests on stored CSV downloads (RFC 9110 section 14)."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		user = get_user_model().objects.create_user('ivan', 'ivan@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		response = self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('fleet.csv', SAMPLE_CSV.encode('utf-8'))},
+			format='multipart',
+		)
+		self.path = f"/api/csv-file/{response.json()['dataset_id']}/"
+		self.size = len(SAMPLE_CSV.encode('utf-8'))
+
+	def get(self, header):
+		response = self.client.get(self.path, HTTP_RANGE=header)
+		return response.status_code, b''.join(response.streaming_content) if response.streaming else response.content
+
+	def test_ranges(self):
+		body = SAMPLE_CSV.encode('utf-8')
+		self.assertEqual(self.get('bytes=0-9'), (206, body[:10]))
+		self.assertEqual(self.get('bytes=-5'), (206, body[-5:]))
+		# Invalid or multiple ranges are ignored: the whole file, 200.
+		for header in ('bytes=5-2', 'garbage', 'bytes=0-1,4-5'):
+			self.assertEqual(self.get(header), (200, body), header)
+		# Valid but unsatisfiable.
+		self.assertEqual(self.get(f'bytes={self.size}-')[0], 416)
+		self.assertEqual(self.get(f'bytes={self.size + 10}-{self.size + 20}')[0], 416)
+
+
+class DownsampleTests(TestCase):
+	"""Scatter downsampling of viewports that contain no rows."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		user = get_user_model().objects.create_user('dave', 'dave@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		response = self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('fleet.csv', SAMPLE_CSV.encode('utf-8'))},
+			format='multipart',
+		)
+		self.assertEqual(response.status_code, 201)
+		self.dataset_id = response.json()['dataset_id']
+
+	def test_grid_sample_without_points(self):
+		empty = np.zeros(0)
+		for mode in ('minmax', 'density'):
+			result = grid_sample(empty, empty, grid=16, mode=mode)
+			self.assertEqual(result['rows'], 0)
+		self.assertEqual(len(grid_sample(empty, empty, grid=16)['index']), 0)
+
+	def test_cached_points_are_compact(self):
+		points = dataset_points(Dataset.objects.get(id=self.dataset_id))
+		self.assertEqual(list(points.columns), ['Type', 'Flowrate', 'Pressure', 'Temperature'])
+		self.assertEqual(points['Type'].dtype, 'category')
+		self.assertFalse((points.dtypes == object).any())
+		response = self.client.get(f'/api/downsample/{self.dataset_id}/?kind=scatter')
+		self.assertEqual(sorted(response.json()['type']), ['Heat Exchanger', 'Pump', 'Reactor', 'Valve'])
+
+	def test_empty_viewport(self):
+		for query_string in ('xmin=1e9&xmax=2e9', 'type=Compressor', 'mode=density&xmin=1e9&xmax=2e9'):
+			response = self.client.get(f'/api/downsample/{self.dataset_id}/?kind=scatter&{query_string}')
+			self.assertEqual(response.status_code, 200, query_string)
+			self.assertEqual((response.json()['rows'], response.json()['x']), (0, []), query_string)
+
+
+class AnomalyDetectionTests(TestCase):
+	"""Per-type robust z-scores and fences flag planted outliers, and the endpoint pages by score."""
+
+	def frame(self):
+		rows = []
+		for i in range(20):
+			# Pressure is 5.0 on all but one pump, so its MAD is zero.
+			rows.append((f'Pump-{i}', 'Pump', 1000.0 if i == 7 else 100.0 + i, 6.0 if i == 3 else 5.0, 100.0 + i % 5))
+			rows.append((f'Valve-{i}', 'Valve', 10 + i * 0.1, 2 + (i % 4) * 0.1, 500.0 if i == 11 else 50.0 + i))
+		for i in range(MIN_GROUP_ROWS - 1):
+			rows.append((f'Reactor-{i}', 'Reactor', 10.0 ** (i * 3), 1.0, 20.0))
+		return pd.DataFrame(rows, columns=['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
+
+	def test_detector(self):
+		df = self.frame()
+		found = detect_anomalies(df)
+		flagged = {
+			df['Equipment Name'].iloc[row]: (NUMERIC_COLUMNS[metric], flags)
+			for row, metric, flags in zip(found['rows'], found['metric'], found['iqr_flags'])
+		}
+		self.assertEqual(flagged, {
+			'Pump-7': ('Flowrate', 1 << NUMERIC_COLUMNS.index('Flowrate')),
+			'Pump-3': ('Pressure', 1 << NUMERIC_COLUMNS.index('Pressure')),
+			'Valve-11': ('Temperature', 1 << NUMERIC_COLUMNS.index('Temperature')),
+		})
+		# MAD == 0 falls back to the mean absolute deviation instead of dropping the z-score.
+		pump_3 = list(found['rows']).index(df.index[df['Equipment Name'] == 'Pump-3'][0])
+		self.assertTrue(np.isfinite(found['score'][pump_3]))
+		self.assertGreater(found['score'][pump_3], found['meta']['z_threshold'])
+		self.assertNotIn('Reactor', found['meta']['by_type'])
+
+	def test_endpoint_pages_by_score(self):
+		media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+		with override_settings(MEDIA_ROOT=media_root):
+			user = get_user_model().objects.create_user('hana', 'hana@example.com', 'pw123456')
+			client = APIClient()
+			client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+			response = client.post(
+				'/api/upload/',
+				{'file': SimpleUploadedFile('fleet.csv', self.frame().to_csv(index=False).encode('utf-8'))},
+				format='multipart',
+			)
+			self.assertEqual(response.status_code, 201)
+			path = f"/api/anomalies/{response.json()['dataset_id']}/?limit=2"
+			names, scores = [], []
+			while path:
+				response = client.get(path)
+				self.assertEqual(response.status_code, 200)
+				self.assertEqual(response.json()['detection']['count'], 3)
+				names += [row['equipment_name'] for row in response.json()['results']]
+				scores += [row['score'] for row in response.json()['results']]
+				cursor = response.get('X-Next-Cursor')
+				path = f"/api/anomalies/{response.json()['dataset_id']}/?limit=2&cursor={cursor}" if cursor else None
+		self.assertEqual(sorted(names), ['Pump-3', 'Pump-7', 'Valve-11'])
+		self.assertEqual(scores, sorted(scores, reverse=True))
+
+
+class HistogramTests(TestCase):
+	"""Re-binning of stored fine bins around outliers and on zooms."""
+
+	def setUp(self):
+		rng = np.random.default_rng(0)
+		values = rng.normal(100, 5, 20000)
+		values[0] = 1e5
+		self.frame = pd.DataFrame({'Type': np.where(np.arange(len(values)) % 2, 'Pump', 'Valve'), 'Flowrate': values})
+		self.stored = build_histograms(self.frame, ['Flowrate'])
+
+	def test_outlier_does_not_flatten_fixed_bins(self):
+		result = rebin(self.stored, 'Flowrate', bins=30)
+		self.assertLess(result['edges'][-1], 200)
+		self.assertGreater(max(result['counts']), 1000)
+		self.assertEqual(result['total'] + result['below'] + result['above'], 20000)
+		self.assertGreaterEqual(result['above'], 1)
+
+	def test_adaptive_keeps_requested_bins(self):
+		result = rebin(self.stored, 'Flowrate', bins=30, mode='adaptive')
+		self.assertEqual(len(result['counts']), 30)
+		self.assertLess(max(result['counts']) - min(result['counts']), 0.05 * 20000 / 30)
+
+	def test_zoom_counts_without_aliasing(self):
+		result = rebin(self.stored, 'Flowrate', bins=40, lo=80, hi=120)
+		exact = np.histogram(self.frame['Flowrate'], bins=result['edges'])[0]
+		self.assertTrue(np.all(np.abs(np.array(result['counts']) - exact) <= np.maximum(0.1 * exact, 30)))
+
+	def test_narrow_zoom_reads_rows(self):
+		rows = mock.Mock(return_value=self.frame)
+		result = rebin(self.stored, 'Flowrate', bins=10, lo=99.9, hi=100.1, rows=rows)
+		rows.assert_called_once()
+		self.assertEqual(result['counts'], np.histogram(self.frame['Flowrate'], bins=10, range=(99.9, 100.1))[0].tolist())
+
+
+class TileTests(TestCase):
+	"""Density tiles: content negotiation, shared colour scales and the byte-bounded cache."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		user = get_user_model().objects.create_user('erin', 'erin@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		response = self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('fleet.csv', SAMPLE_CSV.encode('utf-8'))},
+			format='multipart',
+		)
+		self.assertEqual(response.status_code, 201)
+		self.dataset_id = response.json()['dataset_id']
+
+	def test_binary_accept_headers(self):
+		for tile_format, accept in (('png', 'image/png'), ('bin', 'application/octet-stream')):
+			response = self.client.get(f'/api/tiles/{self.dataset_id}/0/0/0/{tile_format}/', HTTP_ACCEPT=accept)
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(response['Content-Type'], accept)
+
+	def test_errors_stay_json(self):
+		response = self.client.get(f'/api/tiles/{self.dataset_id + 1}/0/0/0/png/', HTTP_ACCEPT='image/png')
+		self.assertEqual(response.status_code, 404)
+		self.assertEqual(response['Content-Type'], 'application/json')
+		self.assertEqual(json.loads(response.content), {'detail': 'Not found.'})
+
+	def test_count_tiles_share_level_scale(self):
+		csv = "Equipment Name,Type,Flowrate,Pressure,Temperature\nA,Pump,1,1,1\nB,Pump,1,1,1\nC,Pump,10,10,1\nD,Pump,10,1,1\n"
+		response = self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('pairs.csv', csv.encode('utf-8'))},
+			format='multipart',
+		)
+		dataset_id = response.json()['dataset_id']
+		peaks = []
+		with mock.patch('api.tiles.colorize', wraps=colorize) as spy:
+			for tx in (0, 1):
+				response = self.client.get(f'/api/tiles/{dataset_id}/1/{tx}/0/png/?size=16')
+				self.assertEqual(response.status_code, 200)
+				peaks.append(float(response['X-Tile-Max']))
+		# Tiles peaking at 2 and 1 rows are coloured on the level's peak (2), not their own.
+		self.assertEqual(peaks, [2.0, 1.0])
+		self.assertEqual([c.kwargs['vmax'] for c in spy.call_args_list], [2.0, 2.0])
+
+	def test_cache_bounded_by_bytes(self):
+		with override_settings(TEST_CACHE_SIZE=10, TEST_CACHE_BYTES=10):
+			cache = LRUCache('TEST_CACHE_SIZE', 10, bytes_setting='TEST_CACHE_BYTES', weigh=len)
+			for key in 'abc':
+				cache.put(key, key * 4)
+			self.assertEqual([cache.get(key) for key in 'abc'], [None, 'bbbb', 'cccc'])
+			cache.put('d', 'd' * 20)
+			self.assertEqual([cache.get(key) for key in 'bcd'], ['bbbb', 'cccc', None])
+
+
+class HistoryCursorTests(TestCase):
+	"""History cursors only continue the ordering they were issued for."""
+
+	def setUp(self):
+		user = get_user_model().objects.create_user('erin', 'erin@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		for name in ('b.csv', 'a.csv', 'c.csv'):
+			Dataset.objects.create(user=user, file_name=name)
+
+	def test_cursor_bound_to_sort(self):
+		response = self.client.get('/api/history/?limit=1&sort=file_name&fields=file_name')
+		self.assertEqual(response.json(), [{'file_name': 'a.csv'}])
+		cursor = response['X-Next-Cursor']
+		response = self.client.get(f'/api/history/?limit=1&sort=file_name&fields=file_name&cursor={cursor}')
+		self.assertEqual(response.json(), [{'file_name': 'b.csv'}])
+		for sort in ('total_equipment', '-file_name', ''):
+			response = self.client.get(f'/api/history/?limit=1&sort={sort}&cursor={cursor}')
+			self.assertEqual(response.status_code, 400, sort)
+
+	def test_sorts_use_indexes(self):
+		user = get_user_model().objects.get(username='erin')
+		values = {'file_name': 'a.csv', 'uploaded_at': timezone.now()}
+		for field in HISTORY_SORT_FIELDS:
+			for prefix in ('', '-'):
+				for qs in (
+					Dataset.objects.filter(user=user),
+					Dataset.objects.filter(user=user).filter(keyset_filter(field, prefix == '-', values.get(field, 1), 1)),
+				):
+					sql, params = qs.order_by(f'{prefix}{field}', f'{prefix}id').values('id')[:20].query.sql_with_params()
+					with connection.cursor() as cursor:
+						cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+						details = [row[-1] for row in cursor.fetchall()]
+					self.assertTrue(any('USING' in detail and 'INDEX dataset_user_' in detail for detail in details), details)
+					self.assertFalse(any('TEMP B-TREE' in detail for detail in details), (field, prefix, details))
+
+
+@override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.2, IDEMPOTENCY_CLAIM_LEASE=60)
+class IdempotencyLeaseTests(TestCase):
+	"""A claim left behind by a dead request stops blocking its key once its lease runs out."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+
+		user = get_user_model().objects.create_user('frank', 'frank@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		self.assertEqual(self.upload().status_code, 201)
+
+	def upload(self):
+		return self.client.post(
+			'/api/upload/',
+			{'file': SimpleUploadedFile('fleet.csv', SAMPLE_CSV.encode('utf-8'))},
+			format='multipart',
+			HTTP_IDEMPOTENCY_KEY='retry-1',
+		)
+
+	def abandon_claim(self, age):
+		# As if the first request's worker died before storing its outcome.
+		IdempotencyRecord.objects.update(completed_at=None, created_at=timezone.now() - age)
+
+	def test_claim_within_lease_blocks(self):
+		self.abandon_claim(timedelta(seconds=5))
+		response = self.upload()
+		self.assertEqual(response.status_code, 409)
+		self.assertEqual(Dataset.objects.count(), 1)
+
+	def test_expired_lease_is_taken_over(self):
+		self.abandon_claim(timedelta(minutes=2))
+		response = self.upload()
+		self.assertEqual(response.status_code, 201)
+		self.assertNotIn('Idempotent-Replayed', response)
+		self.assertEqual(Dataset.objects.count(), 2)
+		self.assertEqual(self.upload()['Idempotent-Replayed'], 'true')
+
+
+class SingleflightFileBackendTests(TestCase):
+	"""Pickled results are only shared through a directory private to the server's user."""
+
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+	def files(self, directory):
+		return sorted(name.rsplit('.', 1)[-1] for name in os.listdir(directory))
+
+	def test_private_directory(self):
+		directory = os.path.join(self.root, 'locks')
+		with override_settings(SINGLEFLIGHT_BACKEND='file', SINGLEFLIGHT_LOCK_DIR=directory):
+			self.assertEqual(coalesce(('test', 1), lambda: {'rows': 3}), {'rows': 3})
+		self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+		self.assertEqual(self.files(directory), ['lock', 'result'])
+		for name in os.listdir(directory):
+			self.assertEqual(os.stat(os.path.join(directory, name)).st_mode & 0o077, 0)
+
+	def test_shared_directory_is_refused(self):
+		os.chmod(self.root, 0o777)
+		with override_settings(SINGLEFLIGHT_BACKEND='file', SINGLEFLIGHT_LOCK_DIR=self.root):
+			with self.assertLogs('api.singleflight', 'ERROR'):
+				self.assertEqual(coalesce(('test', 2), lambda: 'computed'), 'computed')
+		self.assertEqual(os.listdir(self.root), [])
+
+
+@override_settings(DATASET_RETENTION_COUNT=3, UPLOAD_BATCH_WORKERS=2)
+class BatchUploadTests(TransactionTestCase):
+	"""Batch uploads larger than the retention window keep every dataset they report.
+
+	Batches are ingested on worker threads, which only see committed rows.
+	"""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+		reset_heavy_controller()
+		self.addCleanup(reset_heavy_controller)
+
+		self.user = get_user_model().objects.create_user('gina', 'gina@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+		self.old = [Dataset.objects.create(user=self.user, file_name=f'old-{i}.csv').id for i in range(3)]
+
+	def archive(self, count):
+		buffer = io.BytesIO()
+		with zipfile.ZipFile(buffer, 'w') as archive:
+			for i in range(count):
+				archive.writestr(f'fleet-{i}.csv', SAMPLE_CSV)
+		return SimpleUploadedFile('fleet.zip', buffer.getvalue(), content_type='application/zip')
+
+	def test_every_returned_dataset_exists(self):
+		response = self.client.post('/api/upload/', {'file': self.archive(8)}, format='multipart')
+		self.assertEqual(response.status_code, 201)
+		ids = [result['dataset_id'] for result in response.json()['results']]
+		self.assertEqual(len(ids), 8)
+		self.assertEqual(set(Dataset.objects.filter(user=self.user).values_list('id', flat=True)), set(ids))
+
+	def test_stream_holds_heavy_slot_until_consumed(self):
+		response = self.client.post('/api/upload/?stream=1', {'file': self.archive(4)}, format='multipart')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(heavy_controller().active, 1)
+		results = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+		self.assertEqual(heavy_controller().active, 0)
+		ids = {result['dataset_id'] for result in results}
+		self.assertEqual(len(ids), 4)
+		self.assertEqual(set(Dataset.objects.filter(user=self.user).values_list('id', flat=True)), ids)
+
+
+@override_settings(DATASET_RETENTION_COUNT=3)
+class DropFolderRetentionTests(TransactionTestCase):
+	"""A drop-folder burst larger than the retention window keeps a dataset for every file in done/."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+		self.user = get_user_model().objects.create_user('hank', 'hank@example.com', 'pw123456')
+
+	def test_burst_survives_retention(self):
+		Dataset.objects.create(user=self.user, file_name='old.csv')
+		for i in range(6):
+			with open(os.path.join(self.folder, f'fleet-{i}.csv'), 'w', encoding='utf-8') as fh:
+				fh.write(SAMPLE_CSV)
+		stats = DropFolderIngester(self.folder, self.user, workers=2, use_inotify=False).run(once=True)
+		self.assertEqual(stats.ok, 6)
+		self.assertEqual(len(os.listdir(os.path.join(self.folder, 'done'))), 6)
+		self.assertEqual(
+			sorted(Dataset.objects.filter(user=self.user).values_list('file_name', flat=True)),
+			[f'fleet-{i}.csv' for i in range(6)],
+		)
+
+
+@override_settings(SUMMARY_UPGRADE='sync', SUMMARY_UPGRADE_SYNC_LIMIT=1)
+class SummaryUpgradeTests(TestCase):
+	"""Synchronous summary upgrades are bounded per request and run in a heavy slot."""
+
+	def setUp(self):
+		reset_heavy_controller()
+		self.addCleanup(reset_heavy_controller)
+		user = get_user_model().objects.create_user('ivy', 'ivy@example.com', 'pw123456')
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+		for i in range(3):
+			Dataset.objects.create(user=user, file_name=f'fleet-{i}.csv')
+		Dataset.objects.update(analytics_version=0)
+
+	def stats(self):
+		with mock.patch('api.summaries.schedule_upgrade') as schedule:
+			self.assertEqual(self.client.get('/api/stats/').status_code, 200)
+		return sorted(call.args[0] for call in schedule.call_args_list)
+
+	def test_rest_go_to_background(self):
+		ids = sorted(Dataset.objects.values_list('id', flat=True))
+		self.assertEqual(self.stats(), ids[1:])
+		self.assertEqual(Dataset.objects.filter(analytics_version=0).count(), 2)
+
+	@override_settings(ADMISSION_MAX_CONCURRENT=0, ADMISSION_QUEUE_DEPTH=0)
+	def test_busy_server_defers_all(self):
+		self.assertEqual(self.stats(), sorted(Dataset.objects.values_list('id', flat=True)))
+		self.assertEqual(Dataset.objects.filter(analytics_version=0).count(), 3)
+
+
+class RecoverIngestsTests(TestCase):
+	"""Async ingests interrupted by a restart are resumed (or failed) instead of staying 'processing'."""
+
+	def setUp(self):
+		self.media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+		media = override_settings(MEDIA_ROOT=self.media_root)
+		media.enable()
+		self.addCleanup(media.disable)
+		self.user = get_user_model().objects.create_user('jack', 'jack@example.com', 'pw123456')
+
+	def interrupted(self, name, *, stored=True, minutes=30):
+		dataset = Dataset.objects.create(user=self.user, file_name=name, state='processing', summary={'approximate': True})
+		if stored:
+			dataset.csv_file.save(name, ContentFile(SAMPLE_CSV.encode('utf-8')), save=True)
+		Dataset.objects.filter(pk=dataset.pk).update(uploaded_at=timezone.now() - timedelta(minutes=minutes))
+		return dataset.pk
+
+	def test_recover(self):
+		resumed = self.interrupted('fleet.csv')
+		lost = self.interrupted('lost.csv', stored=False)
+		recent = self.interrupted('recent.csv', minutes=1)
+		call_command('recover_ingests', stdout=io.StringIO())
+
+		dataset = Dataset.objects.get(pk=resumed)
+		self.assertEqual((dataset.state, dataset.total_equipment, dataset.records.count()), ('ready', 4, 4))
+		self.assertEqual(Dataset.objects.get(pk=lost).state, 'failed')
+		self.assertEqual(Dataset.objects.get(pk=recent).state, 'processing')
+
+	def test_rows_wait_for_ingest(self):
+		pk = self.interrupted('fleet.csv', minutes=1)
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+		for path in (f'/api/csv-data/{pk}/', f'/api/summary/{pk}/?limit=2'):
+			response = client.get(path)
+			self.assertEqual(response.status_code, 409, path)
+			self.assertEqual(response.json()['state'], 'processing')
+		response = client.get(f'/api/summary/{pk}/')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()['state'], 'processing')
+
+	def test_racing_finisher_stores_nothing(self):
+		stale = Dataset.objects.get(pk=self.interrupted('fleet.csv'))
+		call_command('recover_ingests', stdout=io.StringIO())
+		with stale.csv_file.open('rb') as fh:
+			stored = File(fh, name='fleet.csv')
+			summary, df, rejected = parse_csv(stored)
+			with self.assertRaises(_AlreadyFinished):
+				persist_csv(self.user, stored, summary, df, rejected, dataset=stale)
+		self.assertEqual(stale.records.count(), 4)
@@ -0,0 +1,271 @@
+"""Density raster tiles of a metric pair, for scatter plots too dense to draw.
+
+A dataset's ``(x, y)`` extent (from its precomputed histograms) is split
+into a quadtree of tiles: at zoom ``z`` each axis has ``2**z`` tiles, and
+tile ``(tx, ty)`` covers the ``tx``-th slice of x and the ``ty``-th slice of
+y counting up from the minimum. ``render_tile`` aggregates the rows in a
+tile into a ``size`` x ``size`` grid (NumPy ``bincount``): the row count of
+each cell, or the mean of a value metric. Row 0 of the grid is the top
+(highest y) so it maps straight onto an image.
+
+Rows are indexed once per dataset and x metric (``tile_index``): all
+columns sorted by x, so a tile reads only its x slab (two
+``searchsorted``) instead of every row. Encoded tiles are cached per
+process, keyed on dataset, tile and every parameter and bounded by
+``TILE_CACHE_BYTES`` as well as ``TILE_CACHE_SIZE``, so panning and
+zooming back over visited tiles costs nothing. Formats:
+
+- ``png``: RGBA, colour-mapped (log scale for counts); empty cells are
+  transparent. Unless the client pins ``vmax``, count tiles of one zoom
+  level share a colour scale, the level's peak cell (``level_peak``), so
+  the same density gets the same colour in neighbouring tiles;
+- ``bin``: the raw grid as little-endian float32 (NaN for empty cells in
+  ``mean``), for clients that colour it themselves.
+"""
+
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .downsample import LRUCache, dataset_points
+from .histograms import dataset_histograms
+from .models import Dataset
+from .utils import NUMERIC_COLUMNS
+
+TILE_FORMATS = ('png', 'bin')
+TILE_AGGREGATES = ('count', 'mean')
+MAX_TILE_ZOOM = 16
+MIN_TILE_SIZE = 16
+MAX_TILE_SIZE = 1024
+# Level peaks are measured on at most this many cells per side, then scaled by area.
+MAX_PEAK_GRID = 2048
+
+# Colour ramp for PNG tiles (dark blue -> cyan -> yellow), interpolated.
+_RAMP = np.array(
+    [
+        [13, 8, 135],
+        [59, 130, 246],
+        [34, 211, 238],
+        [34, 197, 94],
+        [253, 231, 37],
+    ],
+    dtype=float,
+)
+
+_indexes = LRUCache('TILE_INDEX_CACHE_SIZE', 2)
+_tiles = LRUCache(
+    'TILE_CACHE_SIZE',
+    256,
+    bytes_setting='TILE_CACHE_BYTES',
+    bytes_default=64 * 1024 * 1024,
+    weigh=lambda tile: len(tile['content']),
+)
+_peaks = LRUCache('TILE_PEAK_CACHE_SIZE', 64)
+
+
+def tile_extent(dataset: Dataset, x_metric: str, y_metric: str) -> Dict[str, Any]:
+    """The zoom-0 extent of a metric pair, padded when a metric is constant."""
+
+    stored = dataset_histograms(dataset)['metrics']
+    ranges = []
+    for metric in (x_metric, y_metric):
+        lo, hi = float(stored[metric]['min']), float(stored[metric]['max'])
+        if hi <= lo:
+            lo, hi = lo - 0.5, hi + 0.5
+        ranges.append([lo, hi])
+    return {'x_range': ranges[0], 'y_range': ranges[1]}
+
+
+def tile_bounds(extent: Dict[str, Any], z: int, tx: int, ty: int) -> Tuple[float, float, float, float]:
+    """``(x0, x1, y0, y1)`` of tile ``(z, tx, ty)``."""
+
+    (x_lo, x_hi), (y_lo, y_hi) = extent['x_range'], extent['y_range']
+    span_x = (x_hi - x_lo) / 2 ** z
+    span_y = (y_hi - y_lo) / 2 ** z
+    return x_lo + tx * span_x, x_lo + (tx + 1) * span_x, y_lo + ty * span_y, y_lo + (ty + 1) * span_y
+
+
+def _build_index(dataset: Dataset, x_metric: str) -> Dict[str, Any]:
+    frame = dataset_points(dataset)
+    codes, types = pd.factorize(frame['Type'].astype(str), sort=True)
+    order = np.argsort(frame[x_metric].to_numpy(dtype=float), kind='stable')
+    index = {metric: frame[metric].to_numpy(dtype=float)[order] for metric in NUMERIC_COLUMNS}
+    index['type_codes'] = codes[order]
+    index['types'] = [str(t) for t in types]
+    return index
+
+
+def tile_index(dataset: Dataset, x_metric: str) -> Dict[str, Any]:
+    """``dataset``'s metric columns (and type codes) sorted by ``x_metric``."""
+
+    return _indexes.cached((dataset.id, x_metric), lambda: _build_index(dataset, x_metric), name='tile_index')
+
+
+def render_tile(
+    index: Dict[str, Any],
+    x_metric: str,
+    y_metric: str,
+    bounds: Tuple[float, float, float, float],
+    *,
+    size: int,
+    aggregate: str = 'count',
+    value: Optional[str] = None,
+    types: Sequence[str] = (),
+    closed_right: bool = False,
+    closed_top: bool = False,
+) -> Tuple[np.ndarray, int]:
+    """Aggregate the rows inside ``bounds`` into a ``size`` x ``size`` grid.
+
+    Returns ``(grid, rows)``. Tiles are half-open; ``closed_right`` /
+    ``closed_top`` include the extent's maximum in the last tile of a row /
+    column.
+    """
+
+    x0, x1, y0, y1 = bounds
+    xs = index[x_metric]
+    lo = np.searchsorted(xs, x0, side='left')
+    hi = np.searchsorted(xs, x1, side='right' if closed_right else 'left')
+    x = xs[lo:hi]
+    y = index[y_metric][lo:hi]
+    inside = (y >= y0) & ((y <= y1) if closed_top else (y < y1))
+    if types:
+        wanted = [i for i, name in enumerate(index['types']) if name in types]
+        inside &= np.isin(index['type_codes'][lo:hi], wanted)
+    x, y = x[inside], y[inside]
+
+    col = np.clip(((x - x0) / (x1 - x0) * size).astype(np.int64), 0, size - 1)
+    row = size - 1 - np.clip(((y - y0) / (y1 - y0) * size).astype(np.int64), 0, size - 1)
+    cell = row * size + col
+    counts = np.bincount(cell, minlength=size * size).astype(float)
+    if aggregate == 'mean':
+        sums = np.bincount(cell, weights=index[value][lo:hi][inside], minlength=size * size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            grid = np.where(counts > 0, sums / counts, np.nan)
+    else:
+        grid = counts
+    return grid.reshape(size, size), int(len(x))
+
+
+def level_peak(dataset: Dataset, x_metric: str, y_metric: str, z: int, *, size: int, types: Sequence[str] = ()) -> float:
+    """Highest row count of any cell at zoom ``z`` (tiles of ``size`` cells).
+
+    The whole extent is rendered at the level's resolution, up to
+    ``MAX_PEAK_GRID`` cells per side; deeper levels take that peak scaled
+    by cell area (a uniform-density estimate), but never below one row.
+    """
+
+    resolution = size * 2 ** z
+    cells = min(resolution, max(MAX_PEAK_GRID, size))
+    types = tuple(sorted(types))
+
+    def build():
+        grid, _ = render_tile(
+            tile_index(dataset, x_metric),
+            x_metric,
+            y_metric,
+            tile_bounds(tile_extent(dataset, x_metric, y_metric), 0, 0, 0),
+            size=cells,
+            types=types,
+            closed_right=True,
+            closed_top=True,
+        )
+        return float(grid.max())
+
+    peak = _peaks.cached((dataset.id, x_metric, y_metric, cells, types), build, name='tile_peak')
+    return max(peak * (cells / resolution) ** 2, 1.0)
+
+
+def colorize(grid: np.ndarray, *, log: bool, vmin: Optional[float] = None, vmax: Optional[float] = None) -> np.ndarray:
+    """RGBA ``uint8`` image of ``grid``; NaN and (for ``log``) zero cells are transparent."""
+
+    empty = np.isnan(grid) | ((grid <= 0) if log else False)
+    values = np.log1p(np.where(empty, 0, grid)) if log else np.where(empty, 0, grid)
+    filled = values[~empty]
+    scale = np.log1p if log else float
+    if vmin is not None:
+        lo = scale(vmin)
+    else:
+        lo = 0.0 if log or not len(filled) else filled.min()
+    hi = scale(vmax) if vmax is not None else (filled.max() if len(filled) else 1.0)
+    scaled = np.clip((values - lo) / (hi - lo), 0, 1) if hi > lo else np.ones_like(values)
+    positions = np.linspace(0, 1, len(_RAMP))
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(scaled, positions, _RAMP[:, channel]).round().astype(np.uint8)
+    rgba[..., 3] = np.where(empty, 0, 255)
+    return rgba
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Minimal PNG encoder (8-bit RGBA, no filtering) with the standard library."""
+
+    height, width = rgba.shape[:2]
+    raw = np.hstack((np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4))).tobytes()
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b'')
+
+
+def dataset_tile(
+    dataset: Dataset,
+    x_metric: str,
+    y_metric: str,
+    z: int,
+    tx: int,
+    ty: int,
+    *,
+    size: int = 256,
+    aggregate: str = 'count',
+    value: Optional[str] = None,
+    types: Sequence[str] = (),
+    tile_format: str = 'png',
+    vmin: Optional[float] = None,
+    vmax: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Encoded tile ``{'content', 'content_type', 'rows', 'max', 'bounds'}``, cached."""
+
+    types = tuple(sorted(types))
+    key = (dataset.id, x_metric, y_metric, z, tx, ty, size, aggregate, value, types, tile_format, vmin, vmax)
+
+    def build():
+        extent = tile_extent(dataset, x_metric, y_metric)
+        bounds = tile_bounds(extent, z, tx, ty)
+        grid, rows = render_tile(
+            tile_index(dataset, x_metric),
+            x_metric,
+            y_metric,
+            bounds,
+            size=size,
+            aggregate=aggregate,
+            value=value,
+            types=types,
+            closed_right=tx == 2 ** z - 1,
+            closed_top=ty == 2 ** z - 1,
+        )
+        finite = grid[np.isfinite(grid)]
+        peak = float(finite.max()) if len(finite) else 0.0
+        if tile_format == 'bin':
+            content, content_type = grid.astype('<f4').tobytes(), 'application/octet-stream'
+        else:
+            if aggregate == 'mean' and vmin is None and vmax is None:
+                # Colour means on the metric's full range so neighbouring tiles agree.
+                lo, hi = tile_extent(dataset, value, value)['x_range']
+                rgba = colorize(grid, log=False, vmin=lo, vmax=hi)
+            else:
+                if aggregate == 'count' and vmax is None:
+                    level_vmax = level_peak(dataset, x_metric, y_metric, z, size=size, types=types)
+                else:
+                    level_vmax = vmax
+                rgba = colorize(grid, log=aggregate == 'count', vmin=vmin, vmax=level_vmax)
+            content, content_type = encode_png(rgba), 'image/png'
+        return {'content': content, 'content_type': content_type, 'rows': rows, 'max': peak, 'bounds': list(bounds)}
+
+    return _tiles.cached(key, build, name='tile')
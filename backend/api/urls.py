@@ -1,6 +1,22 @@
 from django.urls import path
 
-from .views import HistoryView, LoginView, ReportView, DatasetSummaryView, DatasetCSVDataView, SignupView, UploadCSVView
+from .views import (
+    AnomalyView,
+    DatasetCSVDataView,
+    DatasetExportView,
+    DatasetFileView,
+    DatasetStatsView,
+    DatasetSummaryView,
+    DownsampleView,
+    HistogramView,
+    HistoryView,
+    LoginView,
+    QuarantineView,
+    ReportView,
+    SignupView,
+    TileView,
+    UploadCSVView,
+)
 
 urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
@@ -8,6 +24,16 @@ urlpatterns = [
     path('upload/', UploadCSVView.as_view(), name='upload'),
     path('summary/<int:dataset_id>/', DatasetSummaryView.as_view(), name='summary'),
     path('csv-data/<int:dataset_id>/', DatasetCSVDataView.as_view(), name='csv-data'),
+    path('csv-file/<int:dataset_id>/', DatasetFileView.as_view(), name='csv-file'),
+    path('export/<int:dataset_id>/', DatasetExportView.as_view(), name='export'),
+    path('export/<int:dataset_id>/<str:file_format>/', DatasetExportView.as_view(), name='export-format'),
+    path('anomalies/<int:dataset_id>/', AnomalyView.as_view(), name='anomalies'),
+    path('downsample/<int:dataset_id>/', DownsampleView.as_view(), name='downsample'),
+    path('tiles/<int:dataset_id>/', TileView.as_view(), name='tiles'),
+    path('tiles/<int:dataset_id>/<int:z>/<int:tx>/<int:ty>/<str:tile_format>/', TileView.as_view(), name='tile'),
+    path('histogram/<int:dataset_id>/', HistogramView.as_view(), name='histogram'),
+    path('quarantine/<int:dataset_id>/', QuarantineView.as_view(), name='quarantine'),
     path('history/', HistoryView.as_view(), name='history'),
+    path('stats/', DatasetStatsView.as_view(), name='stats'),
     path('report/<int:dataset_id>/', ReportView.as_view(), name='report'),
 ]
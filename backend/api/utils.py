@@ -19,6 +19,9 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 
+from .instrumentation import stage
+from .sketches import describe, sketches_for
+
 
 REQUIRED_COLUMNS = [
     'Equipment Name',
@@ -33,42 +36,71 @@ class CSVValidationError(ValueError):
     pass
 
 
-def parse_and_analyze_csv(uploaded_file, *, return_df: bool = False):
-    """Parse uploaded CSV and compute required analytics.
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
 
-    Returns:
-        If return_df is False: summary dict
-        If return_df is True: (summary dict, pandas.DataFrame)
+# Metrics whose p50/p95/p99 the summary reports (from the sketches; see api/sketches.py).
+PERCENTILE_COLUMNS = ['Pressure', 'Temperature']
 
-    Raises CSVValidationError with human-readable messages.
+# EquipmentRecord field -> CSV column.
+COLUMN_FOR_FIELD = {
+    'equipment_name': 'Equipment Name',
+    'type': 'Type',
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+
+# A rejected row's ``line_number`` is its data-row position counting the header
+# as line 1: data row ``i`` is reported as line ``i + 2``. It matches the
+# physical line in the file only when no blank lines precede the row (pandas
+# skips them) and no earlier field spans several lines inside quotes.
+_FIRST_DATA_LINE = 2
+
+
+def split_invalid_rows(df: pd.DataFrame):
+    """Split a raw frame into (valid_df, rejected_df) in one vectorized pass.
+
+    Every numeric column is coerced with ``errors='coerce'`` and the resulting
+    NaN masks are combined, so detection stays O(n) without touching rows in
+    Python. ``rejected_df`` keeps the original (uncoerced) cell values plus
+    ``line_number`` (data-row position, see ``_FIRST_DATA_LINE``) and
+    ``reason`` columns.
     """
 
-    if uploaded_file is None:
-        raise CSVValidationError('No file provided.')
+    coerced = {col: pd.to_numeric(df[col], errors='coerce') for col in NUMERIC_COLUMNS}
 
-    try:
-        uploaded_file.seek(0)
-    except Exception:
-        pass
+    reasons = pd.Series('', index=df.index, dtype=object)
+    invalid = pd.Series(False, index=df.index)
+    for col in NUMERIC_COLUMNS:
+        missing = df[col].isna()
+        not_numeric = coerced[col].isna() & ~missing
+        reasons = reasons.mask(missing, reasons + f"{col}: missing value; ")
+        reasons = reasons.mask(not_numeric, reasons + f"{col}: not numeric; ")
+        invalid |= missing | not_numeric
 
-    try:
-        df = pd.read_csv(uploaded_file)
-    except Exception as exc:
-        raise CSVValidationError(f'Invalid CSV file: {exc}') from exc
+    rejected = df.loc[invalid, REQUIRED_COLUMNS].copy()
+    rejected.insert(0, 'line_number', rejected.index.to_numpy() + _FIRST_DATA_LINE)
+    rejected['reason'] = reasons[invalid].str.rstrip('; ')
 
-    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
-    if missing:
-        raise CSVValidationError(
-            f"CSV is missing required columns: {', '.join(missing)}. "
-            f"Required columns are: {', '.join(REQUIRED_COLUMNS)}."
-        )
+    valid = df.loc[~invalid].copy()
+    for col in NUMERIC_COLUMNS:
+        valid[col] = coerced[col][~invalid].astype(float)
+
+    return valid, rejected
 
-    # Numeric validation/coercion
-    for col in ['Flowrate', 'Pressure', 'Temperature']:
-        try:
-            df[col] = pd.to_numeric(df[col], errors='raise')
-        except Exception as exc:
-            raise CSVValidationError(f"Column '{col}' must contain numeric values.") from exc
+
+# Bump whenever compute_summary's output changes; datasets stamped with an
+# older version are recomputed lazily (see api/summaries.py).
+# 2: percentiles and distinct equipment counts from per-type sketches.
+ANALYTICS_VERSION = 2
+
+
+def compute_summary(df: pd.DataFrame) -> Dict[str, Any]:
+    """Compute the dataset summary from an already-validated frame.
+
+    Percentiles and distinct counts come from the frame's sketches, which
+    are left in ``df.attrs['sketches']`` for ingest to store.
+    """
 
     total_equipment = int(len(df))
     avg_flowrate = float(df['Flowrate'].mean()) if total_equipment else 0.0
@@ -89,7 +121,11 @@ def parse_and_analyze_csv(uploaded_file, *, return_df: bool = False):
             'avg_temperature': float(type_df['Temperature'].mean()),
         }
 
-    summary = {
+    with stage('sketch'):
+        described = describe(sketches_for(df, NUMERIC_COLUMNS), PERCENTILE_COLUMNS)
+    per_type = described['per_type']
+
+    return {
         'total_equipment': total_equipment,
         'average_flowrate': avg_flowrate,
         'average_pressure': avg_pressure,
@@ -97,8 +133,70 @@ def parse_and_analyze_csv(uploaded_file, *, return_df: bool = False):
         'max_temperature': max_temperature,
         'equipment_type_distribution': equipment_type_distribution,
         'avg_metrics_per_type': avg_metrics_per_type,
+        'percentiles': described['percentiles'],
+        'percentiles_per_type': {name: stats['percentiles'] for name, stats in per_type.items()},
+        'distinct_equipment': described['distinct_equipment'],
+        'distinct_equipment_per_type': {name: stats['distinct_equipment'] for name, stats in per_type.items()},
     }
 
+
+def parse_and_analyze_csv(uploaded_file, *, return_df: bool = False, tolerant: bool = False):
+    """Parse uploaded CSV and compute required analytics.
+
+    Returns:
+        If return_df is False: summary dict
+        If return_df is True: (summary dict, pandas.DataFrame)
+        If tolerant is True, the rejected rows frame (see split_invalid_rows)
+        is appended to the returned tuple.
+
+    In strict mode (the default) a single non-numeric cell rejects the file.
+    In tolerant mode invalid rows are split off and the summary covers only
+    the valid rows.
+
+    Raises CSVValidationError with human-readable messages.
+    """
+
+    if uploaded_file is None:
+        raise CSVValidationError('No file provided.')
+
+    try:
+        uploaded_file.seek(0)
+    except Exception:
+        pass
+
+    # Tolerant mode reads numeric columns as text so quarantined cells keep
+    # their original spelling; coercion happens in split_invalid_rows.
+    read_kwargs = {'dtype': {col: str for col in NUMERIC_COLUMNS}} if tolerant else {}
+    try:
+        df = pd.read_csv(uploaded_file, **read_kwargs)
+    except Exception as exc:
+        raise CSVValidationError(f'Invalid CSV file: {exc}') from exc
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise CSVValidationError(
+            f"CSV is missing required columns: {', '.join(missing)}. "
+            f"Required columns are: {', '.join(REQUIRED_COLUMNS)}."
+        )
+
+    rejected = None
+    if tolerant:
+        df, rejected = split_invalid_rows(df)
+    else:
+        # Numeric validation/coercion
+        for col in NUMERIC_COLUMNS:
+            try:
+                df[col] = pd.to_numeric(df[col], errors='raise')
+            except Exception as exc:
+                raise CSVValidationError(f"Column '{col}' must contain numeric values.") from exc
+
+    summary = compute_summary(df)
+
+    if tolerant:
+        if return_df:
+            return summary, df, rejected
+        return summary, rejected
+
     if return_df:
         return summary, df
 
@@ -310,6 +408,9 @@ def generate_radar_chart(summary: Dict[str, Any]) -> str:
 
 # ==================== PDF GENERATION WITH CHARTS ====================
 
+# Bump whenever the report layout changes so stored PDFs are re-rendered.
+REPORT_LAYOUT_VERSION = 1
+
 def generate_pdf_report_bytes(*, dataset_name: str, uploaded_at, summary: Dict[str, Any]) -> bytes:
     """Generate professional PDF report with embedded Matplotlib charts."""
     
@@ -412,7 +513,8 @@ def generate_pdf_report_bytes(*, dataset_name: str, uploaded_at, summary: Dict[s
     try:
         # Chart 1: Equipment Type Distribution
         story.append(Paragraph('Equipment Type Distribution', heading_style))
-        chart1_path = generate_type_distribution_bar_chart(summary)
+        with stage('charts'):
+            chart1_path = generate_type_distribution_bar_chart(summary)
         if chart1_path:
             temp_files.append(chart1_path)
             img1 = Image(chart1_path, width=6*inch, height=3*inch)
@@ -423,7 +525,8 @@ def generate_pdf_report_bytes(*, dataset_name: str, uploaded_at, summary: Dict[s
         
         # Chart 2: Equipment Share (on same page as Chart 1)
         story.append(Paragraph('Equipment Share by Type', heading_style))
-        chart2_path = generate_equipment_share_donut_chart(summary)
+        with stage('charts'):
+            chart2_path = generate_equipment_share_donut_chart(summary)
         if chart2_path:
             temp_files.append(chart2_path)
             img2 = Image(chart2_path, width=4.5*inch, height=3.5*inch)
@@ -434,7 +537,8 @@ def generate_pdf_report_bytes(*, dataset_name: str, uploaded_at, summary: Dict[s
         
         # Chart 3: Avg Metrics per Type
         story.append(Paragraph('Average Metrics per Equipment Type', heading_style))
-        chart3_path = generate_avg_metrics_per_type_chart(summary)
+        with stage('charts'):
+            chart3_path = generate_avg_metrics_per_type_chart(summary)
         if chart3_path:
             temp_files.append(chart3_path)
             img3 = Image(chart3_path, width=6.5*inch, height=3*inch)
@@ -445,7 +549,8 @@ def generate_pdf_report_bytes(*, dataset_name: str, uploaded_at, summary: Dict[s
         
         # Chart 4: Equipment Metrics Trend (Line Chart) - Same page as Chart 3
         story.append(Paragraph('Equipment Metrics Trend', heading_style))
-        chart4_path = generate_equipment_metrics_trend_chart(summary)
+        with stage('charts'):
+            chart4_path = generate_equipment_metrics_trend_chart(summary)
         if chart4_path:
             temp_files.append(chart4_path)
             img4 = Image(chart4_path, width=6.5*inch, height=3*inch)
@@ -456,7 +561,8 @@ def generate_pdf_report_bytes(*, dataset_name: str, uploaded_at, summary: Dict[s
         
         # Chart 5: Radar Chart
         story.append(Paragraph('Equipment Performance Profile', heading_style))
-        chart5_path = generate_radar_chart(summary)
+        with stage('charts'):
+            chart5_path = generate_radar_chart(summary)
         if chart5_path:
             temp_files.append(chart5_path)
             img5 = Image(chart5_path, width=5*inch, height=5*inch)
@@ -464,7 +570,8 @@ def generate_pdf_report_bytes(*, dataset_name: str, uploaded_at, summary: Dict[s
             story.append(Paragraph('Figure 5: Multi-metric performance fingerprint (normalized)', caption_style))
         
         # Build PDF
-        doc.build(story)
+        with stage('pdf'):
+            doc.build(story)
         
     finally:
         # Cleanup temporary chart files
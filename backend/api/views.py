@@ -1,20 +1,70 @@
+import csv
 import logging
 import os
+import time
+from datetime import datetime
 
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import content_disposition_header
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from .models import Dataset, EquipmentRecord, Report
+from .admission import heavy_endpoint, heavy_slot
+from .anomalies import Z_FIELD, dataset_anomalies
+from .archive import dataset_records_frame
+from .authentication import TimedTokenAuthentication
+from .downsample import (
+	DOWNSAMPLE_KINDS,
+	MAX_GRID,
+	MAX_LINE_POINTS,
+	SCATTER_MODES,
+	dataset_points,
+	downsample_line,
+	downsample_scatter,
+)
+from .export import EXPORT_FORMATS, stream_export
+from .files import serve_stored_file
+from .histograms import FINE_BINS, HISTOGRAM_MODES, dataset_histograms, rebin
+from .idempotency import idempotent
+from .ingest import IngestError, batch_members, ingest_batch, ingest_csv, is_zip_upload, start_async_ingest
+from .instrumentation import stage
+from .metrics import BYTES_UPLOADED, REPORT_RENDER, record_cache
+from .models import DATASET_KPI_FIELDS, Anomaly, Dataset, DatasetSketch, EquipmentRecord, QuarantinedRow, Report
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+from .renderers import ORJSONRenderer, OctetStreamRenderer, PNGRenderer
+from .rowquery import RowQueryError, filter_frame, filter_queryset, parse_row_query
 from .serializers import DatasetSerializer, SignupSerializer, UploadCSVSerializer
-from .utils import CSVValidationError, generate_pdf_report_bytes, parse_and_analyze_csv
+from .singleflight import coalesce
+from .sketches import DEFAULT_QUANTILES, describe, merge_sketches
+from .summaries import upgrade_stale
+from .tiles import (
+	MAX_TILE_SIZE,
+	MAX_TILE_ZOOM,
+	MIN_TILE_SIZE,
+	TILE_AGGREGATES,
+	TILE_FORMATS,
+	dataset_tile,
+	tile_extent,
+)
+from .utils import (
+	COLUMN_FOR_FIELD,
+	NUMERIC_COLUMNS,
+	REPORT_LAYOUT_VERSION,
+	REQUIRED_COLUMNS,
+	compute_summary,
+	generate_pdf_report_bytes,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -73,64 +123,123 @@ class SignupView(APIView):
 		)
 
 
+def _wants_async(request) -> bool:
+	return (
+		str(request.query_params.get('async', '')).lower() in ('1', 'true', 'yes')
+		or 'respond-async' in request.headers.get('Prefer', '')
+	)
+
+
+def _not_ready(dataset):
+	"""409 for datasets whose rows are still being ingested (or failed to be)."""
+	if dataset.state == 'ready':
+		return None
+	if dataset.state == 'failed':
+		return Response({'detail': dataset.processing_error or 'Ingest failed.', 'state': 'failed'}, status=status.HTTP_409_CONFLICT)
+	response = Response({'detail': 'Dataset is still being processed.', 'state': dataset.state}, status=status.HTTP_409_CONFLICT)
+	response['Retry-After'] = '2'
+	return response
+
+
 class UploadCSVView(APIView):
-	authentication_classes = [TokenAuthentication]
+	"""Upload one CSV, or a batch: several ``file`` parts and/or ZIPs of CSVs.
+
+	A batch is ingested in parallel and answers with one result per file
+	(``dataset_id`` and ``summary``, or ``error``). With ``?stream=1`` (or
+	``Accept: application/x-ndjson``) results are streamed as NDJSON lines as
+	each file finishes.
+
+	A single CSV sent with ``?async=1`` (or ``Prefer: respond-async``) gets
+	``202`` at once with an approximate summary (``summary.approximate``);
+	poll ``summary/<id>/`` until ``state`` is ``ready`` (or ``failed``).
+
+	Requests carrying an ``Idempotency-Key`` header are executed once; retries
+	with the same key get the first response replayed (see api/idempotency.py).
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
 	permission_classes = [IsAuthenticated]
 	parser_classes = [MultiPartParser, FormParser]
 
+	@idempotent('upload')
+	@heavy_endpoint
 	def post(self, request):
 		serializer = UploadCSVSerializer(data=request.data)
 		if not serializer.is_valid():
 			return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-		uploaded_file = serializer.validated_data['file']
+		files = request.FILES.getlist('file') or [serializer.validated_data['file']]
+		tolerant = serializer.validated_data.get('mode') == 'tolerant'
+		for uploaded in files:
+			try:
+				serializer.fields['file'].run_validation(uploaded)
+				serializer.validate_file(uploaded)
+			except ValidationError as exc:
+				return Response({'file': exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+			BYTES_UPLOADED.inc(uploaded.size or 0)
 
-		safe_original = os.path.basename(uploaded_file.name)
-		try:
+		if len(files) > 1 or is_zip_upload(files[0]):
+			return self._batch(request, files, tolerant)
+
+		if _wants_async(request):
 			try:
-				uploaded_file.seek(0)
-			except Exception:
-				pass
-			summary, df = parse_and_analyze_csv(uploaded_file, return_df=True)
-		except CSVValidationError as exc:
+				dataset = start_async_ingest(request.user, files[0], tolerant=tolerant)
+			except IngestError as exc:
+				return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+			response = Response(
+				{'dataset_id': dataset.id, 'state': dataset.state, 'summary': dataset.summary},
+				status=status.HTTP_202_ACCEPTED,
+			)
+			response['Location'] = request.build_absolute_uri(f'/api/summary/{dataset.id}/')
+			return response
+
+		try:
+			dataset, rejected_rows = ingest_csv(request.user, files[0], tolerant=tolerant)
+		except IngestError as exc:
 			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
-		except Exception as exc:
-			logger.exception('Unexpected error during CSV analytics')
-			return Response({'detail': f'Failed to process CSV: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
 
-		with transaction.atomic():
-			dataset = Dataset.objects.create(user=request.user, file_name=safe_original, summary=summary)
+		payload = {'dataset_id': dataset.id, 'summary': dataset.summary}
+		if tolerant:
+			payload['rejected_rows'] = rejected_rows
+		return Response(payload, status=status.HTTP_201_CREATED)
 
-			# Persist the CSV file in MEDIA_ROOT and link it in the DB.
-			try:
-				try:
-					uploaded_file.seek(0)
-				except Exception:
-					pass
-				dataset.csv_file.save(safe_original, uploaded_file, save=True)
-			except Exception:
-				logger.exception('Failed to store uploaded CSV on Dataset.csv_file; continuing without file persistence.')
-
-			# Persist per-row CSV data in the DB.
-			records = []
-			for _, row in df.iterrows():
-				records.append(
-					EquipmentRecord(
-						dataset=dataset,
-						equipment_name=str(row['Equipment Name']),
-						type=str(row['Type']),
-						flowrate=float(row['Flowrate']),
-						pressure=float(row['Pressure']),
-						temperature=float(row['Temperature']),
-					)
-				)
-			EquipmentRecord.objects.bulk_create(records, batch_size=1000)
+	def _batch(self, request, files, tolerant):
+		try:
+			members = batch_members(files)
+		except IngestError as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+		if not members:
+			return Response({'detail': 'No CSV files found in the upload.'}, status=status.HTTP_400_BAD_REQUEST)
 
-		return Response({'dataset_id': dataset.id, 'summary': dataset.summary}, status=status.HTTP_201_CREATED)
+		results = ingest_batch(request.user, members, tolerant=tolerant)
+		streaming = str(request.query_params.get('stream', '')).lower() in ('1', 'true', 'yes') or (
+			'application/x-ndjson' in request.headers.get('Accept', '')
+		)
+		if streaming:
+			renderer = ORJSONRenderer()
+			return StreamingHttpResponse(
+				(renderer.render(result) + b'\n' for result in results),
+				content_type='application/x-ndjson',
+			)
+
+		results = list(results)
+		succeeded = sum(1 for r in results if 'dataset_id' in r)
+		return Response(
+			{'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded},
+			status=status.HTTP_201_CREATED if succeeded else status.HTTP_400_BAD_REQUEST,
+		)
+
+
+def _limited_summary(request, dataset, limit):
+	with heavy_slot(request):
+		df = dataset_records_frame(dataset, limit=limit)
+		if not len(df):
+			return None
+		return compute_summary(df.rename(columns=COLUMN_FOR_FIELD))
 
 
 class DatasetSummaryView(APIView):
-	authentication_classes = [TokenAuthentication]
+	authentication_classes = [TimedTokenAuthentication]
 	permission_classes = [IsAuthenticated]
 
 	def get(self, request, dataset_id: int):
@@ -143,53 +252,44 @@ class DatasetSummaryView(APIView):
 		if limit:
 			try:
 				limit = int(limit)
-				# Get limited records and recalculate summary
-				records = EquipmentRecord.objects.filter(dataset=dataset).order_by('id')[:limit]
-				if records:
-					import pandas as pd
-					data = [{
-						'Equipment Name': r.equipment_name,
-						'Type': r.type,
-						'Flowrate': r.flowrate,
-						'Pressure': r.pressure,
-						'Temperature': r.temperature,
-					} for r in records]
-					df = pd.DataFrame(data)
-					
-					total_equipment = len(df)
-					avg_flowrate = float(df['Flowrate'].mean())
-					avg_pressure = float(df['Pressure'].mean())
-					avg_temperature = float(df['Temperature'].mean())
-					max_temperature = float(df['Temperature'].max())
-					
-					type_distribution_series = df['Type'].astype(str).value_counts(dropna=False)
-					equipment_type_distribution = {str(k): int(v) for k, v in type_distribution_series.to_dict().items()}
-					
-					avg_metrics_per_type = {}
-					for equip_type in df['Type'].unique():
-						type_df = df[df['Type'] == equip_type]
-						avg_metrics_per_type[str(equip_type)] = {
-							'avg_flowrate': float(type_df['Flowrate'].mean()),
-							'avg_pressure': float(type_df['Pressure'].mean()),
-							'avg_temperature': float(type_df['Temperature'].mean()),
-						}
-					
-					limited_summary = {
-						'total_equipment': total_equipment,
-						'average_flowrate': avg_flowrate,
-						'average_pressure': avg_pressure,
-						'average_temperature': avg_temperature,
-						'max_temperature': max_temperature,
-						'equipment_type_distribution': equipment_type_distribution,
-						'avg_metrics_per_type': avg_metrics_per_type,
-					}
+				# Rows of a dataset still ingesting are partial; don't compute (or share) a summary of them.
+				not_ready = _not_ready(dataset)
+				if not_ready is not None:
+					return not_ready
+				# Get limited records (hot table or archive) and recalculate summary;
+				# identical concurrent requests share one computation.
+				limited_summary = coalesce(
+					('summary', dataset.id, limit),
+					lambda: _limited_summary(request, dataset, limit),
+					name='summary_singleflight',
+				)
+				if limited_summary is not None:
 					return Response({'dataset_id': dataset.id, 'summary': limited_summary})
 			except (ValueError, TypeError):
 				pass
-		return Response({'dataset_id': dataset.id, 'summary': dataset.summary})
+		upgrade_stale([dataset], request=request)
+		payload = {'dataset_id': dataset.id, 'state': dataset.state, 'summary': dataset.summary}
+		if dataset.state == 'failed':
+			payload['error'] = dataset.processing_error
+		return Response(payload)
 
 class DatasetCSVDataView(APIView):
-	authentication_classes = [TokenAuthentication]
+	"""A dataset's rows, in upload order unless sorted.
+
+	Query parameters (all optional):
+	  - limit: maximum number of rows (default all)
+	  - type: comma separated equipment types
+	  - min_flowrate / max_flowrate, min_pressure / max_pressure,
+	    min_temperature / max_temperature: inclusive bounds
+	  - name_prefix: case-sensitive equipment name prefix
+	  - q: case-insensitive equipment name substring
+	  - sort: comma separated fields, '-' prefix for descending (e.g. -temperature,equipment_name)
+
+	``total_count`` is the number of rows matching the filters. Filtering and
+	sorting run in the database, on indexes; see api/rowquery.py.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
 	permission_classes = [IsAuthenticated]
 
 	def get(self, request, dataset_id: int):
@@ -197,19 +297,40 @@ class DatasetCSVDataView(APIView):
 			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
 		except Dataset.DoesNotExist:
 			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+		not_ready = _not_ready(dataset)
+		if not_ready is not None:
+			return not_ready
 
 		# Get limit parameter (default to all records)
 		limit = request.query_params.get('limit')
-		records_query = EquipmentRecord.objects.filter(dataset=dataset).order_by('id')
+		try:
+			limit = int(limit) if limit else None
+		except (ValueError, TypeError):
+			limit = None
+		if limit is not None and limit < 0:
+			limit = None
+
+		try:
+			query = parse_row_query(request.query_params)
+		except RowQueryError as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+		if dataset.is_archived:
+			df = filter_frame(dataset_records_frame(dataset), query)
+			total_count = int(len(df))
+			if limit is not None:
+				df = df.head(limit)
+			return Response({
+				'dataset_id': dataset.id,
+				'total_count': total_count,
+				'data': df.to_dict('records'),
+			})
+
+		records_query = filter_queryset(EquipmentRecord.objects.filter(dataset=dataset), query)
 		total_count = records_query.count()
-		
-		if limit:
-			try:
-				limit = int(limit)
-				records_query = records_query[:limit]
-			except (ValueError, TypeError):
-				pass
-		
+		if limit is not None:
+			records_query = records_query[:limit]
+
 		records = records_query.values('equipment_name', 'type', 'flowrate', 'pressure', 'temperature')
 		return Response({
 			'dataset_id': dataset.id,
@@ -217,47 +338,707 @@ class DatasetCSVDataView(APIView):
 			'data': list(records)
 		})
 
+class DatasetFileView(APIView):
+	"""Download the original uploaded CSV, streamed from storage with Range support."""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request, dataset_id: int):
+		try:
+			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+		except Dataset.DoesNotExist:
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+		if not dataset.csv_file or not dataset.csv_file.storage.exists(dataset.csv_file.name):
+			return Response({'detail': 'The original CSV is not stored for this dataset.'}, status=status.HTTP_404_NOT_FOUND)
+
+		return serve_stored_file(
+			request,
+			dataset.csv_file,
+			filename=os.path.basename(dataset.file_name) or f"dataset_{dataset.id}.csv",
+			content_type='text/csv',
+		)
+
+
+class DatasetExportView(APIView):
+	"""Stream a dataset's validated rows as CSV, Parquet or XLSX.
+
+	``/api/export/<id>/<csv|parquet|xlsx>/``; ``?type=Pump,Valve`` (or repeated
+	``type``) keeps only those equipment types.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request, dataset_id: int, file_format: str = 'csv'):
+		fmt = EXPORT_FORMATS.get(file_format.lower())
+		if fmt is None:
+			return Response(
+				{'detail': f"Unknown export format. Choose one of: {', '.join(EXPORT_FORMATS)}."},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		if not fmt.available:
+			return Response(
+				{'detail': f"{fmt.name} export is not available on this server."},
+				status=status.HTTP_501_NOT_IMPLEMENTED,
+			)
+
+		try:
+			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+		except Dataset.DoesNotExist:
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+		not_ready = _not_ready(dataset)
+		if not_ready is not None:
+			return not_ready
+
+		types = [t.strip() for value in request.query_params.getlist('type') for t in value.split(',') if t.strip()]
+
+		stem = os.path.splitext(os.path.basename(dataset.file_name))[0] or f"dataset_{dataset.id}"
+		response = StreamingHttpResponse(stream_export(dataset, fmt, types=types or None), content_type=fmt.content_type)
+		response['Content-Disposition'] = content_disposition_header(True, f"{stem}.{fmt.name}")
+		return response
+
+
+class QuarantineView(APIView):
+	"""Download the rows rejected by a tolerant upload as CSV."""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request, dataset_id: int):
+		try:
+			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+		except Dataset.DoesNotExist:
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+		response = HttpResponse(content_type='text/csv')
+		stem = os.path.splitext(os.path.basename(dataset.file_name))[0]
+		response['Content-Disposition'] = f'attachment; filename="{stem}_rejected.csv"'
+
+		writer = csv.writer(response)
+		writer.writerow(['Line', *REQUIRED_COLUMNS, 'Reason'])
+		rows = QuarantinedRow.objects.filter(dataset=dataset).order_by('line_number')
+		for line_number, values, reason in rows.values_list('line_number', 'values', 'reason').iterator():
+			writer.writerow([line_number, *(values.get(col, '') for col in REQUIRED_COLUMNS), reason])
+		return response
+
+
+def _metric_columns(value):
+	"""Map ``temperature,Pressure`` style lists to CSV metric columns; None if unknown."""
+	by_name = {col.lower(): col for col in NUMERIC_COLUMNS}
+	names = [v.strip().lower() for v in value.split(',') if v.strip()]
+	if not names or any(name not in by_name for name in names):
+		return None
+	return list(dict.fromkeys(by_name[name] for name in names))
+
+
+class HistogramView(APIView):
+	"""Histograms of a dataset's metrics, re-binned from precomputed fine bins.
+
+	Query parameters (all optional):
+	  - metric: comma separated metrics (default all of Flowrate, Pressure, Temperature)
+	  - bins: number of bins (default 30, at most FINE_BINS)
+	  - mode: ``fixed`` (equal width, default) or ``adaptive`` (roughly equal counts)
+	  - type: comma separated equipment types to include (default all)
+	  - min / max: zoom into a value range (single metric only)
+
+	Each histogram has ``edges``, overall ``counts`` and per-type counts on
+	the same edges, plus the rows ``below`` / ``above`` the range: without a
+	zoom, ``fixed`` spans the metric's far-out fences rather than outliers
+	(see api/histograms.py). Rows are read only for zooms finer than the
+	stored bins.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request, dataset_id: int):
+		params = request.query_params
+		metrics = _metric_columns(params.get('metric') or ','.join(NUMERIC_COLUMNS))
+		if metrics is None:
+			return Response(
+				{'detail': f"metric must be one or more of: {', '.join(NUMERIC_COLUMNS)}."},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		mode = params.get('mode') or 'fixed'
+		if mode not in HISTOGRAM_MODES:
+			return Response({'detail': f"mode must be one of: {', '.join(HISTOGRAM_MODES)}."}, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			bins = int(params.get('bins') or 30)
+			lo = float(params['min']) if params.get('min') else None
+			hi = float(params['max']) if params.get('max') else None
+		except ValueError:
+			return Response({'detail': 'bins must be an integer and min/max numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+		if not 1 <= bins <= FINE_BINS:
+			return Response({'detail': f'bins must be between 1 and {FINE_BINS}.'}, status=status.HTTP_400_BAD_REQUEST)
+		if (lo is not None or hi is not None) and len(metrics) > 1:
+			return Response({'detail': 'min/max need a single metric.'}, status=status.HTTP_400_BAD_REQUEST)
+		types = [t.strip() for value in params.getlist('type') for t in value.split(',') if t.strip()] or None
+
+		try:
+			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+		except Dataset.DoesNotExist:
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+		not_ready = _not_ready(dataset)
+		if not_ready is not None:
+			return not_ready
+
+		stored = dataset_histograms(dataset)
+		return Response({
+			'dataset_id': dataset.id,
+			'mode': mode,
+			'histograms': {
+				metric: rebin(
+					stored, metric, bins=bins, mode=mode, types=types, lo=lo, hi=hi,
+					rows=lambda: dataset_points(dataset),
+				)
+				for metric in metrics
+			},
+		})
+
+
+def _optional_number(params, name, cast=float):
+	value = params.get(name)
+	return cast(value) if value not in (None, '') else None
+
+
+class DownsampleView(APIView):
+	"""A dataset's rows reduced for line and scatter charts (see api/downsample.py).
+
+	Query parameters:
+	  - kind: ``line`` (default) or ``scatter``
+	  - type: comma separated equipment types (default all)
+	  line:
+	  - metric: the series (default Temperature)
+	  - points: target number of points (default 1000, max 10000)
+	  - start / end: row index window [start, end)
+	  scatter:
+	  - x / y: the metric pair (default Flowrate / Pressure)
+	  - grid: cells per axis (default 128, max 1024)
+	  - mode: ``minmax`` (real rows, default) or ``density`` (cell centroids and counts)
+	  - xmin / xmax / ymin / ymax: viewport (default the data's extent)
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request, dataset_id: int):
+		params = request.query_params
+		kind = params.get('kind') or 'line'
+		if kind not in DOWNSAMPLE_KINDS:
+			return Response({'detail': f"kind must be one of: {', '.join(DOWNSAMPLE_KINDS)}."}, status=status.HTTP_400_BAD_REQUEST)
+		types = [t.strip() for value in params.getlist('type') for t in value.split(',') if t.strip()]
+
+		if kind == 'line':
+			metrics = _metric_columns(params.get('metric') or 'Temperature')
+			if metrics is None or len(metrics) != 1:
+				return Response({'detail': f"metric must be one of: {', '.join(NUMERIC_COLUMNS)}."}, status=status.HTTP_400_BAD_REQUEST)
+			try:
+				points = int(params.get('points') or 1000)
+				start = _optional_number(params, 'start', int)
+				end = _optional_number(params, 'end', int)
+			except ValueError:
+				return Response({'detail': 'points, start and end must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+			if not 3 <= points <= MAX_LINE_POINTS:
+				return Response({'detail': f'points must be between 3 and {MAX_LINE_POINTS}.'}, status=status.HTTP_400_BAD_REQUEST)
+		else:
+			pair = [_metric_columns(params.get(axis) or default) for axis, default in (('x', 'Flowrate'), ('y', 'Pressure'))]
+			if any(m is None or len(m) != 1 for m in pair):
+				return Response({'detail': f"x and y must each be one of: {', '.join(NUMERIC_COLUMNS)}."}, status=status.HTTP_400_BAD_REQUEST)
+			mode = params.get('mode') or 'minmax'
+			if mode not in SCATTER_MODES:
+				return Response({'detail': f"mode must be one of: {', '.join(SCATTER_MODES)}."}, status=status.HTTP_400_BAD_REQUEST)
+			try:
+				grid = int(params.get('grid') or 128)
+				bounds = [_optional_number(params, name) for name in ('xmin', 'xmax', 'ymin', 'ymax')]
+			except ValueError:
+				return Response({'detail': 'grid must be an integer and xmin/xmax/ymin/ymax numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+			if not 1 <= grid <= MAX_GRID:
+				return Response({'detail': f'grid must be between 1 and {MAX_GRID}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+		try:
+			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+		except Dataset.DoesNotExist:
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+		not_ready = _not_ready(dataset)
+		if not_ready is not None:
+			return not_ready
+
+		if kind == 'line':
+			result = downsample_line(dataset, metrics[0], points=points, types=types, start=start, end=end)
+		else:
+			result = downsample_scatter(
+				dataset,
+				pair[0][0],
+				pair[1][0],
+				grid=grid,
+				mode=mode,
+				types=types,
+				x_range=bounds[:2],
+				y_range=bounds[2:],
+			)
+		return Response({'dataset_id': dataset.id, 'kind': kind, **result})
+
+
+def _tile_metrics(params):
+	"""``(x, y, value)`` metrics of a tile request; raises ``ValueError`` with the message."""
+	metrics = []
+	for name, default in (('x', 'Flowrate'), ('y', 'Pressure'), ('value', None)):
+		if not params.get(name) and default is None:
+			metrics.append(None)
+			continue
+		columns = _metric_columns(params.get(name) or default)
+		if columns is None or len(columns) != 1:
+			raise ValueError(f"x, y and value must each be one of: {', '.join(NUMERIC_COLUMNS)}.")
+		metrics.append(columns[0])
+	return metrics
+
+
+class TileView(APIView):
+	"""Density raster tiles of a metric pair (see api/tiles.py).
+
+	``/api/tiles/<id>/`` describes the tile pyramid (extent, default size,
+	maximum zoom); ``/api/tiles/<id>/<z>/<tx>/<ty>/<png|bin>/`` serves one tile.
+
+	Query parameters (all optional):
+	  - x / y: the metric pair (default Flowrate / Pressure)
+	  - agg: ``count`` (default) or ``mean`` of ``value``
+	  - value: metric averaged by ``agg=mean``
+	  - size: cells per side (default 256)
+	  - type: comma separated equipment types
+	  - vmin / vmax: colour scale bounds for png tiles
+
+	Tile responses carry X-Tile-Rows, X-Tile-Max and X-Tile-Bounds
+	(x0,x1,y0,y1); ``bin`` tiles are size x size little-endian float32, top row first.
+	Clients may send ``Accept: image/png`` or ``application/octet-stream``;
+	errors are JSON either way.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+	renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, PNGRenderer, OctetStreamRenderer]
+
+	def get(self, request, dataset_id: int, z=None, tx: int = 0, ty: int = 0, tile_format: str = 'png'):
+		params = request.query_params
+		try:
+			x_metric, y_metric, value_metric = _tile_metrics(params)
+		except ValueError as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+		try:
+			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+		except Dataset.DoesNotExist:
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+		not_ready = _not_ready(dataset)
+		if not_ready is not None:
+			return not_ready
+
+		if z is None:
+			return Response({
+				'dataset_id': dataset.id,
+				'x_metric': x_metric,
+				'y_metric': y_metric,
+				**tile_extent(dataset, x_metric, y_metric),
+				'tile_size': 256,
+				'max_zoom': MAX_TILE_ZOOM,
+				'formats': list(TILE_FORMATS),
+			})
+
+		tile_format = tile_format.lower()
+		if tile_format not in TILE_FORMATS:
+			return Response({'detail': f"Tile format must be one of: {', '.join(TILE_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+		if z > MAX_TILE_ZOOM or not (0 <= tx < 2 ** z and 0 <= ty < 2 ** z):
+			return Response({'detail': f'z must be at most {MAX_TILE_ZOOM} and tx, ty below 2**z.'}, status=status.HTTP_400_BAD_REQUEST)
+		aggregate = params.get('agg') or 'count'
+		if aggregate not in TILE_AGGREGATES:
+			return Response({'detail': f"agg must be one of: {', '.join(TILE_AGGREGATES)}."}, status=status.HTTP_400_BAD_REQUEST)
+		if aggregate == 'mean' and value_metric is None:
+			return Response({'detail': 'agg=mean needs a value metric.'}, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			size = int(params.get('size') or 256)
+			vmin = _optional_number(params, 'vmin')
+			vmax = _optional_number(params, 'vmax')
+		except ValueError:
+			return Response({'detail': 'size must be an integer and vmin/vmax numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+		if not MIN_TILE_SIZE <= size <= MAX_TILE_SIZE:
+			return Response({'detail': f'size must be between {MIN_TILE_SIZE} and {MAX_TILE_SIZE}.'}, status=status.HTTP_400_BAD_REQUEST)
+		types = [t.strip() for value in params.getlist('type') for t in value.split(',') if t.strip()]
+
+		tile = dataset_tile(
+			dataset,
+			x_metric,
+			y_metric,
+			z,
+			tx,
+			ty,
+			size=size,
+			aggregate=aggregate,
+			value=value_metric if aggregate == 'mean' else None,
+			types=types,
+			tile_format=tile_format,
+			vmin=vmin,
+			vmax=vmax,
+		)
+		response = HttpResponse(tile['content'], content_type=tile['content_type'])
+		response['X-Tile-Rows'] = str(tile['rows'])
+		response['X-Tile-Max'] = repr(tile['max'])
+		response['X-Tile-Bounds'] = ','.join(repr(b) for b in tile['bounds'])
+		# Ready datasets never change, so clients may keep tiles.
+		response['Cache-Control'] = 'private, max-age=3600'
+		return response
+
+
+ANOMALY_MAX_PAGE_SIZE = 500
+
+
+class AnomalyView(APIView):
+	"""Page through a dataset's anomalous rows, most severe first.
+
+	Query parameters (all optional):
+	  - limit: page size (default 50, max 500)
+	  - cursor: opaque keyset cursor from the previous page's X-Next-Cursor
+	  - type: comma separated equipment types
+	  - metric: only rows whose largest z-score is on this metric
+	  - min_score: lower bound on the score (largest absolute robust z-score)
+
+	The body carries the detection summary (counts per type and metric,
+	thresholds) next to ``results``; see api/anomalies.py.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request, dataset_id: int):
+		params = request.query_params
+		try:
+			limit = int(params.get('limit') or 50)
+			if limit < 1:
+				raise ValueError(limit)
+			min_score = float(params['min_score']) if params.get('min_score') else None
+		except ValueError:
+			return Response({'detail': 'limit must be a positive integer and min_score a number.'}, status=status.HTTP_400_BAD_REQUEST)
+		limit = min(limit, ANOMALY_MAX_PAGE_SIZE)
+		metric = None
+		if params.get('metric'):
+			metrics = _metric_columns(params['metric'])
+			if metrics is None or len(metrics) != 1:
+				return Response({'detail': f"metric must be one of: {', '.join(NUMERIC_COLUMNS)}."}, status=status.HTTP_400_BAD_REQUEST)
+			metric = metrics[0]
+
+		try:
+			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+		except Dataset.DoesNotExist:
+			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+		not_ready = _not_ready(dataset)
+		if not_ready is not None:
+			return not_ready
+		meta = dataset_anomalies(dataset)
+
+		qs = Anomaly.objects.filter(dataset=dataset)
+		types = [t.strip() for value in params.getlist('type') for t in value.split(',') if t.strip()]
+		if types:
+			qs = qs.filter(type__in=types)
+		if metric:
+			qs = qs.filter(metric=metric)
+		if min_score is not None:
+			qs = qs.filter(score__gte=min_score)
+		if params.get('cursor'):
+			try:
+				value, pk = decode_cursor(params['cursor'])
+			except InvalidCursor as exc:
+				return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+			qs = qs.filter(keyset_filter('score', True, value, pk))
+
+		page = list(qs.order_by('-score', '-id')[:limit + 1])
+		has_next = len(page) > limit
+		page = page[:limit]
+		results = [
+			{
+				'row_index': a.row_index,
+				'equipment_name': a.equipment_name,
+				'type': a.type,
+				'flowrate': a.flowrate,
+				'pressure': a.pressure,
+				'temperature': a.temperature,
+				'score': a.score,
+				'metric': a.metric,
+				'z': {col: getattr(a, field) for col, field in Z_FIELD.items()},
+				'iqr_outliers': [col for i, col in enumerate(NUMERIC_COLUMNS) if a.iqr_flags & (1 << i)],
+			}
+			for a in page
+		]
+		response = Response({'dataset_id': dataset.id, 'detection': meta, 'results': results})
+		if has_next:
+			cursor = encode_cursor(page[-1].score, page[-1].id)
+			next_params = params.copy()
+			next_params['cursor'] = cursor
+			response['X-Next-Cursor'] = cursor
+			response['Link'] = f'<{request.build_absolute_uri(request.path)}?{next_params.urlencode()}>; rel="next"'
+		return response
+
+
+STATS_MAX_QUANTILES = 20
+
+
+class DatasetStatsView(APIView):
+	"""Percentiles and distinct equipment counts merged across datasets.
+
+	Query parameters (all optional):
+	  - datasets: comma separated ids (default: all of the user's datasets)
+	  - q: comma separated quantiles in [0, 1] (default 0.5,0.95,0.99)
+
+	Answered from the stored sketches (api/sketches.py) without reading any
+	rows. Datasets without sketches yet (still processing, or awaiting a
+	background summary upgrade) are listed under ``pending``.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request):
+		params = request.query_params
+		qs = Dataset.objects.filter(user=request.user)
+		try:
+			if params.get('datasets'):
+				qs = qs.filter(id__in=[int(v) for v in params['datasets'].split(',') if v.strip()])
+			quantiles = [float(v) for v in params['q'].split(',') if v.strip()] if params.get('q') else list(DEFAULT_QUANTILES)
+		except ValueError:
+			return Response({'detail': 'datasets must be integers and q numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+		if not quantiles or len(quantiles) > STATS_MAX_QUANTILES or not all(0.0 <= q <= 1.0 for q in quantiles):
+			return Response(
+				{'detail': f'q must list 1 to {STATS_MAX_QUANTILES} quantiles between 0 and 1.'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		datasets = list(qs.only('id', 'analytics_version').order_by('id'))
+		# Datasets from before sketches existed get them with their summary upgrade.
+		upgrade_stale(datasets, request=request)
+		ids = [d.id for d in datasets]
+		sketches = {
+			pk: data
+			for pk, data in DatasetSketch.objects.filter(dataset_id__in=ids).values_list('dataset_id', 'data')
+			if data
+		}
+		stats = describe(merge_sketches(sketches.values()), NUMERIC_COLUMNS, quantiles)
+		return Response({
+			'datasets': [pk for pk in ids if pk in sketches],
+			'pending': [pk for pk in ids if pk not in sketches],
+			**stats,
+		})
+
+
+# Sortable/filterable history columns; all are plain columns on Dataset.
+HISTORY_SORT_FIELDS = {
+	'uploaded_at',
+	'file_name',
+	'total_equipment',
+	'average_flowrate',
+	'average_pressure',
+	'average_temperature',
+	'max_temperature',
+}
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def _parse_history_datetime(value: str):
+	parsed = parse_datetime(value)
+	if parsed is None:
+		day = parse_date(value)
+		if day is None:
+			raise ValueError(value)
+		parsed = datetime.combine(day, datetime.min.time())
+	if timezone.is_naive(parsed):
+		parsed = timezone.make_aware(parsed)
+	return parsed
+
+
 class HistoryView(APIView):
-	authentication_classes = [TokenAuthentication]
+	"""List the user's datasets, newest first by default.
+
+	Query parameters (all optional):
+	  - limit: page size (default settings.HISTORY_PAGE_SIZE, max 100)
+	  - cursor: opaque keyset cursor from the previous page's X-Next-Cursor
+	  - sort: one of HISTORY_SORT_FIELDS, '-' prefix for descending (default -uploaded_at)
+	  - uploaded_after / uploaded_before: ISO date or datetime (>= / <)
+	  - file_name: case-insensitive substring
+	  - min_total / max_total: bounds on total_equipment
+	  - fields: comma separated subset of DatasetSerializer.Meta.fields
+
+	The body stays a plain list for existing clients; the next page is
+	advertised via the X-Next-Cursor and Link headers.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
 	permission_classes = [IsAuthenticated]
 
 	def get(self, request):
-		qs = Dataset.objects.filter(user=request.user).order_by('-uploaded_at', '-id')[:5]
-		return Response(DatasetSerializer(qs, many=True).data)
+		params = request.query_params
+		qs = Dataset.objects.filter(user=request.user)
+
+		try:
+			limit = int(params.get('limit') or getattr(settings, 'HISTORY_PAGE_SIZE', 5))
+			if limit < 1:
+				raise ValueError(limit)
+		except (TypeError, ValueError):
+			return Response({'detail': 'limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+		limit = min(limit, HISTORY_MAX_PAGE_SIZE)
+
+		sort = params.get('sort') or '-uploaded_at'
+		descending = sort.startswith('-')
+		sort_field = sort.lstrip('-')
+		if sort_field not in HISTORY_SORT_FIELDS:
+			return Response(
+				{'detail': f"sort must be one of: {', '.join(sorted(HISTORY_SORT_FIELDS))} (prefix '-' for descending)."},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		fields = None
+		if params.get('fields'):
+			fields = [f.strip() for f in params['fields'].split(',') if f.strip()]
+			unknown = set(fields) - set(DatasetSerializer.Meta.fields)
+			if unknown:
+				return Response({'detail': f"Unknown fields: {', '.join(sorted(unknown))}."}, status=status.HTTP_400_BAD_REQUEST)
+
+		try:
+			if params.get('uploaded_after'):
+				qs = qs.filter(uploaded_at__gte=_parse_history_datetime(params['uploaded_after']))
+			if params.get('uploaded_before'):
+				qs = qs.filter(uploaded_at__lt=_parse_history_datetime(params['uploaded_before']))
+		except ValueError:
+			return Response({'detail': 'uploaded_after/uploaded_before must be ISO dates or datetimes.'}, status=status.HTTP_400_BAD_REQUEST)
+
+		try:
+			if params.get('min_total'):
+				qs = qs.filter(total_equipment__gte=int(params['min_total']))
+			if params.get('max_total'):
+				qs = qs.filter(total_equipment__lte=int(params['max_total']))
+		except ValueError:
+			return Response({'detail': 'min_total/max_total must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+		if params.get('file_name'):
+			qs = qs.filter(file_name__icontains=params['file_name'])
+
+		if params.get('cursor'):
+			try:
+				value, pk = decode_cursor(params['cursor'], sort=sort)
+			except InvalidCursor:
+				return Response(
+					{'detail': 'Invalid cursor (cursors only continue the sort they were issued for).'},
+					status=status.HTTP_400_BAD_REQUEST,
+				)
+			qs = qs.filter(keyset_filter(sort_field, descending, value, pk))
+
+		prefix = '-' if descending else ''
+		qs = qs.order_by(f"{prefix}{sort_field}", f"{prefix}id")
+
+		# Only load the columns being serialized; summary JSON is skipped unless asked for.
+		serialized = fields or DatasetSerializer.DEFAULT_FIELDS
+		derived = {'summary', *DATASET_KPI_FIELDS} & set(serialized)
+		qs = qs.only(*{'id', sort_field, *serialized, *(['analytics_version'] if derived else [])})
+
+		page = list(qs[:limit + 1])
+		has_next = len(page) > limit
+		page = page[:limit]
+		if derived:
+			upgrade_stale(page, request=request)
+
+		response = Response(DatasetSerializer(page, many=True, fields=fields).data)
+		if has_next:
+			last = page[-1]
+			cursor = encode_cursor(getattr(last, sort_field), last.id, sort=sort)
+			next_params = params.copy()
+			next_params['cursor'] = cursor
+			response['X-Next-Cursor'] = cursor
+			response['Link'] = f'<{request.build_absolute_uri(request.path)}?{next_params.urlencode()}>; rel="next"'
+		return response
+
+
+def _serve_report(request, report):
+	return serve_stored_file(
+		request,
+		report.pdf_file,
+		filename=f"Report {report.report_number}.pdf",
+		content_type='application/pdf',
+	)
+
+
+def _replay_report(view, request, result, dataset_id):
+	# Duplicates of a report request get the report the original produced.
+	report = Report.objects.filter(pk=result.get('report_id'), user=request.user).first()
+	if report is None or not report.pdf_file:
+		return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+	return _serve_report(request, report)
 
 
 class ReportView(APIView):
-	authentication_classes = [TokenAuthentication]
+	"""Download a dataset's PDF report.
+
+	The stored PDF is reused while it matches REPORT_LAYOUT_VERSION (``?refresh=1``
+	forces a re-render) and is streamed from storage with Range support.
+	Duplicates sent with the same ``Idempotency-Key`` get the report the first
+	request produced.
+	"""
+
+	authentication_classes = [TimedTokenAuthentication]
 	permission_classes = [IsAuthenticated]
 
+	@idempotent('report', replay=_replay_report)
 	def get(self, request, dataset_id: int):
 		try:
 			dataset = Dataset.objects.get(id=dataset_id, user=request.user)
 		except Dataset.DoesNotExist:
 			return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+		not_ready = _not_ready(dataset)
+		if not_ready is not None:
+			return not_ready
+
+		# An upgraded summary marks the stored PDF stale, so it is re-rendered below.
+		upgrade_stale([dataset], request=request)
+		refresh = str(request.query_params.get('refresh', '')).lower() in ('1', 'true', 'yes')
+		report = None if refresh else self._cached_report(dataset)
+		record_cache('report', report is not None)
+		if report is None:
+			# Concurrent downloads of the same report share one render.
+			report_id = coalesce(
+				('report', dataset.id),
+				lambda: self._render_and_store(request, dataset),
+				name='report_singleflight',
+			)
+			report = Report.objects.get(pk=report_id)
+
+		response = _serve_report(request, report)
+		response.idempotent_result = {'report_id': report.pk}
+		return response
 
-		# Force regeneration to always get the latest PDF format
-		# (Comment out the caching section below if you want to re-enable caching)
-		# report = Report.objects.filter(dataset=dataset).first()
-		# if report and report.pdf_file:
-		# 	pdf_bytes = report.pdf_file.read()
-		# 	response = HttpResponse(pdf_bytes, content_type='application/pdf')
-		# 	response['Content-Disposition'] = f'attachment; filename="Report {report.report_number}.pdf"'
-		# 	return response
+	@staticmethod
+	def _cached_report(dataset):
+		report = Report.objects.filter(dataset=dataset).first()
+		if report is None or not report.pdf_file or report.layout_version != REPORT_LAYOUT_VERSION:
+			return None
+		if not report.pdf_file.storage.exists(report.pdf_file.name):
+			return None
+		return report
 
+	@staticmethod
+	def _render_and_store(request, dataset):
 		dataset_name = os.path.basename(dataset.file_name)
-		pdf_bytes = generate_pdf_report_bytes(
-			dataset_name=dataset_name,
-			uploaded_at=dataset.uploaded_at.isoformat(),
-			summary=dataset.summary,
-		)
+		with heavy_slot(request):
+			render_started = time.perf_counter()
+			pdf_bytes = generate_pdf_report_bytes(
+				dataset_name=dataset_name,
+				uploaded_at=dataset.uploaded_at.isoformat(),
+				summary=dataset.summary,
+			)
+			REPORT_RENDER.observe(time.perf_counter() - render_started)
 
-		with transaction.atomic():
+		with stage('save'), transaction.atomic():
 			# Check if report already exists
 			report = Report.objects.filter(dataset=dataset).first()
 			if report:
 				# Update existing report with new PDF
 				report.pdf_file.delete(save=False)
+				report.layout_version = REPORT_LAYOUT_VERSION
 				report.pdf_file.save(
 					f"Report {report.report_number}.pdf",
 					ContentFile(pdf_bytes),
@@ -272,13 +1053,17 @@ class ReportView(APIView):
 					.first()
 				)
 				next_number = int(last_number or 0) + 1
-				report = Report.objects.create(user=request.user, dataset=dataset, report_number=next_number, pdf_file=None)
+				report = Report.objects.create(
+					user=request.user,
+					dataset=dataset,
+					report_number=next_number,
+					pdf_file=None,
+					layout_version=REPORT_LAYOUT_VERSION,
+				)
 				report.pdf_file.save(
 					f"Report {next_number}.pdf",
 					ContentFile(pdf_bytes),
 					save=True,
 				)
 
-		response = HttpResponse(pdf_bytes, content_type='application/pdf')
-		response['Content-Disposition'] = f'attachment; filename="Report {report.report_number}.pdf"'
-		return response
+		return report.pk
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,12 +50,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so Server-Timing covers every other middleware too.
+    'api.instrumentation.ServerTimingMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # After AuthenticationMiddleware so session (admin) users are known.
+    'api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,6 +92,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets requests keep reading while a (background) ingest writes.
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            'timeout': 20,
+        },
     }
 }
 
@@ -131,16 +143,145 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.TimedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON (api/renderers.py); falls back to DRF's when orjson is missing.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 
 # Hackathon-friendly CORS defaults (tighten for production)
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = [
+    'Server-Timing', 'X-Next-Cursor', 'Link', 'Retry-After',
+    'Content-Disposition', 'Content-Range', 'Accept-Ranges', 'ETag',
+    'Idempotent-Replayed',
+]
+
+
+# Datasets kept per user; older ones are deleted on upload. None keeps everything
+# (older datasets are archived instead, see DATASET_HOT_COUNT).
+DATASET_RETENTION_COUNT = None
+
+# Admission control for uploads, reports and limited summaries
+# (api/admission.py), per worker process. Requests past the per-user cap or the
+# queue get 429 + Retry-After. ADMISSION_MAX_CONCURRENT = None disables it.
+ADMISSION_MAX_CONCURRENT = 4
+ADMISSION_MAX_PER_USER = 2
+ADMISSION_QUEUE_DEPTH = 8
+ADMISSION_QUEUE_TIMEOUT = 30.0
+
+# Stored CSV / report downloads (api/files.py). None streams from Django;
+# 'x-sendfile' or 'x-accel-redirect' hands the file to the front proxy. For
+# nginx, FILE_DOWNLOAD_ACCEL_PREFIX must be an `internal` location aliased to
+# MEDIA_ROOT.
+FILE_DOWNLOAD_OFFLOAD = None
+FILE_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Idempotency-Key handling for uploads and reports (api/idempotency.py):
+# outcomes are replayed for IDEMPOTENCY_KEY_TTL seconds; duplicates of a
+# request still running wait up to IDEMPOTENCY_WAIT_TIMEOUT seconds, and a
+# request unfinished after IDEMPOTENCY_CLAIM_LEASE seconds is presumed dead.
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+IDEMPOTENCY_WAIT_TIMEOUT = 30.0
+IDEMPOTENCY_CLAIM_LEASE = 4 * IDEMPOTENCY_WAIT_TIMEOUT
+
+# Batch uploads (several files or a ZIP of CSVs, api/ingest.py).
+UPLOAD_BATCH_WORKERS = 4
+UPLOAD_BATCH_MAX_FILES = 100
+UPLOAD_BATCH_MAX_MEMBER_BYTES = 200 * 1024 * 1024
+
+# bulk_import / recompute_summaries (api/backfill.py). None = one worker
+# process per core. Checkpoints of interrupted runs are kept in
+# BACKFILL_CHECKPOINT_DIR.
+BACKFILL_WORKERS = None
+BACKFILL_CHECKPOINT_DIR = BASE_DIR / 'checkpoints'
+
+# Asynchronous uploads (?async=1, api/ingest.py): rows sampled for the
+# immediate approximate summary, and background ingest threads per process.
+APPROX_SAMPLE_ROWS = 20_000
+ASYNC_INGEST_WORKERS = 2
+# `manage.py recover_ingests` resumes async ingests still 'processing' this
+# many seconds after upload (their worker died or the server restarted).
+ASYNC_INGEST_RECOVER_AFTER = 15 * 60
+
+# Ingest anomaly stage (api/anomalies.py): a row is flagged when a metric's
+# robust z-score exceeds ANOMALY_Z_THRESHOLD or it lies beyond
+# ANOMALY_IQR_K * IQR outside its type's quartiles (3.0 = Tukey's "far out").
+ANOMALY_Z_THRESHOLD = 3.5
+ANOMALY_IQR_K = 3.0
+
+# /api/downsample/ (api/downsample.py): datasets whose metric columns and
+# type codes (about 25 bytes a row; names are not kept) stay in memory, at
+# most DOWNSAMPLE_ROWS_CACHE_BYTES in all, and downsampled results kept, per
+# process. They also back density tiles and finely zoomed histograms.
+DOWNSAMPLE_ROWS_CACHE_SIZE = 2
+DOWNSAMPLE_ROWS_CACHE_BYTES = 128 * 1024 * 1024
+DOWNSAMPLE_CACHE_SIZE = 64
+# /api/tiles/ (api/tiles.py): row indexes (dataset, x metric) and encoded
+# tiles kept per process; the tile cache is also capped at TILE_CACHE_BYTES
+# of encoded tiles (a 1024-cell bin tile is 4 MiB). TILE_PEAK_CACHE_SIZE
+# zoom levels keep their shared colour scale.
+TILE_INDEX_CACHE_SIZE = 2
+TILE_CACHE_SIZE = 256
+TILE_CACHE_BYTES = 64 * 1024 * 1024
+TILE_PEAK_CACHE_SIZE = 64
+
+# Rows per chunk streamed by /api/export/ (bounds memory per export).
+EXPORT_CHUNK_ROWS = 50_000
+
+# Single-flight coalescing of identical report / limited-summary requests
+# (api/singleflight.py). 'thread' coalesces within a worker process; 'file'
+# also coalesces across processes through lock files in SINGLEFLIGHT_LOCK_DIR
+# (None = a per-user directory in the system temp dir; POSIX only), which
+# must be owned by the server's user with mode 0700. Followers wait at most
+# SINGLEFLIGHT_WAIT_TIMEOUT seconds for a leader before computing themselves.
+SINGLEFLIGHT_BACKEND = 'thread'
+SINGLEFLIGHT_LOCK_DIR = None
+SINGLEFLIGHT_WAIT_TIMEOUT = 60.0
+
+# Cold-storage tier (api/archive.py). Datasets beyond the newest
+# DATASET_HOT_COUNT per user, or older than DATASET_ARCHIVE_AFTER_DAYS, have
+# their rows moved to MEDIA_ROOT/archives. None disables that policy.
+DATASET_HOT_COUNT = 5
+DATASET_ARCHIVE_AFTER_DAYS = None
+# Archived datasets kept decoded in memory per process.
+ARCHIVE_CACHE_SIZE = 4
+
+# Summaries computed with an older utils.ANALYTICS_VERSION (api/summaries.py):
+# 'off' serves them as stored, 'sync' recomputes them in the reading request
+# (in a heavy admission slot, at most SUMMARY_UPGRADE_SYNC_LIMIT per request),
+# 'background' serves the stored one and recomputes on
+# SUMMARY_UPGRADE_WORKERS background threads.
+SUMMARY_UPGRADE = 'sync'
+SUMMARY_UPGRADE_SYNC_LIMIT = 5
+SUMMARY_UPGRADE_WORKERS = 1
+
+# Default page size of /api/history/ (clients can pass ?limit= up to 100).
+HISTORY_PAGE_SIZE = 5
+
+
+# Staff-only request profiling (X-Profile: 1 or ?profile=1); see api/profiling.py.
+PROFILES_DIR = BASE_DIR / 'profiles'
+PROFILING_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+PROFILING_TRACEMALLOC_FRAMES = 10
+
+
+# Prometheus scrape endpoint (/metrics) is restricted to these client IPs;
+# set to None to allow any address (e.g. behind an authenticating proxy).
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
 
 
 LOGGING = {
@@ -153,6 +294,14 @@ LOGGING = {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        # One JSON line per request with stage and SQL timings.
+        'api.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 # Default primary key field type
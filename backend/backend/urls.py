@@ -19,9 +19,16 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.admin import profile_file_view, profiles_view
+from api.metrics import metrics_view
+
 urlpatterns = [
+    # Must precede admin.site.urls, whose catch-all would shadow them.
+    path('admin/profiles/', admin.site.admin_view(profiles_view), name='admin-profiles'),
+    path('admin/profiles/<str:profile_id>.<str:kind>', admin.site.admin_view(profile_file_view), name='admin-profile-file'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
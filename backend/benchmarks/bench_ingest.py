@@ -0,0 +1,46 @@
+"""Ingest benchmarks: CSV parsing/analytics and full upload persistence."""
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from api.utils import parse_and_analyze_csv
+from conftest import run
+
+pytestmark = pytest.mark.django_db
+
+
+def bench_parse_and_analyze_csv(benchmark, rows, csv_path):
+    path = csv_path(rows)
+
+    def parse():
+        with open(path, 'rb') as fh:
+            return parse_and_analyze_csv(fh, return_df=True)
+
+    summary, _ = run(benchmark, parse, rows)
+    assert summary['total_equipment'] == rows
+
+
+@pytest.mark.parametrize('type_cardinality', [4, 1000])
+def bench_parse_type_cardinality(benchmark, type_cardinality, csv_path):
+    rows = 100_000
+    path = csv_path(rows, type_cardinality=type_cardinality)
+    benchmark.extra_info['type_cardinality'] = type_cardinality
+
+    def parse():
+        with open(path, 'rb') as fh:
+            return parse_and_analyze_csv(fh)
+
+    run(benchmark, parse, rows)
+
+
+def bench_upload_persistence(benchmark, rows, csv_path, upload_client):
+    path = csv_path(rows)
+
+    def upload():
+        with open(path, 'rb') as fh:
+            upload = SimpleUploadedFile(path.name, fh.read(), content_type='text/csv')
+        response = upload_client.post('/api/upload/', {'file': upload}, format='multipart')
+        assert response.status_code == 201, response.content[:200]
+        return response
+
+    run(benchmark, upload, rows)
@@ -0,0 +1,42 @@
+"""JSON rendering benchmarks: DRF's stdlib renderer vs the orjson renderer.
+
+Payloads are exactly what csv-data and history hand to the renderer, so the
+numbers isolate serialization from query and view time.
+"""
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from api.models import EquipmentRecord
+from api.renderers import ORJSONRenderer
+from api.serializers import DatasetSerializer
+from conftest import run
+
+pytestmark = pytest.mark.django_db
+
+RENDERERS = {'drf': JSONRenderer, 'orjson': ORJSONRenderer}
+
+
+@pytest.mark.parametrize('renderer', list(RENDERERS))
+def bench_render_csv_data(benchmark, rows, renderer, dataset):
+    records = list(
+        EquipmentRecord.objects.filter(dataset=dataset)
+        .order_by('id')
+        .values('equipment_name', 'type', 'flowrate', 'pressure', 'temperature')
+    )
+    payload = {'dataset_id': dataset.id, 'total_count': len(records), 'data': records}
+    benchmark.extra_info['renderer'] = renderer
+
+    body = run(benchmark, RENDERERS[renderer]().render, rows, payload)
+    assert body.startswith(b'{"dataset_id"')
+
+
+@pytest.mark.parametrize('renderer', list(RENDERERS))
+def bench_render_history(benchmark, rows, renderer, dataset):
+    # A full history page (100 datasets) sharing the seeded dataset's summary.
+    page = [dataset] * 100
+    payload = DatasetSerializer(page, many=True).data
+    benchmark.extra_info['renderer'] = renderer
+
+    body = run(benchmark, RENDERERS[renderer]().render, rows, payload)
+    assert body.startswith(b'[{')
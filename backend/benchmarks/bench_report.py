@@ -0,0 +1,26 @@
+"""PDF report benchmarks (matplotlib charts + ReportLab build)."""
+
+import pytest
+
+from api.utils import generate_pdf_report_bytes, parse_and_analyze_csv
+from conftest import run
+
+
+@pytest.mark.parametrize('type_cardinality', [8, 64])
+def bench_generate_pdf_report_bytes(benchmark, type_cardinality, csv_path):
+    # Report cost depends on the summary (type count), not on the row count.
+    rows = 10_000
+    with open(csv_path(rows, type_cardinality=type_cardinality), 'rb') as fh:
+        summary = parse_and_analyze_csv(fh)
+    benchmark.extra_info['type_cardinality'] = type_cardinality
+
+    pdf = run(
+        benchmark,
+        generate_pdf_report_bytes,
+        rows,
+        rounds=3,
+        dataset_name='fleet.csv',
+        uploaded_at='2026-01-01T00:00:00Z',
+        summary=summary,
+    )
+    assert pdf.startswith(b'%PDF')
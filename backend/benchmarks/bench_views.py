@@ -0,0 +1,32 @@
+"""Read-path benchmarks for the dashboard and history endpoints."""
+
+import pytest
+
+from conftest import run
+
+pytestmark = pytest.mark.django_db
+
+
+def bench_summary_view(benchmark, rows, dataset, api_client):
+    response = run(benchmark, api_client.get, rows, f"/api/summary/{dataset.id}/")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('limit', [10, 100])
+def bench_summary_view_limit(benchmark, rows, limit, dataset, api_client):
+    benchmark.extra_info['limit'] = limit
+    response = run(benchmark, api_client.get, rows, f"/api/summary/{dataset.id}/?limit={limit}")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('limit', [None, 100])
+def bench_csv_data_view(benchmark, rows, limit, dataset, api_client):
+    benchmark.extra_info['limit'] = limit
+    url = f"/api/csv-data/{dataset.id}/" + (f"?limit={limit}" if limit else '')
+    response = run(benchmark, api_client.get, rows, url)
+    assert response.status_code == 200
+
+
+def bench_history_view(benchmark, rows, dataset, api_client):
+    response = run(benchmark, api_client.get, rows, '/api/history/')
+    assert response.status_code == 200
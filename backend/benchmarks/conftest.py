@@ -0,0 +1,126 @@
+"""Shared fixtures for the ChemViz benchmark suite.
+
+Sizes come from ``CHEMVIZ_BENCH_SIZES`` (comma separated, ``1e6`` notation
+allowed). The default stops at 1e5 so a run finishes in minutes; the full
+sweep is ``CHEMVIZ_BENCH_SIZES=1e3,1e4,1e5,1e6,1e7``.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from synthetic import fleet_csv_path
+
+DEFAULT_SIZES = '1e3,1e4,1e5'
+
+DATA_DIR = Path(__file__).resolve().parent / '.benchmarks' / 'data'
+
+
+def bench_sizes():
+    raw = os.getenv('CHEMVIZ_BENCH_SIZES') or DEFAULT_SIZES
+    return [int(float(v)) for v in raw.split(',') if v.strip()]
+
+
+def rounds_for(rows: int) -> int:
+    """Fewer rounds for big inputs so the 1e7 sweep stays bounded."""
+    if rows <= 10_000:
+        return 10
+    if rows <= 100_000:
+        return 5
+    return 1
+
+
+def run(benchmark, fn, rows: int, *args, rounds: int = None, **kwargs):
+    benchmark.extra_info['rows'] = rows
+    rounds = rounds or rounds_for(rows)
+    return benchmark.pedantic(fn, args=args, kwargs=kwargs, rounds=rounds, iterations=1, warmup_rounds=0)
+
+
+def pytest_generate_tests(metafunc):
+    if 'rows' in metafunc.fixturenames:
+        metafunc.parametrize('rows', bench_sizes(), ids=lambda n: f"{n:.0e}".replace('+0', ''), scope='session')
+
+
+@pytest.fixture(scope='session')
+def csv_path():
+    def _path(rows: int, **kwargs) -> Path:
+        return fleet_csv_path(DATA_DIR, rows, **kwargs)
+    return _path
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _media_root(tmp_path_factory):
+    from django.conf import settings
+
+    settings.MEDIA_ROOT = tmp_path_factory.mktemp('media')
+    # The test client talks to 'testserver'.
+    settings.ALLOWED_HOSTS = ['*']
+
+
+def _user_and_client(django_db_blocker, username: str):
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+
+    with django_db_blocker.unblock():
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username=username, defaults={'email': f"{username}@example.com"})
+        token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return user, client
+
+
+@pytest.fixture(scope='session')
+def bench_user(django_db_setup, django_db_blocker):
+    return _user_and_client(django_db_blocker, 'bench')[0]
+
+
+@pytest.fixture(scope='session')
+def api_client(bench_user, django_db_blocker):
+    return _user_and_client(django_db_blocker, 'bench')[1]
+
+
+@pytest.fixture(scope='session')
+def upload_client(django_db_setup, django_db_blocker):
+    """Client for a separate user, so upload retention never prunes seeded datasets."""
+    return _user_and_client(django_db_blocker, 'bench-upload')[1]
+
+
+@pytest.fixture(scope='session')
+def dataset(rows, bench_user, django_db_blocker, csv_path):
+    """A Dataset with ``rows`` records, seeded once per size.
+
+    Session scope makes pytest build it before the per-test transaction
+    opens, so the rows survive the rollback after each benchmark. Rows are
+    loaded straight from the synthetic CSV so read-path benchmarks do not
+    depend on the speed of the upload view.
+    """
+
+    from api.models import Dataset, EquipmentRecord
+    from api.utils import parse_and_analyze_csv
+
+    with django_db_blocker.unblock():
+        with open(csv_path(rows), 'rb') as fh:
+            summary, df = parse_and_analyze_csv(fh, return_df=True)
+        seeded = Dataset.objects.create(user=bench_user, file_name=f"fleet_{rows}.csv", summary=summary)
+        for start in range(0, len(df), 100_000):
+            chunk = df.iloc[start:start + 100_000]
+            EquipmentRecord.objects.bulk_create(
+                [
+                    EquipmentRecord(
+                        dataset_id=seeded.id,
+                        equipment_name=name,
+                        type=type_,
+                        flowrate=flow,
+                        pressure=press,
+                        temperature=temp,
+                    )
+                    for name, type_, flow, press, temp in chunk.itertuples(index=False, name=None)
+                ],
+                batch_size=10_000,
+            )
+    return seeded
@@ -0,0 +1,215 @@
+"""Load generator replaying desktop/web client sessions against a live backend.
+
+Run the backend first (``manage.py runserver``, gunicorn or uvicorn), then::
+
+    python benchmarks/loadtest.py --base-url http://127.0.0.1:8000/api \\
+        --username bench --password secret --concurrency 16 --duration 60
+
+Each virtual user loops over a session that mirrors the clients:
+
+1. login (once per virtual user),
+2. upload a synthetic CSV (``--upload-ratio`` of sessions),
+3. open the dashboard: summary + csv-data, then step through the row-limit
+   choices exactly like ``DashboardWidget._on_limit_changed`` (every change
+   fetches both summary and csv-data with the new limit),
+4. refresh history on every tab switch,
+5. download the PDF report (``--report-ratio`` of sessions).
+
+At the end it prints throughput, p50/p95/p99 latency and error rate per
+endpoint, and can write the same numbers as JSON (``--json``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from synthetic import fleet_csv_bytes  # noqa: E402
+
+# Row-limit choices offered by the desktop/web dashboard ("All" is None).
+DASHBOARD_LIMITS = [None, 10, 25, 50, 100]
+
+# Tabs in the desktop main window; history is refreshed whenever it is shown.
+TAB_SWITCHES_PER_SESSION = 3
+
+
+class Stats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            n = len(values)
+            out[endpoint] = {
+                'requests': n,
+                'throughput_rps': n / elapsed if elapsed else 0.0,
+                'p50_ms': _percentile(values, 50) * 1000.0,
+                'p95_ms': _percentile(values, 95) * 1000.0,
+                'p99_ms': _percentile(values, 99) * 1000.0,
+                'error_rate': self.errors[endpoint] / n if n else 0.0,
+            }
+        return out
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class VirtualUser:
+    def __init__(self, args, stats: Stats, payload: bytes, rng: random.Random):
+        self.args = args
+        self.stats = stats
+        self.payload = payload
+        self.rng = rng
+        self.session = requests.Session()
+        self.dataset_ids: List[int] = []
+
+    def _call(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[requests.Response]:
+        url = f"{self.args.base_url.rstrip('/')}/{path.lstrip('/')}"
+        start = time.perf_counter()
+        ok = False
+        resp = None
+        try:
+            resp = self.session.request(method, url, timeout=self.args.timeout, **kwargs)
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            ok = False
+        self.stats.record(endpoint, time.perf_counter() - start, ok)
+        return resp if ok else None
+
+    def login(self) -> bool:
+        resp = self._call('login', 'POST', 'login/', json={'username': self.args.username, 'password': self.args.password})
+        if resp is None:
+            return False
+        self.session.headers['Authorization'] = f"Token {resp.json()['token']}"
+        return True
+
+    def refresh_history(self) -> None:
+        resp = self._call('history', 'GET', 'history/')
+        if resp is not None:
+            self.dataset_ids = [int(d['id']) for d in resp.json() if 'id' in d] or self.dataset_ids
+
+    def upload(self) -> None:
+        files = {'file': ('loadtest.csv', self.payload, 'text/csv')}
+        resp = self._call('upload', 'POST', 'upload/', files=files)
+        if resp is not None:
+            self.dataset_ids.insert(0, int(resp.json()['dataset_id']))
+
+    def dashboard(self, dataset_id: int) -> None:
+        self._call('summary', 'GET', f"summary/{dataset_id}/")
+        self._call('csv-data', 'GET', f"csv-data/{dataset_id}/")
+        limits = self.rng.sample(DASHBOARD_LIMITS, k=self.rng.randint(1, len(DASHBOARD_LIMITS)))
+        current = None
+        for limit in limits:
+            # The dashboard only refetches when the selection actually changes.
+            if limit == current:
+                continue
+            current = limit
+            query = f"?limit={limit}" if limit else ''
+            self._call('summary?limit' if limit else 'summary', 'GET', f"summary/{dataset_id}/{query}")
+            self._call('csv-data?limit' if limit else 'csv-data', 'GET', f"csv-data/{dataset_id}/{query}")
+
+    def report(self, dataset_id: int) -> None:
+        self._call('report', 'GET', f"report/{dataset_id}/")
+
+    def session_once(self) -> None:
+        self.refresh_history()
+        if not self.dataset_ids or self.rng.random() < self.args.upload_ratio:
+            self.upload()
+        if not self.dataset_ids:
+            return
+        dataset_id = self.rng.choice(self.dataset_ids)
+        self.dashboard(dataset_id)
+        for _ in range(TAB_SWITCHES_PER_SESSION):
+            self.refresh_history()
+        if self.rng.random() < self.args.report_ratio:
+            self.report(dataset_id)
+
+    def run(self, deadline: float) -> None:
+        if not self.login():
+            return
+        while time.monotonic() < deadline:
+            self.session_once()
+            if self.args.think_time:
+                time.sleep(self.rng.uniform(0, self.args.think_time))
+
+
+def _print_report(results: Dict[str, Dict[str, float]], elapsed: float, concurrency: int) -> None:
+    print(f"\nDuration {elapsed:.1f}s, concurrency {concurrency}")
+    header = f"{'endpoint':<16}{'reqs':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+    print(header)
+    print('-' * len(header))
+    for endpoint, r in results.items():
+        print(
+            f"{endpoint:<16}{r['requests']:>8}{r['throughput_rps']:>9.2f}{r['p50_ms']:>10.1f}"
+            f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['error_rate']:>8.1%}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Replay ChemViz client sessions against a running backend.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000/api')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--rows', type=int, default=1000, help='Rows in the uploaded synthetic CSV')
+    parser.add_argument('--upload-ratio', type=float, default=0.2, help='Fraction of sessions that upload')
+    parser.add_argument('--report-ratio', type=float, default=0.1, help='Fraction of sessions that download a report')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between sessions (s)')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', help='Also write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    payload = fleet_csv_bytes(args.rows, seed=args.seed)
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+
+    users = [VirtualUser(args, stats, payload, random.Random(args.seed + i)) for i in range(args.concurrency)]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for future in [pool.submit(u.run, deadline) for u in users]:
+            future.result()
+    elapsed = time.monotonic() - started
+
+    results = stats.report(elapsed)
+    _print_report(results, elapsed, args.concurrency)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({
+            'duration_s': elapsed,
+            'concurrency': args.concurrency,
+            'rows': args.rows,
+            'endpoints': results,
+        }, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
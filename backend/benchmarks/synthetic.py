@@ -0,0 +1,130 @@
+"""Deterministic synthetic fleet data for benchmarks and load tests.
+
+The same (rows, type_cardinality, name_length, seed) always produces the
+same bytes, so timings from different commits measure the code and not the
+input.
+"""
+
+from __future__ import annotations
+
+import io
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+
+# Rows are generated and written in chunks so 1e7-row files never need the
+# whole frame in memory.
+_CHUNK_ROWS = 500_000
+
+_BASE_TYPES = ['Pump', 'Valve', 'Reactor', 'Compressor', 'HeatExchanger', 'Condenser', 'Mixer', 'Separator']
+
+
+def type_names(type_cardinality: int) -> list:
+    """Return ``type_cardinality`` distinct, stable type labels."""
+    return [
+        _BASE_TYPES[i] if i < len(_BASE_TYPES) else f"{_BASE_TYPES[i % len(_BASE_TYPES)]}{i // len(_BASE_TYPES)}"
+        for i in range(type_cardinality)
+    ]
+
+
+def _chunk_frame(rng: np.random.Generator, start: int, rows: int, types: list, name_length: int) -> pd.DataFrame:
+    type_idx = rng.integers(0, len(types), size=rows)
+    # Per-type offsets give each type its own operating range, like real fleets.
+    offsets = type_idx.astype(float)
+    labels = np.asarray(types, dtype=object)[type_idx]
+
+    ids = np.arange(start, start + rows).astype(str).astype(object)
+    names = labels + '-' + ids
+    if name_length:
+        names = pd.Series(names).str.pad(name_length, side='right', fillchar='x').str.slice(0, name_length)
+
+    return pd.DataFrame({
+        'Equipment Name': names,
+        'Type': labels,
+        'Flowrate': np.round(rng.normal(100.0 + 20.0 * offsets, 15.0), 2),
+        'Pressure': np.round(rng.normal(5.0 + 1.5 * offsets, 0.8), 2),
+        'Temperature': np.round(rng.normal(90.0 + 12.0 * offsets, 9.0), 2),
+    })
+
+
+def write_fleet_csv(
+    target: Union[str, Path, io.TextIOBase],
+    rows: int,
+    *,
+    type_cardinality: int = 8,
+    name_length: int = 16,
+    seed: int = 0,
+) -> None:
+    """Write a synthetic fleet CSV with the required ChemViz columns.
+
+    ``name_length`` pads/truncates equipment names to a fixed width (0 keeps
+    the natural ``<Type>-<n>`` names).
+    """
+
+    if rows < 0:
+        raise ValueError('rows must be >= 0')
+    if type_cardinality < 1:
+        raise ValueError('type_cardinality must be >= 1')
+
+    rng = np.random.default_rng(seed)
+    types = type_names(type_cardinality)
+
+    close = False
+    if isinstance(target, (str, Path)):
+        stream = open(target, 'w', newline='', encoding='utf-8')
+        close = True
+    else:
+        stream = target
+
+    try:
+        stream.write(HEADER)
+        written = 0
+        while written < rows:
+            n = min(_CHUNK_ROWS, rows - written)
+            _chunk_frame(rng, written + 1, n, types, name_length).to_csv(stream, header=False, index=False)
+            written += n
+    finally:
+        if close:
+            stream.close()
+
+
+def fleet_csv_bytes(rows: int, **kwargs) -> bytes:
+    """Return a synthetic fleet CSV as bytes (for small/medium sizes)."""
+    buffer = io.StringIO()
+    write_fleet_csv(buffer, rows, **kwargs)
+    return buffer.getvalue().encode('utf-8')
+
+
+def fleet_csv_path(directory: Union[str, Path], rows: int, **kwargs) -> Path:
+    """Write (or reuse) a cached synthetic CSV under ``directory``."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    key = '_'.join(f"{k}{v}" for k, v in sorted(kwargs.items()))
+    path = directory / f"fleet_{rows}{'_' + key if key else ''}.csv"
+    if not path.exists():
+        tmp = path.with_suffix('.tmp')
+        write_fleet_csv(tmp, rows, **kwargs)
+        tmp.replace(path)
+    return path
+
+
+def main(argv: Optional[list] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic ChemViz fleet CSV.')
+    parser.add_argument('output', help='Output CSV path')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--types', type=int, default=8, help='Number of distinct equipment types')
+    parser.add_argument('--name-length', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_fleet_csv(args.output, args.rows, type_cardinality=args.types, name_length=args.name_length, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
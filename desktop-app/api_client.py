@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import os
+import random
+import time
+import uuid
 from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import requests
 
 
@@ -20,24 +25,105 @@ class ApiError(Exception):
         return base
 
 
+def parse_server_timing(header: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Parse a ``Server-Timing`` header into {name: {"dur": ms, "desc": str}}."""
+    timings: Dict[str, Dict[str, Any]] = {}
+    if not header:
+        return timings
+    for entry in header.split(","):
+        parts = [p.strip() for p in entry.split(";") if p.strip()]
+        if not parts:
+            continue
+        metric: Dict[str, Any] = {}
+        for param in parts[1:]:
+            key, _, value = param.partition("=")
+            value = value.strip().strip('"')
+            if key == "dur":
+                try:
+                    metric["dur"] = float(value)
+                except ValueError:
+                    continue
+            elif key == "desc":
+                metric["desc"] = value
+        timings[parts[0]] = metric
+    return timings
+
+
+# Statuses the backend uses for "busy, try again later".
+RETRY_STATUSES = (429, 503)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def parse_retry_after(header: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds from a ``Retry-After`` header (seconds or HTTP date)."""
+    if not header:
+        return None
+    header = header.strip()
+    try:
+        return max(0.0, float(header))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def new_idempotency_key() -> str:
+    return uuid.uuid4().hex
+
+
+def _rewind_files(files: Any) -> None:
+    if not files:
+        return
+    values = files.values() if isinstance(files, dict) else [v for _, v in files]
+    for value in values:
+        fh = value[1] if isinstance(value, (tuple, list)) else value
+        if hasattr(fh, "seek"):
+            fh.seek(0)
+
+
 class ApiClient:
     """Small REST client for the existing Django backend.
 
     Backend routes (relative to base_url):
       - POST login/   -> {token}
       - POST upload/  -> {dataset_id, summary}
+                         (several files or a .zip -> {results, succeeded, failed})
       - GET  history/ -> [{id,file_name,uploaded_at,summary}]
-      - GET  summary/<id>/ -> {dataset_id, summary}
+      - GET  summary/<id>/ -> {dataset_id, state, summary}
       - GET  report/<id>/  -> PDF bytes
+      - GET  csv-file/<id>/ -> original CSV (supports Range)
 
     Token is stored in memory only.
+
+    After every call ``last_server_timing`` holds the backend's per-stage
+    timings for that request (parsed ``Server-Timing`` header), e.g.
+    ``{"auth": {"dur": 0.4}, "db": {"dur": 2.1, "desc": "3 queries"}}``.
+
+    When the backend is busy (429/503) calls are retried up to ``max_retries``
+    times, waiting for ``Retry-After`` when given and otherwise for an
+    exponential backoff with jitter, never longer than ``max_backoff_s``.
+    Uploads and report downloads carry an ``Idempotency-Key`` shared by all
+    their attempts, so they (like GETs) are also retried after timeouts and
+    connection errors without creating duplicates on the server.
     """
 
-    def __init__(self, base_url: Optional[str] = None, timeout_s: int = 30):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout_s: int = 30,
+        max_retries: int = 3,
+        max_backoff_s: float = 30.0,
+    ):
         self.base_url = (base_url or os.getenv("CHEMVIZ_API_BASE") or "http://127.0.0.1:8000/api").rstrip("/")
         self.timeout_s = int(timeout_s)
+        self.max_retries = int(max_retries)
+        self.max_backoff_s = float(max_backoff_s)
         self.session = requests.Session()
         self._token: Optional[str] = None
+        self.last_server_timing: Dict[str, Dict[str, Any]] = {}
 
     @property
     def token(self) -> Optional[str]:
@@ -46,16 +132,46 @@ class ApiClient:
     def set_token(self, token: Optional[str]) -> None:
         self._token = token
 
-    def _headers(self) -> Dict[str, str]:
+    def _headers(self, idempotency_key: Optional[str] = None) -> Dict[str, str]:
         headers: Dict[str, str] = {}
         if self._token:
             headers["Authorization"] = f"Token {self._token}"
+        if idempotency_key:
+            headers[IDEMPOTENCY_HEADER] = idempotency_key
         return headers
 
     def _url(self, path: str) -> str:
         path = path.lstrip("/")
         return f"{self.base_url}/{path}"
 
+    def _backoff_delay(self, resp: Optional[requests.Response], attempt: int) -> float:
+        delay = parse_retry_after(resp.headers.get("Retry-After")) if resp is not None else None
+        if delay is None:
+            delay = 0.5 * (2 ** attempt) * (1.0 + random.random())
+        return min(delay, self.max_backoff_s)
+
+    def _send(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout_s)
+        idempotent = method in ("GET", "HEAD") or IDEMPOTENCY_HEADER in (kwargs.get("headers") or {})
+        retry_statuses = RETRY_STATUSES + ((409,) if idempotent else ())
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.request(method, self._url(path), **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff_delay(None, attempt))
+                attempt += 1
+                _rewind_files(kwargs.get("files"))
+                continue
+            self.last_server_timing = parse_server_timing(resp.headers.get("Server-Timing"))
+            if resp.status_code not in retry_statuses or attempt >= self.max_retries:
+                return resp
+            time.sleep(self._backoff_delay(resp, attempt))
+            attempt += 1
+            _rewind_files(kwargs.get("files"))
+
     def _raise_for_json_error(self, resp: requests.Response) -> None:
         status_code = resp.status_code
         try:
@@ -81,10 +197,10 @@ class ApiClient:
         else:
             payload["username"] = value
 
-        resp = self.session.post(
-            self._url("login/"),
+        resp = self._send(
+            "POST",
+            "login/",
             json=payload,
-            timeout=self.timeout_s,
             headers={"Content-Type": "application/json"},
         )
         if resp.status_code >= 400:
@@ -109,10 +225,10 @@ class ApiClient:
             "confirm_password": confirm_password,
         }
 
-        resp = self.session.post(
-            self._url("signup/"),
+        resp = self._send(
+            "POST",
+            "signup/",
             json=payload,
-            timeout=self.timeout_s,
             headers={"Content-Type": "application/json"},
         )
         if resp.status_code >= 400:
@@ -128,17 +244,29 @@ class ApiClient:
     def logout(self) -> None:
         self._token = None
 
-    def upload_csv(self, file_path: str) -> Tuple[int, Dict[str, Any]]:
+    def upload_csv(
+        self,
+        file_path: str,
+        idempotency_key: Optional[str] = None,
+        async_: bool = False,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Upload one CSV. A fresh ``idempotency_key`` is generated unless
+        one is given (pass the same key to retry a call safely).
+
+        With ``async_`` the backend answers as soon as the file is received,
+        with an approximate summary (``summary["approximate"]``); poll
+        ``get_summary_status`` until the dataset is ready.
+        """
         if not self._token:
             raise ApiError("Not authenticated.")
 
         with open(file_path, "rb") as f:
             files = {"file": (os.path.basename(file_path), f, "text/csv")}
-            resp = self.session.post(
-                self._url("upload/"),
+            resp = self._send(
+                "POST",
+                "upload/?async=1" if async_ else "upload/",
                 files=files,
-                timeout=self.timeout_s,
-                headers=self._headers(),
+                headers=self._headers(idempotency_key or new_idempotency_key()),
             )
 
         if resp.status_code >= 400:
@@ -149,11 +277,45 @@ class ApiClient:
         summary = data.get("summary") or {}
         return dataset_id, summary
 
-    def get_history(self) -> List[Dict[str, Any]]:
+    def upload_batch(self, file_paths: List[str], idempotency_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Upload several CSVs and/or ZIPs of CSVs in one request.
+
+        Returns one result per CSV, in completion order: ``{file, dataset_id,
+        summary}`` on success or ``{file, error}`` on failure.
+        """
+        if not self._token:
+            raise ApiError("Not authenticated.")
+
+        handles = [open(path, "rb") for path in file_paths]
+        try:
+            files = [
+                ("file", (os.path.basename(path), fh, "application/zip" if path.lower().endswith(".zip") else "text/csv"))
+                for path, fh in zip(file_paths, handles)
+            ]
+            resp = self._send("POST", "upload/", files=files, headers=self._headers(idempotency_key or new_idempotency_key()))
+        finally:
+            for fh in handles:
+                fh.close()
+
+        try:
+            data = resp.json()
+        except Exception:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            return data["results"]
+        if resp.status_code >= 400:
+            self._raise_for_json_error(resp)
+        # A single plain CSV gets the single-upload response.
+        return [{"file": os.path.basename(file_paths[0]), **(data or {})}]
+
+    def get_history(self, **params: Any) -> List[Dict[str, Any]]:
+        """List datasets. ``params`` are passed through as history query
+        parameters (limit, cursor, sort, fields, file_name, min_total, ...)."""
         if not self._token:
             raise ApiError("Not authenticated.")
 
-        resp = self.session.get(self._url("history/"), timeout=self.timeout_s, headers=self._headers())
+        query = {k: v for k, v in params.items() if v is not None}
+        resp = self._send("GET", "history/", params=query or None, headers=self._headers())
         if resp.status_code >= 400:
             self._raise_for_json_error(resp)
         data = resp.json()
@@ -169,23 +331,113 @@ class ApiClient:
         if limit is not None:
             url += f"?limit={int(limit)}"
             
-        resp = self.session.get(self._url(url), timeout=self.timeout_s, headers=self._headers())
+        resp = self._send("GET", url, headers=self._headers())
         if resp.status_code >= 400:
             self._raise_for_json_error(resp)
         data = resp.json()
         summary = data.get("summary") or {}
         return summary
 
-    def get_csv_data(self, dataset_id: int, limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
-        """Get CSV data with optional limit. Returns (data_rows, total_count)."""
+    def get_summary_status(self, dataset_id: int) -> Dict[str, Any]:
+        """Return ``{dataset_id, state, summary[, error]}``; ``state`` is
+        ``processing`` while an asynchronous upload is still being ingested."""
+        if not self._token:
+            raise ApiError("Not authenticated.")
+
+        resp = self._send("GET", f"summary/{int(dataset_id)}/", headers=self._headers())
+        if resp.status_code >= 400:
+            self._raise_for_json_error(resp)
+        return resp.json()
+
+    def get_histograms(
+        self,
+        dataset_id: int,
+        metrics: Optional[List[str]] = None,
+        bins: int = 30,
+        mode: str = "fixed",
+        types: Optional[List[str]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Return ``{metric: {edges, counts, total, types}}`` re-binned on the
+        server from precomputed bins, without downloading any rows."""
+        if not self._token:
+            raise ApiError("Not authenticated.")
+
+        params: Dict[str, Any] = {"bins": int(bins), "mode": mode}
+        if metrics:
+            params["metric"] = ",".join(metrics)
+        if types:
+            params["type"] = ",".join(types)
+        resp = self._send("GET", f"histogram/{int(dataset_id)}/", params=params, headers=self._headers())
+        if resp.status_code >= 400:
+            self._raise_for_json_error(resp)
+        return resp.json().get("histograms") or {}
+
+    def get_downsampled(self, dataset_id: int, kind: str = "line", **params: Any) -> Dict[str, Any]:
+        """Rows reduced on the server for charting (``downsample/``).
+
+        ``kind="line"`` takes ``metric``, ``points``, ``start``/``end``;
+        ``kind="scatter"`` takes ``x``, ``y``, ``grid``, ``mode`` (``minmax`` or
+        ``density``) and ``xmin``/``xmax``/``ymin``/``ymax``. Both accept ``type``
+        (a list of equipment types).
+        """
+        if not self._token:
+            raise ApiError("Not authenticated.")
+
+        query: Dict[str, Any] = {"kind": kind}
+        for key, value in params.items():
+            if value is None:
+                continue
+            query[key] = ",".join(value) if isinstance(value, (list, tuple)) else value
+        resp = self._send("GET", f"downsample/{int(dataset_id)}/", params=query, headers=self._headers())
+        if resp.status_code >= 400:
+            self._raise_for_json_error(resp)
+        return resp.json()
+
+    def get_tile(
+        self, dataset_id: int, z: int = 0, tx: int = 0, ty: int = 0, size: int = 256, **params: Any
+    ) -> Tuple[np.ndarray, Tuple[float, float, float, float], int]:
+        """One density raster tile as ``(grid, (x0, x1, y0, y1), rows)``.
+
+        ``grid`` is ``size`` x ``size`` float32 with the top (highest y) row
+        first: row counts, or with ``agg="mean", value=<metric>`` the mean
+        (NaN where empty). Other ``params``: ``x``, ``y``, ``type``.
+        """
+        if not self._token:
+            raise ApiError("Not authenticated.")
+
+        query: Dict[str, Any] = {"size": int(size)}
+        for key, value in params.items():
+            if value is None:
+                continue
+            query[key] = ",".join(value) if isinstance(value, (list, tuple)) else value
+        resp = self._send(
+            "GET", f"tiles/{int(dataset_id)}/{int(z)}/{int(tx)}/{int(ty)}/bin/", params=query, headers=self._headers()
+        )
+        if resp.status_code >= 400:
+            self._raise_for_json_error(resp)
+        grid = np.frombuffer(resp.content, dtype="<f4").reshape(int(size), int(size))
+        x0, x1, y0, y1 = (float(v) for v in resp.headers.get("X-Tile-Bounds", "0,1,0,1").split(","))
+        return grid, (x0, x1, y0, y1), int(resp.headers.get("X-Tile-Rows", 0))
+
+    def get_csv_data(
+        self, dataset_id: int, limit: Optional[int] = None, filters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Get CSV data with optional limit. Returns (data_rows, total_count).
+
+        ``filters`` are passed through as query parameters and applied by
+        the server: ``type``, ``min_<metric>``/``max_<metric>``,
+        ``name_prefix``, ``q`` and ``sort``. ``total_count`` then counts the
+        matching rows.
+        """
         if not self._token:
             raise ApiError("Not authenticated.")
 
         url = f"csv-data/{int(dataset_id)}/"
+        params: Dict[str, Any] = {k: v for k, v in (filters or {}).items() if v not in (None, "")}
         if limit is not None:
-            url += f"?limit={int(limit)}"
-            
-        resp = self.session.get(self._url(url), timeout=self.timeout_s, headers=self._headers())
+            params["limit"] = int(limit)
+
+        resp = self._send("GET", url, params=params or None, headers=self._headers())
         if resp.status_code >= 400:
             self._raise_for_json_error(resp)
         data = resp.json()
@@ -193,11 +445,40 @@ class ApiClient:
         total_count = data.get("total_count", len(csv_data))
         return csv_data, total_count
 
+    def download_csv(self, dataset_id: int, dest_path: str, chunk_size: int = 1 << 16) -> str:
+        """Stream the original uploaded CSV to ``dest_path``.
+
+        A partial file left by an interrupted download is resumed with a
+        ``Range`` request. Returns ``dest_path``.
+        """
+        if not self._token:
+            raise ApiError("Not authenticated.")
+
+        headers = self._headers()
+        offset = os.path.getsize(dest_path) if os.path.exists(dest_path) else 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+
+        resp = self._send("GET", f"csv-file/{int(dataset_id)}/", headers=headers, stream=True)
+        try:
+            if resp.status_code == 416:
+                # Already complete.
+                return dest_path
+            if resp.status_code >= 400:
+                self._raise_for_json_error(resp)
+            mode = "ab" if resp.status_code == 206 else "wb"
+            with open(dest_path, mode) as fh:
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    fh.write(chunk)
+        finally:
+            resp.close()
+        return dest_path
+
     def download_report(self, dataset_id: int) -> Tuple[bytes, str]:
         if not self._token:
             raise ApiError("Not authenticated.")
 
-        resp = self.session.get(self._url(f"report/{int(dataset_id)}/"), timeout=self.timeout_s, headers=self._headers())
+        resp = self._send("GET", f"report/{int(dataset_id)}/", headers=self._headers(new_idempotency_key()))
         if resp.status_code >= 400:
             # report view may return json on errors
             self._raise_for_json_error(resp)
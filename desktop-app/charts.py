@@ -213,3 +213,170 @@ def figure_optional_radar(summary: Dict[str, Any], theme: Theme) -> Optional[Fig
 
     fig.tight_layout()
     return fig
+
+
+def figure_histograms(histograms: Dict[str, Dict[str, Any]], theme: Theme) -> Figure:
+    """One panel per metric from ``ApiClient.get_histograms``, stacked by type."""
+    metrics = [m for m in ("Temperature", "Pressure", "Flowrate") if (histograms or {}).get(m)]
+
+    fig = Figure(figsize=(12.4, 4.2), dpi=100)
+    fig.patch.set_facecolor(theme.bg)
+
+    if not metrics:
+        ax = fig.add_subplot(111)
+        ax.text(0.5, 0.5, "No data", ha="center", va="center", color=theme.muted)
+        ax.set_axis_off()
+        return fig
+
+    palette = [theme.cyan, theme.blue, theme.teal, theme.amber]
+    for i, metric in enumerate(metrics):
+        hist = histograms[metric]
+        edges = np.asarray(hist.get("edges") or [0.0, 1.0], dtype=float)
+        widths = np.diff(edges)
+        ax = fig.add_subplot(1, len(metrics), i + 1)
+        per_type = hist.get("types") or {"All": hist.get("counts") or []}
+        bottom = np.zeros(len(widths))
+        for j, (name, counts) in enumerate(sorted(per_type.items())):
+            counts = np.asarray(counts, dtype=float)
+            ax.bar(
+                edges[:-1],
+                counts,
+                width=widths,
+                bottom=bottom,
+                align="edge",
+                color=palette[j % len(palette)],
+                edgecolor=theme.bg,
+                linewidth=0.4,
+                label=name,
+            )
+            bottom += counts
+
+        outside = int(hist.get("below") or 0) + int(hist.get("above") or 0)
+        title = f"{metric} Distribution" + (f" ({outside:,} outside)" if outside else "")
+        _style_axes(ax, theme, title)
+        ax.set_xlabel(metric, fontsize=12)
+        if i == 0:
+            ax.set_ylabel("Count", fontsize=12)
+        ax.grid(axis="y", color=theme.grid, alpha=0.35, linestyle="--")
+
+    leg = fig.axes[-1].legend(frameon=False, fontsize=10)
+    for text in leg.get_texts():
+        text.set_color(theme.muted)
+
+    fig.tight_layout()
+    return fig
+
+
+def figure_scatter(sampled: Dict[str, Any], theme: Theme) -> Figure:
+    """Scatter of ``ApiClient.get_downsampled(kind="scatter")``.
+
+    ``minmax`` results are real rows, coloured by type; ``density`` results are
+    cell centroids sized and shaded by their row count.
+    """
+    fig = Figure(figsize=(6.2, 3.8), dpi=100)
+    fig.patch.set_facecolor(theme.bg)
+    ax = fig.add_subplot(111)
+
+    x_metric = (sampled or {}).get("x_metric", "x")
+    y_metric = (sampled or {}).get("y_metric", "y")
+    xs = np.asarray((sampled or {}).get("x") or [], dtype=float)
+    ys = np.asarray((sampled or {}).get("y") or [], dtype=float)
+    if not len(xs):
+        ax.text(0.5, 0.5, "No data", ha="center", va="center", color=theme.muted)
+        ax.set_axis_off()
+        return fig
+
+    if sampled.get("mode") == "density":
+        counts = np.asarray(sampled.get("count") or [], dtype=float)
+        sizes = 6 + 60 * np.sqrt(counts / counts.max())
+        ax.scatter(xs, ys, s=sizes, c=np.log1p(counts), cmap="viridis", alpha=0.85, linewidths=0)
+    else:
+        palette = [theme.cyan, theme.blue, theme.teal, theme.amber]
+        types = np.asarray(sampled.get("type") or ["All"] * len(xs), dtype=object)
+        for i, name in enumerate(sorted(set(types))):
+            mask = types == name
+            ax.scatter(xs[mask], ys[mask], s=9, color=palette[i % len(palette)], alpha=0.75, linewidths=0, label=name)
+        leg = ax.legend(frameon=False, fontsize=10, markerscale=2)
+        for text in leg.get_texts():
+            text.set_color(theme.muted)
+
+    _style_axes(ax, theme, f"{y_metric} vs {x_metric}")
+    ax.set_xlabel(x_metric, fontsize=12)
+    ax.set_ylabel(y_metric, fontsize=12)
+    ax.grid(color=theme.grid, alpha=0.35, linestyle="--")
+    ax.text(
+        0.99,
+        0.01,
+        f"{len(xs):,} {'cells' if sampled.get('mode') == 'density' else 'points'} from {int(sampled.get('rows') or 0):,} rows",
+        transform=ax.transAxes,
+        ha="right",
+        va="bottom",
+        color=theme.muted,
+        fontsize=9,
+    )
+
+    fig.tight_layout()
+    return fig
+
+
+def figure_line(series: Dict[str, Any], theme: Theme) -> Figure:
+    """Per-row line of ``ApiClient.get_downsampled(kind="line")`` (x = row index)."""
+    fig = Figure(figsize=(6.2, 3.8), dpi=100)
+    fig.patch.set_facecolor(theme.bg)
+    ax = fig.add_subplot(111)
+
+    xs = np.asarray((series or {}).get("x") or [], dtype=float)
+    ys = np.asarray((series or {}).get("y") or [], dtype=float)
+    if not len(xs):
+        ax.text(0.5, 0.5, "No data", ha="center", va="center", color=theme.muted)
+        ax.set_axis_off()
+        return fig
+
+    metric = series.get("metric", "Value")
+    ax.plot(xs, ys, color=theme.cyan, linewidth=1.2)
+    ax.fill_between(xs, ys, ys.min(), color=theme.cyan, alpha=0.08)
+
+    _style_axes(ax, theme, f"{metric} by Row")
+    ax.set_xlabel("Row", fontsize=12)
+    ax.set_ylabel(metric, fontsize=12)
+    ax.grid(color=theme.grid, alpha=0.35, linestyle="--")
+
+    fig.tight_layout()
+    return fig
+
+
+def figure_density(
+    grid: np.ndarray,
+    bounds: tuple,
+    theme: Theme,
+    x_metric: str = "Flowrate",
+    y_metric: str = "Pressure",
+    rows: Optional[int] = None,
+) -> Figure:
+    """Density raster from ``ApiClient.get_tile`` (counts, log colour scale)."""
+    fig = Figure(figsize=(6.2, 3.8), dpi=100)
+    fig.patch.set_facecolor(theme.bg)
+    ax = fig.add_subplot(111)
+
+    grid = np.asarray(grid, dtype=float)
+    if not grid.size or not np.nansum(grid):
+        ax.text(0.5, 0.5, "No data", ha="center", va="center", color=theme.muted)
+        ax.set_axis_off()
+        return fig
+
+    # Empty cells stay transparent over the panel colour.
+    shown = np.ma.masked_where(~np.isfinite(grid) | (grid <= 0), np.log1p(np.where(grid > 0, grid, 0)))
+    x0, x1, y0, y1 = bounds
+    image = ax.imshow(shown, extent=(x0, x1, y0, y1), origin="upper", aspect="auto", cmap="viridis", interpolation="nearest")
+    bar = fig.colorbar(image, ax=ax, pad=0.02)
+    bar.set_label("log(1 + rows)", color=theme.muted)
+    bar.ax.tick_params(colors=theme.muted, labelsize=9)
+
+    _style_axes(ax, theme, f"{y_metric} vs {x_metric} (density)")
+    ax.set_xlabel(x_metric, fontsize=12)
+    ax.set_ylabel(y_metric, fontsize=12)
+    if rows is not None:
+        ax.text(0.99, 0.01, f"{rows:,} rows", transform=ax.transAxes, ha="right", va="bottom", color=theme.muted, fontsize=9)
+
+    fig.tight_layout()
+    return fig
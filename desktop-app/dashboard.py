@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
@@ -9,7 +9,18 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
 from api_client import ApiClient
 from auth import ApiWorker
-from charts import DARK, Theme, figure_avg_metrics_per_type, figure_bar_type_distribution, figure_donut_share, figure_optional_radar
+from charts import (
+    DARK,
+    Theme,
+    figure_avg_metrics_per_type,
+    figure_bar_type_distribution,
+    figure_density,
+    figure_donut_share,
+    figure_histograms,
+    figure_line,
+    figure_optional_radar,
+    figure_scatter,
+)
 from ui_components import (
     CardFrame,
     KPICardWidget,
@@ -20,6 +31,12 @@ from ui_components import (
     SPACING,
 )
 
+# Above this many rows the scatter view shows a density raster instead of points.
+DENSITY_ROWS = 200_000
+# Density tiles: cells per side, and the deepest zoom the server serves.
+TILE_SIZE = 256
+MAX_TILE_ZOOM = 16
+
 
 def _fmt_float(v: Any, digits: int = 2) -> str:
     try:
@@ -54,13 +71,14 @@ class ChartCard(CardFrame):
         
         if fig is None:
             self.placeholder.show()
-            return
+            return None
         
         self.placeholder.hide()
         canvas = FigureCanvas(fig)
         canvas.setMinimumHeight(380)  # Taller charts
         self.layout().addWidget(canvas, 1)
         self._canvas = canvas
+        return canvas
 
 
 class DashboardWidget(QtWidgets.QWidget):
@@ -75,6 +93,17 @@ class DashboardWidget(QtWidgets.QWidget):
         self.csv_data: List[Dict[str, Any]] = []
         self.total_rows: int = 0
         self.current_limit: Optional[int] = None
+        self._poll_worker: Optional[ApiWorker] = None
+        self._hist_worker: Optional[ApiWorker] = None
+        self._rows_worker: Optional[ApiWorker] = None
+        self._tile_worker: Optional[ApiWorker] = None
+        # (dataset_id, z, tx, ty) and bounds of the density tile on screen.
+        self._tile: Optional[Tuple[int, int, int, int]] = None
+        self._tile_bounds: Tuple[float, float, float, float] = (0.0, 1.0, 0.0, 1.0)
+        self._drag_start: Optional[Tuple[float, float]] = None
+        self._poll_timer = QtCore.QTimer(self)
+        self._poll_timer.setInterval(2000)
+        self._poll_timer.timeout.connect(self._poll_status)
 
         # Create scroll area for entire dashboard
         scroll = QtWidgets.QScrollArea()
@@ -104,6 +133,11 @@ class DashboardWidget(QtWidgets.QWidget):
         
         subtitle = MutedLabel("Real-time insights from your chemical equipment data")
         subtitle.setStyleSheet("font-size: 16px; color: #9CA3AF;")  # Bigger subtitle
+
+        # Provisional-results banner for asynchronous uploads.
+        self.approx_label = QtWidgets.QLabel("")
+        self.approx_label.setStyleSheet("font-size: 14px; color: #F59E0B; font-weight: 600;")
+        self.approx_label.hide()
         
         # Gradient line
         gradient_line = QtWidgets.QFrame()
@@ -116,6 +150,7 @@ class DashboardWidget(QtWidgets.QWidget):
         
         header.addLayout(title_row)
         header.addWidget(subtitle)
+        header.addWidget(self.approx_label)
         header.addWidget(gradient_line)
 
         # KPI Cards Grid - Improved sizing
@@ -161,7 +196,10 @@ class DashboardWidget(QtWidgets.QWidget):
             ("🥧 Type", 1),
             ("📈 Average", 2),
             ("📉 Metrics", 3),
-            ("🎯 Performance", 4)
+            ("🎯 Performance", 4),
+            ("📶 Histogram", 5),
+            ("✴️ Scatter", 6),
+            ("〰️ Series", 7),
         ]
         
         for label, idx in viz_types:
@@ -192,12 +230,18 @@ class DashboardWidget(QtWidgets.QWidget):
         self.chart3 = ChartCard("Average Metrics per Type")
         self.chart4 = ChartCard("Metrics Trend")
         self.chart5 = ChartCard("Performance Profile")
+        self.chart6 = ChartCard("Metric Distributions")
+        self.chart7 = ChartCard("Flowrate vs Pressure")
+        self.chart8 = ChartCard("Temperature by Row")
         
         self.chart_stack.addWidget(self.chart1)
         self.chart_stack.addWidget(self.chart2)
         self.chart_stack.addWidget(self.chart3)
         self.chart_stack.addWidget(self.chart4)
         self.chart_stack.addWidget(self.chart5)
+        self.chart_stack.addWidget(self.chart6)
+        self.chart_stack.addWidget(self.chart7)
+        self.chart_stack.addWidget(self.chart8)
         
         self.current_viz = 0
         self._update_viz_buttons()
@@ -371,6 +415,8 @@ class DashboardWidget(QtWidgets.QWidget):
         self._update_csv_table()
     
     def _set_empty(self) -> None:
+        self._poll_timer.stop()
+        self.approx_label.hide()
         self.kpi_total.set_value(0, "")
         self.kpi_flow.set_value(0, "units")
         self.kpi_press.set_value(0, "psi")
@@ -381,6 +427,9 @@ class DashboardWidget(QtWidgets.QWidget):
         self.chart3.set_figure(None)
         self.chart4.set_figure(None)
         self.chart5.set_figure(None)
+        self.chart6.set_figure(None)
+        self.chart7.set_figure(None)
+        self.chart8.set_figure(None)
         
         self.csv_table.setRowCount(0)
         self.table_info_label.setText("")
@@ -389,24 +438,183 @@ class DashboardWidget(QtWidgets.QWidget):
 
     def set_summary(self, summary: Dict[str, Any], dataset_id: Optional[int]) -> None:
         self.current_dataset_id = dataset_id
+        if summary.get("approximate") and dataset_id:
+            # Asynchronous upload: show the estimate until the exact summary lands.
+            self._poll_timer.start()
+        else:
+            self._poll_timer.stop()
         self.pdf_btn.setDisabled(dataset_id is None)
         
         # Update combo box to show total
         if dataset_id:
             total = summary.get("total_equipment", 0)
             self.limit_combo.setItemText(0, f"All ({total})")
-            # Load CSV data
-            self._load_data_with_limit()
+            # Rows are served once the dataset is ready (the status poll calls back here).
+            if not summary.get("approximate"):
+                self._load_data_with_limit()
+
+        self.chart6.set_figure(None)
+        self.chart7.set_figure(None)
+        self.chart8.set_figure(None)
+        self._tile = None
+        if dataset_id and not summary.get("approximate"):
+            self._load_histograms(dataset_id)
+            self._load_downsampled(dataset_id, int(summary.get("total_equipment") or 0))
         
         self._update_ui_with_summary(summary)
+
+    def _load_histograms(self, dataset_id: int) -> None:
+        # Binned on the server from precomputed counts; no rows are downloaded.
+        self._hist_worker = ApiWorker(
+            lambda: (dataset_id, self.api.get_histograms(dataset_id, ["Temperature", "Pressure"], bins=40)),
+            self,
+        )
+        self._hist_worker.succeeded.connect(self._histograms_loaded)
+        self._hist_worker.failed.connect(lambda msg: print(f"Failed to load histograms: {msg}"))
+        self._hist_worker.start()
+
+    def _histograms_loaded(self, result) -> None:
+        dataset_id, histograms = result
+        if dataset_id == self.current_dataset_id:
+            self.chart6.set_figure(figure_histograms(histograms, self.theme))
     
+    def _load_downsampled(self, dataset_id: int, total: int) -> None:
+        # Reduced on the server (grid-binned scatter, LTTB line) so large fleets stay drawable;
+        # past DENSITY_ROWS even that overplots, so the scatter becomes zoomable density tiles.
+        def load():
+            if total > DENSITY_ROWS:
+                scatter = {"tile": self.api.get_tile(dataset_id, x="Flowrate", y="Pressure", size=TILE_SIZE)}
+            else:
+                scatter = self.api.get_downsampled(dataset_id, "scatter", x="Flowrate", y="Pressure", grid=160)
+            line = self.api.get_downsampled(dataset_id, "line", metric="Temperature", points=1500)
+            return dataset_id, scatter, line
+
+        self._rows_worker = ApiWorker(load, self)
+        self._rows_worker.succeeded.connect(self._downsampled_loaded)
+        self._rows_worker.failed.connect(lambda msg: print(f"Failed to load downsampled rows: {msg}"))
+        self._rows_worker.start()
+
+    def _downsampled_loaded(self, result) -> None:
+        dataset_id, scatter, line = result
+        if dataset_id == self.current_dataset_id:
+            if "tile" in scatter:
+                self._tile = (dataset_id, 0, 0, 0)
+                self._show_tile(scatter["tile"])
+            else:
+                self.chart7.set_figure(figure_scatter(scatter, self.theme))
+            self.chart8.set_figure(figure_line(line, self.theme))
+
+    def _show_tile(self, tile) -> None:
+        grid, bounds, rows = tile
+        self._tile_bounds = bounds
+        canvas = self.chart7.set_figure(figure_density(grid, bounds, self.theme, rows=rows))
+        if canvas is not None:
+            canvas.setToolTip("Scroll to zoom, drag to pan")
+            canvas.mpl_connect("scroll_event", self._tile_scrolled)
+            canvas.mpl_connect("button_press_event", self._tile_pressed)
+            canvas.mpl_connect("button_release_event", self._tile_released)
+
+    def _tile_scrolled(self, event) -> None:
+        # Wheel up zooms into the quarter under the cursor, wheel down back out.
+        if self._tile is None or event.xdata is None:
+            return
+        dataset_id, z, tx, ty = self._tile
+        if event.button == "up":
+            if z >= MAX_TILE_ZOOM:
+                return
+            x0, x1, y0, y1 = self._tile_bounds
+            z, tx, ty = z + 1, 2 * tx + int(event.xdata >= (x0 + x1) / 2), 2 * ty + int(event.ydata >= (y0 + y1) / 2)
+        else:
+            if z == 0:
+                return
+            z, tx, ty = z - 1, tx // 2, ty // 2
+        self._load_tile(dataset_id, z, tx, ty)
+
+    def _tile_pressed(self, event) -> None:
+        self._drag_start = (event.xdata, event.ydata) if event.xdata is not None else None
+
+    def _tile_released(self, event) -> None:
+        # A drag of a quarter tile or more pans to the neighbouring tile, like a map.
+        start, self._drag_start = self._drag_start, None
+        if self._tile is None or start is None or event.xdata is None:
+            return
+        dataset_id, z, tx, ty = self._tile
+        x0, x1, y0, y1 = self._tile_bounds
+
+        def step(moved: float, span: float) -> int:
+            return 0 if abs(moved) < span / 4 else (1 if moved > 0 else -1)
+
+        last = 2 ** z - 1
+        new_tx = min(max(tx + step(start[0] - event.xdata, x1 - x0), 0), last)
+        new_ty = min(max(ty + step(start[1] - event.ydata, y1 - y0), 0), last)
+        if (new_tx, new_ty) != (tx, ty):
+            self._load_tile(dataset_id, z, new_tx, new_ty)
+
+    def _load_tile(self, dataset_id: int, z: int, tx: int, ty: int) -> None:
+        if self._tile_worker and self._tile_worker.isRunning():
+            return
+        self._tile_worker = ApiWorker(
+            lambda: (
+                dataset_id,
+                (z, tx, ty),
+                self.api.get_tile(dataset_id, z, tx, ty, x="Flowrate", y="Pressure", size=TILE_SIZE),
+            ),
+            self,
+        )
+        self._tile_worker.succeeded.connect(self._tile_loaded)
+        self._tile_worker.failed.connect(lambda msg: print(f"Failed to load tile: {msg}"))
+        self._tile_worker.start()
+
+    def _tile_loaded(self, result) -> None:
+        dataset_id, position, tile = result
+        if dataset_id == self.current_dataset_id and self._tile is not None:
+            self._tile = (dataset_id, *position)
+            self._show_tile(tile)
+
+    def _poll_status(self) -> None:
+        if not self.current_dataset_id or (self._poll_worker and self._poll_worker.isRunning()):
+            return
+        dataset_id = self.current_dataset_id
+        self._poll_worker = ApiWorker(lambda: self.api.get_summary_status(dataset_id), self)
+        self._poll_worker.succeeded.connect(self._status_loaded)
+        self._poll_worker.start()
+
+    def _status_loaded(self, status: Dict[str, Any]) -> None:
+        if status.get("dataset_id") != self.current_dataset_id:
+            return
+        state = status.get("state", "ready")
+        if state == "processing":
+            return
+        self._poll_timer.stop()
+        if state == "failed":
+            self.approx_label.setText(f"Processing failed: {status.get('error') or 'unknown error'}")
+            self.approx_label.show()
+            return
+        self.set_summary(status.get("summary") or {}, self.current_dataset_id)
+
     def _update_ui_with_summary(self, summary: Dict[str, Any]) -> None:
         """Update UI components with summary data"""
+        approximate = bool(summary.get("approximate"))
+        intervals = summary.get("confidence_intervals") or {}
+
+        def margin(key: str) -> Optional[float]:
+            bounds = intervals.get(key)
+            return (float(bounds[1]) - float(bounds[0])) / 2 if bounds else None
+
+        if approximate:
+            self.approx_label.setText(
+                f"Approximate results from a sample of {int(summary.get('sample_size') or 0):,} rows "
+                f"({int(float(summary.get('confidence_level') or 0.95) * 100)}% intervals) — refining…"
+            )
+            self.approx_label.show()
+        else:
+            self.approx_label.hide()
+
         # Update KPIs with larger text
-        self.kpi_total.set_value(float(summary.get("total_equipment") or 0), "")
-        self.kpi_flow.set_value(float(summary.get("average_flowrate") or 0), "units")
-        self.kpi_press.set_value(float(summary.get("average_pressure") or 0), "psi")
-        self.kpi_temp.set_value(float(summary.get("average_temperature") or 0), "°F")
+        self.kpi_total.set_value(float(summary.get("total_equipment") or 0), "", approximate)
+        self.kpi_flow.set_value(float(summary.get("average_flowrate") or 0), "units", approximate, margin("average_flowrate"))
+        self.kpi_press.set_value(float(summary.get("average_pressure") or 0), "psi", approximate, margin("average_pressure"))
+        self.kpi_temp.set_value(float(summary.get("average_temperature") or 0), "°F", approximate, margin("average_temperature"))
 
         # Update charts
         self.chart1.set_figure(figure_bar_type_distribution(summary, self.theme))
@@ -115,18 +115,30 @@ class KPICardWidget(CardFrame):
         self.value_label = QtWidgets.QLabel("—")
         self.value_label.setObjectName("KPIValue")
         self.value_label.setStyleSheet("font-size: 42px; font-weight: 900;")  # Much larger value
+
+        # Shown for provisional values from an asynchronous upload's sample.
+        self.note_label = QtWidgets.QLabel("")
+        self.note_label.setObjectName("KPINote")
+        self.note_label.setStyleSheet("font-size: 13px; color: #F59E0B; font-weight: 600;")
+        self.note_label.hide()
         
         layout = self.layout()
         layout.addWidget(icon_label)
         layout.addWidget(title_label)
         layout.addWidget(self.value_label)
+        layout.addWidget(self.note_label)
         layout.addStretch()
     
-    def set_value(self, value: float, unit: str = "") -> None:
-        text = f"{value:.2f}"
+    def set_value(self, value: float, unit: str = "", approximate: bool = False, margin: Optional[float] = None) -> None:
+        text = f"{'≈ ' if approximate else ''}{value:.2f}"
         if unit:
             text += f"<span style='font-size: 20px; color: #9CA3AF; font-weight: 400; margin-left: 4px;'>{unit}</span>"
         self.value_label.setText(text)
+        if approximate:
+            self.note_label.setText(f"approximate ± {margin:.2f}" if margin is not None else "approximate")
+            self.note_label.show()
+        else:
+            self.note_label.hide()
 
 
 class MetricBadge(QtWidgets.QFrame):
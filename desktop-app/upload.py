@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import os
-from typing import Optional
+from typing import List, Optional
 
 from PyQt5 import QtCore, QtWidgets
 
@@ -17,7 +17,7 @@ class UploadWidget(QtWidgets.QWidget):
         super().__init__(parent)
         self.api = api
         self._worker: Optional[ApiWorker] = None
-        self._file_path: Optional[str] = None
+        self._file_paths: List[str] = []
 
         root = QtWidgets.QVBoxLayout(self)
         root.setContentsMargins(50, 40, 50, 40)
@@ -30,7 +30,7 @@ class UploadWidget(QtWidgets.QWidget):
         title = PageTitle("Upload Dataset")
         title.setStyleSheet("font-size: 38px; font-weight: 900; background: transparent; color: #E5E7EB;")
         
-        subtitle = MutedLabel("Upload a CSV file for instant analytics and insights")
+        subtitle = MutedLabel("Upload CSV files (or a ZIP of them) for instant analytics and insights")
         subtitle.setStyleSheet("font-size: 18px; color: #9CA3AF; background: transparent;")
         
         header.addWidget(title)
@@ -48,7 +48,7 @@ class UploadWidget(QtWidgets.QWidget):
         upload_icon.setObjectName("UploadIcon")
         upload_icon.setAlignment(QtCore.Qt.AlignCenter)
         
-        card_title = QtWidgets.QLabel("Choose CSV File")
+        card_title = QtWidgets.QLabel("Choose CSV Files")
         card_title.setObjectName("UploadTitle")
         card_title.setAlignment(QtCore.Qt.AlignCenter)
         
@@ -83,29 +83,38 @@ class UploadWidget(QtWidgets.QWidget):
         root.addStretch(1)
 
     def _choose_file(self) -> None:
-        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Select CSV", "", "CSV Files (*.csv)")
-        if not path:
+        paths, _ = QtWidgets.QFileDialog.getOpenFileNames(
+            self, "Select CSV or ZIP files", "", "CSV or ZIP Files (*.csv *.zip)"
+        )
+        if not paths:
             return
-        self._file_path = path
-        self.file_label.setText(f"✓ {os.path.basename(path)}")
+        self._file_paths = paths
+        if len(paths) == 1:
+            self.file_label.setText(f"✓ {os.path.basename(paths[0])}")
+        else:
+            self.file_label.setText(f"✓ {len(paths)} files selected")
         self.file_label.setStyleSheet("color: #22D3EE; font-size: 18px; font-weight: 700; background: transparent;")
         self.status_label.setText("")
         self.upload_btn.setDisabled(False)
 
     def _set_loading(self, loading: bool) -> None:
-        self.upload_btn.setDisabled(loading or not self._file_path)
+        self.upload_btn.setDisabled(loading or not self._file_paths)
         self.upload_btn.setText("Uploading…" if loading else "Upload and Analyze →")
 
     def _upload(self) -> None:
-        if not self._file_path:
+        if not self._file_paths:
             return
         self.status_label.setText("")
         self._set_loading(True)
 
-        file_path = self._file_path
+        file_paths = list(self._file_paths)
+        single_csv = len(file_paths) == 1 and file_paths[0].lower().endswith(".csv")
 
         def work():
-            return self.api.upload_csv(file_path)
+            if single_csv:
+                return self.api.upload_csv(file_paths[0], async_=True)
+            # Several files or a ZIP are ingested in parallel by the backend.
+            return self.api.upload_batch(file_paths)
 
         self._worker = ApiWorker(work, self)
         self._worker.succeeded.connect(self._ok)
@@ -114,10 +123,27 @@ class UploadWidget(QtWidgets.QWidget):
 
     def _ok(self, result):
         self._set_loading(False)
-        dataset_id, summary = result
-        self.status_label.setText("✓ Upload successful!")
-        self.status_label.setStyleSheet("color: #22C55E; font-size: 15px;")
-        self.uploaded.emit(int(dataset_id), summary)
+        if isinstance(result, tuple):
+            dataset_id, summary = result
+            self.status_label.setText("✓ Upload successful!")
+            self.status_label.setStyleSheet("color: #22C55E; font-size: 15px;")
+            self.uploaded.emit(int(dataset_id), summary)
+            return
+
+        succeeded = [r for r in result if r.get("dataset_id") is not None]
+        failed = [r for r in result if r.get("error")]
+        text = f"✓ {len(succeeded)} uploaded"
+        if failed:
+            text += f", ✗ {len(failed)} failed"
+            self.status_label.setToolTip("\n".join(f"{r.get('file')}: {r.get('error')}" for r in failed))
+        else:
+            self.status_label.setToolTip("")
+        self.status_label.setText(text)
+        color = "#22C55E" if not failed else ("#F59E0B" if succeeded else "#EF4444")
+        self.status_label.setStyleSheet(f"color: {color}; font-size: 15px;")
+        if succeeded:
+            latest = max(succeeded, key=lambda r: int(r["dataset_id"]))
+            self.uploaded.emit(int(latest["dataset_id"]), latest.get("summary") or {})
 
     def _failed(self, message: str):
         self._set_loading(False)
@@ -2,7 +2,7 @@ import { useEffect, useState } from 'react';
 import { motion, useAnimation } from 'framer-motion';
 import GlassCard from './GlassCard';
 
-const AnimatedKPICard = ({ title, value, unit = '', icon, color = 'cyan', trend }) => {
+const AnimatedKPICard = ({ title, value, unit = '', icon, color = 'cyan', trend, approximate = false, margin = null }) => {
     const [displayValue, setDisplayValue] = useState(0);
     const controls = useAnimation();
 
@@ -117,7 +117,7 @@ const AnimatedKPICard = ({ title, value, unit = '', icon, color = 'cyan', trend
                         animate={controls}
                         className="text-4xl font-black text-white tracking-tight"
                     >
-                        {displayValue.toFixed(2)}
+                        {approximate ? '≈ ' : ''}{displayValue.toFixed(2)}
                     </motion.span>
                     {unit && (
                         <span className="text-xl font-medium text-gray-400 group-hover:text-gray-300 transition-colors">
@@ -126,6 +126,13 @@ const AnimatedKPICard = ({ title, value, unit = '', icon, color = 'cyan', trend
                     )}
                 </div>
 
+                {/* Provisional value from an asynchronous upload's sample */}
+                {approximate && (
+                    <div className="mt-2 text-xs font-semibold text-amber-400">
+                        approximate{margin != null ? ` ± ${margin.toFixed(2)}` : ''}
+                    </div>
+                )}
+
                 {/* Trend indicator if provided */}
                 {trend && (
                     <div className={`mt-3 text-sm font-semibold ${trend > 0 ? 'text-emerald-400' : 'text-red-400'
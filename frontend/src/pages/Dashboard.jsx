@@ -17,32 +17,65 @@ const Dashboard = () => {
     const [rowLimit, setRowLimit] = useState(null); // null = all rows
     const navigate = useNavigate();
     const location = useLocation();
+    const approximate = Boolean(summary?.approximate);
 
     useEffect(() => {
         if (location.state?.summary) {
             setSummary(location.state.summary);
             setDatasetId(location.state.dataset_id);
-            loadCSVData(location.state.dataset_id, rowLimit);
+            if (!location.state.summary.approximate) {
+                loadCSVData(location.state.dataset_id, rowLimit);
+            }
         } else {
             loadLatestDataset();
         }
     }, [location.state]);
 
     useEffect(() => {
-        if (datasetId) {
+        // Rows are served once the dataset is ready; the status poll loads them then.
+        if (datasetId && !approximate) {
             loadDataWithLimit(datasetId, rowLimit);
         }
     }, [rowLimit]);
 
+    // An asynchronous upload starts with an approximate summary; poll until the exact one lands.
+    useEffect(() => {
+        if (!approximate || !datasetId) {
+            return undefined;
+        }
+        const timer = setInterval(async () => {
+            try {
+                const status = await datasetAPI.getSummary(datasetId);
+                if (status.state === 'ready') {
+                    clearInterval(timer);
+                    setSummary(status.summary);
+                    loadCSVData(datasetId, rowLimit);
+                } else if (status.state === 'failed') {
+                    clearInterval(timer);
+                    toast.error(status.error || 'Processing failed');
+                }
+            } catch (error) {
+                console.error('Failed to poll dataset status:', error);
+            }
+        }, 2000);
+        return () => clearInterval(timer);
+    }, [approximate, datasetId]);
+
+    const margin = (key) => {
+        const bounds = summary?.confidence_intervals?.[key];
+        return bounds ? (bounds[1] - bounds[0]) / 2 : null;
+    };
+
     const loadDataWithLimit = async (id, limit) => {
         setLoading(true);
         try {
-            const [summaryResponse, csvResponse] = await Promise.all([
-                datasetAPI.getSummary(id, limit),
-                datasetAPI.getCSVData(id, limit)
-            ]);
+            const summaryResponse = await datasetAPI.getSummary(id, limit);
             setSummary(summaryResponse.summary);
-            setCsvData(csvResponse.data || []);
+            // A dataset still being processed has no rows to show yet; the status poll loads them.
+            if (!summaryResponse.summary?.approximate) {
+                const csvResponse = await datasetAPI.getCSVData(id, limit);
+                setCsvData(csvResponse.data || []);
+            }
         } catch (error) {
             console.error('Failed to load data:', error);
             toast.error('Failed to load data');
@@ -134,6 +167,12 @@ const Dashboard = () => {
                         <p className="text-gray-400 text-base sm:text-lg font-light">
                             Real-time insights from your chemical equipment data • {summary.total_equipment} devices monitored
                         </p>
+                        {approximate && (
+                            <p className="mt-2 text-amber-400 text-sm font-semibold">
+                                Approximate results from a sample of {(summary.sample_size || 0).toLocaleString()} rows
+                                ({Math.round((summary.confidence_level || 0.95) * 100)}% intervals) — refining…
+                            </p>
+                        )}
                     </div>
                     <div className="text-5xl sm:text-7xl filter drop-shadow-2xl">
                         📊
@@ -160,6 +199,7 @@ const Dashboard = () => {
                     value={summary.total_equipment || 0}
                     icon="🏭"
                     color="cyan"
+                    approximate={approximate}
                 />
                 <AnimatedKPICard
                     title="Avg Flowrate"
@@ -167,6 +207,8 @@ const Dashboard = () => {
                     unit="units"
                     icon="💧"
                     color="teal"
+                    approximate={approximate}
+                    margin={margin('average_flowrate')}
                 />
                 <AnimatedKPICard
                     title="Avg Pressure"
@@ -174,6 +216,8 @@ const Dashboard = () => {
                     unit="psi"
                     icon="⚙️"
                     color="blue"
+                    approximate={approximate}
+                    margin={margin('average_pressure')}
                 />
                 <AnimatedKPICard
                     title="Avg Temperature"
@@ -181,6 +225,8 @@ const Dashboard = () => {
                     unit="°F"
                     icon="🌡️"
                     color="emerald"
+                    approximate={approximate}
+                    margin={margin('average_temperature')}
                 />
             </motion.div>
 
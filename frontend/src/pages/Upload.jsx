@@ -2,7 +2,7 @@ import { useState, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import GlassCard from '../components/GlassCard';
-import { datasetAPI } from '../services/api';
+import { datasetAPI, newIdempotencyKey } from '../services/api';
 import { toast } from 'react-toastify';
 import LoadingSpinner from '../components/LoadingSpinner';
 
@@ -11,6 +11,8 @@ const Upload = () => {
     const [isDragging, setIsDragging] = useState(false);
     const [loading, setLoading] = useState(false);
     const fileInputRef = useRef(null);
+    // One Idempotency-Key per selected file, so double submits create one dataset.
+    const uploadKeyRef = useRef({ file: null, key: null });
     const navigate = useNavigate();
 
     const handleDragOver = (e) => {
@@ -53,7 +55,10 @@ const Upload = () => {
 
         setLoading(true);
         try {
-            const result = await datasetAPI.upload(file);
+            if (uploadKeyRef.current.file !== file) {
+                uploadKeyRef.current = { file, key: newIdempotencyKey() };
+            }
+            const result = await datasetAPI.upload(file, uploadKeyRef.current.key, { asyncIngest: true });
             toast.success('File uploaded successfully!');
 
             navigate('/dashboard', {
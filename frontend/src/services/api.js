@@ -55,13 +55,44 @@ export const authAPI = {
     },
 };
 
+// Save a blob response as a download, named from its Content-Disposition header.
+const saveBlobResponse = (response, fallbackName) => {
+    let filename = fallbackName;
+    const contentDisposition = response.headers['content-disposition'];
+    if (contentDisposition) {
+        const filenameMatch = contentDisposition.match(/filename="(.+)"/);
+        if (filenameMatch && filenameMatch[1]) {
+            filename = filenameMatch[1];
+        }
+    }
+
+    // Create download link
+    const url = window.URL.createObjectURL(new Blob([response.data]));
+    const link = document.createElement('a');
+    link.href = url;
+    link.setAttribute('download', filename);
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    window.URL.revokeObjectURL(url);
+};
+
+export const newIdempotencyKey = () =>
+    (window.crypto && window.crypto.randomUUID)
+        ? window.crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 export const datasetAPI = {
-    upload: async (file) => {
+    // With asyncIngest the response comes back as soon as the file is received,
+    // carrying an approximate summary (summary.approximate) to refine by polling getSummary.
+    upload: async (file, idempotencyKey = newIdempotencyKey(), { asyncIngest = false } = {}) => {
         const formData = new FormData();
         formData.append('file', file);
-        const response = await api.post('/upload/', formData, {
+        const response = await api.post(asyncIngest ? '/upload/?async=1' : '/upload/', formData, {
             headers: {
                 'Content-Type': 'multipart/form-data',
+                // Retries and double submits with the same key create one dataset.
+                'Idempotency-Key': idempotencyKey,
             },
         });
         return response.data;
@@ -73,13 +104,26 @@ export const datasetAPI = {
         const response = await api.get(url);
         return response.data;
     },
-    getCSVData: async (datasetId, limit = null) => {
-        const url = limit
-            ? `/csv-data/${datasetId}/?limit=${limit}`
-            : `/csv-data/${datasetId}/`;
-        const response = await api.get(url);
+    // filters: { type, min_temperature, max_temperature, ..., name_prefix, q, sort }, applied server-side.
+    getCSVData: async (datasetId, limit = null, filters = {}) => {
+        const params = { ...filters };
+        if (limit) params.limit = limit;
+        const response = await api.get(`/csv-data/${datasetId}/`, { params });
+        return response.data;
+    },
+    // Rows reduced for charting: { kind: 'line', metric, points } or { kind: 'scatter', x, y, grid, mode }.
+    getDownsampled: async (datasetId, params = {}) => {
+        const response = await api.get(`/downsample/${datasetId}/`, { params });
         return response.data;
     },
+    // Density raster tile z/x/y of a metric pair: format 'png' (Blob) or 'bin' (size*size Float32Array, top row first).
+    getTile: async (datasetId, z, x, y, params = {}, format = 'png') => {
+        const response = await api.get(`/tiles/${datasetId}/${z}/${x}/${y}/${format}/`, {
+            params,
+            responseType: format === 'bin' ? 'arraybuffer' : 'blob',
+        });
+        return format === 'bin' ? new Float32Array(response.data) : response.data;
+    },
     getHistory: async () => {
         const response = await api.get('/history/');
         return response.data;
@@ -88,31 +132,13 @@ export const datasetAPI = {
         const response = await api.get(`/report/${datasetId}/`, {
             responseType: 'blob',
         });
-
-        // Extract filename from Content-Disposition header
-        let filename = `Report ${datasetId}.pdf`;
-        const contentDisposition = response.headers['content-disposition'];
-        if (contentDisposition) {
-            const filenameMatch = contentDisposition.match(/filename="(.+)"\.pdf/);
-            if (filenameMatch && filenameMatch[1]) {
-                filename = `${filenameMatch[1]}.pdf`;
-            } else {
-                const simpleMatch = contentDisposition.match(/filename="(.+)"/);
-                if (simpleMatch && simpleMatch[1]) {
-                    filename = simpleMatch[1];
-                }
-            }
-        }
-
-        // Create download link
-        const url = window.URL.createObjectURL(new Blob([response.data]));
-        const link = document.createElement('a');
-        link.href = url;
-        link.setAttribute('download', filename);
-        document.body.appendChild(link);
-        link.click();
-        link.remove();
-        window.URL.revokeObjectURL(url);
+        saveBlobResponse(response, `Report ${datasetId}.pdf`);
+    },
+    downloadOriginalCSV: async (datasetId) => {
+        const response = await api.get(`/csv-file/${datasetId}/`, {
+            responseType: 'blob',
+        });
+        saveBlobResponse(response, `dataset_${datasetId}.csv`);
     },
 };
 